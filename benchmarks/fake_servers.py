@@ -0,0 +1,506 @@
+"""Local stand-ins for the Spotify and Tidal web APIs.
+
+The catalog is generated on the fly from the track number, so even catalogs
+with millions of tracks need no memory. Track i is called "Track i" by
+"Artist (i % artists)" on album i // tracks_per_album, and is known to Tidal
+under ID TIDAL_OFFSET + i.
+
+Both servers count the requests they receive per endpoint in `stats`, and
+only answer requests authorized with the token "bench": Spotify expects it as
+bearer token, Tidal as session ID.
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TIDAL_OFFSET = 1000000
+
+
+class Catalog:
+    """Deterministic music library shared by both fake services.
+
+    Parameters
+    ----------
+    tracks: int
+        Number of tracks in the catalog
+    artists: int
+        Number of distinct artists
+    tracks_per_album: int
+        Number of tracks on each album
+    saved: int
+        Number of saved tracks, albums and artists of the user
+    playlists: int
+        Number of playlists of the user
+    playlist_size: int
+        Number of tracks in each playlist
+    """
+    def __init__(
+        self,
+        tracks=10000,
+        artists=500,
+        tracks_per_album=10,
+        saved=1000,
+        playlists=10,
+        playlist_size=100,
+    ):
+        self.tracks = tracks
+        self.artists = artists
+        self.tracks_per_album = tracks_per_album
+        self.saved = min(saved, tracks)
+        self.playlists = playlists
+        self.playlist_size = playlist_size
+
+    def playlist_track(self, playlist, position):
+        """Return the track number at a position of a playlist."""
+        return (playlist * self.playlist_size + position * 7) % self.tracks
+
+    def album_tracks(self, album):
+        """Return the track numbers of an album."""
+        first = album * self.tracks_per_album
+        return range(first, min(first + self.tracks_per_album, self.tracks))
+
+
+def parse_fields(text):
+    """Return Spotify's fields parameter as dictionary of nested fields.
+
+    "items(track(id,name)),total" becomes
+    {"items": {"track": {"id": None, "name": None}}, "total": None}.
+    """
+    fields = current = {}
+    parents = []
+    name = ""
+
+    for char in text + ",":
+        if char == "(":
+            current[name] = {}
+            parents.append(current)
+            current = current[name]
+            name = ""
+        elif char in ",)":
+            if name:
+                current[name] = None
+            name = ""
+            if char == ")":
+                current = parents.pop()
+        else:
+            name += char
+
+    return fields
+
+
+def select(value, fields):
+    """Return only the fields of a JSON value from parse_fields()."""
+    if fields is None:
+        return value
+    if isinstance(value, list):
+        return [select(v, fields) for v in value]
+    if isinstance(value, dict):
+        return {k: select(value[k], f) for k, f in fields.items() if k in value}
+    return value
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Base handler adding latency, throttling and request counting."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        form = {k: v[0] for k, v in parse_qs(body).items()}
+
+        endpoint = "/v1" + re.sub(r"/[^/]*\d[^/]*", "/{id}", url.path[3:])
+        with self.server.lock:
+            self.server.stats[method + " " + endpoint] += 1
+
+        time.sleep(self.server.latency)
+        if random.random() < self.server.throttle:
+            return self._send(429, {}, {"Retry-After": "0.1"})
+        if not self.authorized(method, url.path, query):
+            return self._send(401, {"error": {"message": "unauthorized"}})
+
+        result = self.route(method, url.path, query, form)
+        if result is None:
+            return self._send(404, {"error": {"message": "not found"}})
+        self._send(200, result)
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def authorized(self, method, path, query):
+        raise NotImplementedError
+
+    def route(self, method, path, query, form):
+        raise NotImplementedError
+
+
+class SpotifyHandler(FakeHandler):
+    """Serve the parts of the Spotify web API used by spotify2tidal.
+
+    Like Spotify, only the fields asked for in the `fields` parameter are
+    returned.
+    """
+    def authorized(self, method, path, query):
+        return self.headers.get("Authorization") == "Bearer bench"
+
+    def route(self, method, path, query, form):
+        result = self._route(path, query)
+        if result is not None and query.get("fields"):
+            result = select(result, parse_fields(query["fields"]))
+        return result
+
+    def _route(self, path, query):
+        catalog = self.server.catalog
+        limit = min(int(query.get("limit", 20)), self.server.page_size)
+        offset = int(query.get("offset", 0))
+
+        if path == "/v1/me/playlists":
+            return self._page(
+                path, catalog.playlists, limit, offset, self._playlist
+            )
+        if path == "/v1/me/tracks":
+            return self._page(
+                path,
+                catalog.saved,
+                limit,
+                offset,
+                lambda i: {"added_at": self._added(i), "track": self._track(i)},
+            )
+        if path == "/v1/me/albums":
+            albums = -(-catalog.saved // catalog.tracks_per_album)
+            return self._page(
+                path,
+                albums,
+                limit,
+                offset,
+                lambda i: {"added_at": self._added(i), "album": self._album(i)},
+            )
+        if path == "/v1/me/following":
+            after = int(query.get("after", -1)) + 1
+            artists = min(catalog.artists, catalog.saved)
+            items = [
+                self._artist(i) for i in range(after, min(after + limit, artists))
+            ]
+            following = self._page(path, artists, limit, after, self._artist)
+            following["items"] = items
+            following["cursors"] = {"after": str(after + len(items) - 1)}
+            if after + limit < artists:
+                following["next"] = "%s%s?type=artist&limit=%d&after=%d" % (
+                    self.server.url,
+                    path,
+                    limit,
+                    after + len(items) - 1,
+                )
+            return {"artists": following}
+
+        match = re.match(r"/v1/(?:users/[^/]+/)?playlists/p(\d+)(/tracks)?$", path)
+        if match:
+            playlist = int(match.group(1))
+            if not match.group(2):
+                return self._playlist(playlist)
+            return self._page(
+                path,
+                catalog.playlist_size,
+                limit,
+                offset,
+                lambda i: {
+                    "added_at": self._added(i),
+                    "track": self._track(catalog.playlist_track(playlist, i)),
+                },
+            )
+
+    def _page(self, path, total, limit, offset, item):
+        items = [item(i) for i in range(offset, min(offset + limit, total))]
+        next_url = None
+        if offset + limit < total:
+            next_url = "%s%s?limit=%d&offset=%d" % (
+                self.server.url,
+                path,
+                limit,
+                offset + limit,
+            )
+        return {
+            "items": items,
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "next": next_url,
+        }
+
+    def _added(self, i):
+        return time.strftime(
+            "%Y-%m-%dT%H:%M:%SZ", time.gmtime(1500000000 - i * 3600)
+        )
+
+    def _artist(self, i):
+        return {"id": "ar%d" % i, "name": "Artist %d" % i}
+
+    def _album(self, i):
+        catalog = self.server.catalog
+        first = i * catalog.tracks_per_album
+        return {
+            "id": "al%d" % i,
+            "name": "Album %d" % i,
+            "artists": [self._artist(first % catalog.artists)],
+            "external_ids": {"upc": "%012d" % i},
+        }
+
+    def _track(self, i):
+        catalog = self.server.catalog
+        album = self._album(i // catalog.tracks_per_album)
+        del album["external_ids"]
+        return {
+            "id": "tr%d" % i,
+            "name": "Track %d" % i,
+            "artists": [self._artist(i % catalog.artists)],
+            "album": album,
+            "external_ids": {"isrc": "QZ%010d" % i},
+            "duration_ms": 200000,
+            "disc_number": 1,
+            "track_number": i % catalog.tracks_per_album + 1,
+        }
+
+    def _playlist(self, i):
+        return {
+            "id": "p%d" % i,
+            "name": "Playlist %d" % i,
+            "owner": {"id": "bench"},
+            "snapshot_id": "s%d" % i,
+            "tracks": {"total": self.server.catalog.playlist_size},
+        }
+
+
+class TidalHandler(FakeHandler):
+    """Serve the parts of the Tidal API used by spotify2tidal and tidalapi.
+
+    Like the listen API, changes to playlists need the session ID in the
+    x-tidal-sessionid header. Everything else needs it in the query, like
+    tidalapi sends it.
+    """
+    def authorized(self, method, path, query):
+        if path == "/v1/login/username":
+            return True
+        if method != "GET" and re.search(r"/playlists(/|$)", path):
+            return self.headers.get("x-tidal-sessionid") == "bench"
+        return query.get("sessionId") == "bench"
+
+    def route(self, method, path, query, form):
+        catalog = self.server.catalog
+        playlists = self.server.playlists
+
+        if path == "/v1/login/username":
+            return {"sessionId": "bench", "countryCode": "US", "userId": 1}
+
+        match = re.match(r"/v1/search/(tracks|albums|artists)$", path)
+        if match:
+            kind = match.group(1)
+            number = re.search(
+                r"%s (\d+)" % kind[:-1], query.get("query", ""), re.I
+            )
+            if number is None:
+                return {"items": []}
+            i = int(number.group(1))
+            if kind == "tracks" and i < catalog.tracks:
+                return {"items": [self._track(i)]}
+            if kind == "albums":
+                return {"items": [self._album(i)]}
+            if kind == "artists" and i < catalog.artists:
+                return {"items": [self._artist(i)]}
+            return {"items": []}
+
+        if path == "/v1/tracks/byIsrc":
+            i = int(query.get("isrc", "QZ0")[2:])
+            return {"items": [self._track(i)] if i < catalog.tracks else []}
+        if path == "/v1/albums/byBarcodeId":
+            i = int(query.get("barcodeId", 0))
+            albums = -(-catalog.tracks // catalog.tracks_per_album)
+            return {"items": [self._album(i)] if i < albums else []}
+
+        match = re.match(r"/v1/albums/(\d+)/tracks$", path)
+        if match:
+            album = int(match.group(1)) - TIDAL_OFFSET
+            return {
+                "items": [self._track(i) for i in catalog.album_tracks(album)]
+            }
+
+        match = re.match(r"/v1/users/\d+/playlists$", path)
+        if match and method == "GET":
+            with self.server.lock:
+                items = [
+                    self._playlist(uuid, playlist)
+                    for uuid, playlist in playlists.items()
+                ]
+            return self._page(items, query)
+        if match and method == "POST":
+            with self.server.lock:
+                uuid = "uuid-%d" % next(self.server.uuids)
+                playlists[uuid] = {"title": form.get("title"), "tracks": []}
+            return {"uuid": uuid}
+
+        match = re.match(r"/v1/playlists/([^/]+)(/items|/tracks)?(/[\d,]+)?$", path)
+        if match:
+            return self._playlist_route(method, match, query, form)
+
+        match = re.match(r"/v1/users/\d+/favorites/(tracks|albums|artists)$", path)
+        if match:
+            with self.server.lock:
+                favorites = self.server.favorites[match.group(1)]
+                if method == "POST":
+                    # Field of tidalapi's Favorites, e.g. trackId
+                    field = match.group(1)[:-1] + "Id"
+                    if set(form) != {field}:
+                        return None
+                    favorites.update(int(v) for v in form[field].split(","))
+                    return {}
+                return self._page(
+                    [{"item": self._item(match.group(1), i)}
+                     for i in sorted(favorites)],
+                    query,
+                )
+
+    def _playlist_route(self, method, match, query, form):
+        uuid, sub, indices = match.groups()
+        with self.server.lock:
+            playlist = self.server.playlists.get(uuid)
+            if playlist is None:
+                return None
+            tracks = playlist["tracks"]
+
+            if sub is None and method == "DELETE":
+                del self.server.playlists[uuid]
+                return {}
+            if sub == "/tracks":
+                return self._page(
+                    [self._track(t - TIDAL_OFFSET) for t in tracks], query
+                )
+            if sub == "/items" and method == "POST":
+                ids = [int(t) for t in form["trackIds"].split(",")]
+                index = int(form.get("toIndex", len(tracks)))
+                tracks[index:index] = ids
+                return {}
+            if sub == "/items" and method == "DELETE":
+                for i in sorted(map(int, indices[1:].split(",")), reverse=True):
+                    del tracks[i]
+                return {}
+            return self._playlist(uuid, playlist)
+
+    def _page(self, items, query):
+        offset = int(query.get("offset", 0))
+        limit = min(int(query.get("limit", 999)), self.server.page_size)
+        return {
+            "items": items[offset:offset + limit],
+            "totalNumberOfItems": len(items),
+        }
+
+    def _item(self, kind, tidal_id):
+        i = tidal_id - TIDAL_OFFSET
+        if kind == "tracks":
+            return self._track(i)
+        if kind == "albums":
+            return self._album(i)
+        return self._artist(i)
+
+    def _artist(self, i):
+        return {"id": TIDAL_OFFSET + i, "name": "Artist %d" % i}
+
+    def _album(self, i):
+        catalog = self.server.catalog
+        first = i * catalog.tracks_per_album
+        return {
+            "id": TIDAL_OFFSET + i,
+            "title": "Album %d" % i,
+            "artist": self._artist(first % catalog.artists),
+            "numberOfTracks": catalog.tracks_per_album,
+            "duration": 2000,
+            "streamReady": True,
+        }
+
+    def _track(self, i):
+        catalog = self.server.catalog
+        album = self._album(i // catalog.tracks_per_album)
+        return {
+            "id": TIDAL_OFFSET + i,
+            "title": "Track %d" % i,
+            "isrc": "QZ%010d" % i,
+            "duration": 200,
+            "trackNumber": i % catalog.tracks_per_album + 1,
+            "volumeNumber": 1,
+            "popularity": 0,
+            "streamReady": True,
+            "artist": self._artist(i % catalog.artists),
+            "album": {"id": album["id"], "title": album["title"]},
+        }
+
+    def _playlist(self, uuid, playlist):
+        return {
+            "uuid": uuid,
+            "title": playlist["title"],
+            "description": "",
+            "numberOfTracks": len(playlist["tracks"]),
+            "duration": 0,
+            "publicPlaylist": False,
+        }
+
+
+def start(
+    handler, catalog, latency=0.0, throttle=0.0, page_size=100, port=0
+):
+    """Start a fake server in a background thread and return it.
+
+    Parameters
+    ----------
+    handler: class
+        SpotifyHandler or TidalHandler
+    catalog: Catalog
+        Library to serve
+    latency: float, optional
+        Seconds to wait before answering each request
+    throttle: float, optional
+        Share of requests to answer with HTTP 429
+    page_size: int, optional
+        Maximum number of items per page, whatever the client asks for
+    port: int, optional
+        Port to listen on. A free one is picked if 0.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.catalog = catalog
+    server.latency = latency
+    server.throttle = throttle
+    server.page_size = page_size
+    server.url = "http://127.0.0.1:%d" % server.server_port
+    server.lock = threading.Lock()
+    server.stats = Counter()
+    server.playlists = {}
+    server.uuids = itertools.count()
+    server.favorites = {"tracks": set(), "albums": set(), "artists": set()}
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Measure the throughput of spotify2tidal against local fake services.
+
+Every run gets fresh fake servers and its own process, so runs don't
+influence each other and the peak memory is that of the run alone.
+
+Example
+-------
+Compare sequential and concurrent lookups on a large library:
+
+    python benchmarks/run.py --tracks 1000000 --saved 20000 --workers 1 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import traceback
+
+# Import spotify2tidal from this checkout, wherever the script is run from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tidalapi
+
+import fake_servers
+from spotify2tidal import Spotify2Tidal
+from spotify2tidal.scheduler import Scheduler
+from spotify2tidal.spotify import Spotify
+from spotify2tidal.pooled import PooledSession
+from spotify2tidal.tidal import Tidal
+
+SCENARIOS = ("playlists", "tracks", "albums", "artists")
+
+
+class BenchSpotify(Spotify):
+    """Spotify talking to a fake server, without any authorization."""
+    url = None
+
+    def _connect(self):
+        self.api_location = self.url + "/v1/"
+        self._token_info = {
+            "access_token": "bench",
+            "expires_at": time.time() + 86400,
+            "refresh_token": None,
+        }
+        return self._session()
+
+
+class BenchTidal(Tidal):
+    """Tidal talking to a fake server."""
+    url = None
+
+    def _connect(self, username, password):
+        self.api_location = self.url + "/v1/"
+
+        tidal_session = PooledSession(self._http)
+        tidal_session._config = tidalapi.Config()
+        tidal_session._config.api_location = self.api_location
+        tidal_session.login(username, password)
+        return tidal_session
+
+
+class BenchSpotify2Tidal(Spotify2Tidal):
+    spotify_class = BenchSpotify
+    tidal_class = BenchTidal
+
+
+def measure(scenario, options, spotify_url, tidal_url, results):
+    """Run a single scenario and put its measurements into results.
+
+    Parameters
+    ----------
+    scenario: str
+        One of SCENARIOS
+    options: dict
+        Arguments given on the command line
+    spotify_url: str
+        Location of the fake Spotify server
+    tidal_url: str
+        Location of the fake Tidal server
+    results: multiprocessing.Queue
+        Receives a dictionary with the measurements, or the traceback if
+        the run failed
+    """
+    try:
+        results.put(_measure(scenario, options, spotify_url, tidal_url))
+    except Exception:
+        results.put({"error": traceback.format_exc()})
+
+
+def _measure(scenario, options, spotify_url, tidal_url):
+    """Run a single scenario and return its measurements."""
+    BenchSpotify.url = spotify_url
+    BenchTidal.url = tidal_url
+    rate = options["rate"]
+
+    st = BenchSpotify2Tidal(
+        "bench",
+        "bench",
+        "bench",
+        "bench",
+        "bench",
+        "http://localhost",
+        chunk_size=options["chunk_size"],
+        workers=options["workers"],
+        album_threshold=options["album_threshold"],
+        spotify_scheduler=Scheduler(rate, int(rate)),
+        tidal_scheduler=Scheduler(rate, int(rate)),
+    )
+
+    start = time.perf_counter()
+    if scenario == "playlists":
+        st.copy_all_spotify_playlists()
+        items = options["playlists"] * options["playlist_size"]
+    else:
+        items = len(getattr(st, "copy_all_saved_spotify_" + scenario)())
+    wall = time.perf_counter() - start
+
+    return {
+        "items": items,
+        "wall": wall,
+        "throttled": st.spotify.scheduler.throttled
+        + st.tidal.scheduler.throttled,
+        "memo": st.memo.stats,
+        "metrics": st.metrics.report(),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / 1024.0,
+    }
+
+
+def run(scenario, options):
+    """Run a scenario against fresh fake servers and return a report.
+
+    Parameters
+    ----------
+    scenario: str
+        One of SCENARIOS
+    options: dict
+        Arguments given on the command line
+    """
+    catalog = fake_servers.Catalog(
+        tracks=options["tracks"],
+        artists=options["artists"],
+        tracks_per_album=options["tracks_per_album"],
+        saved=options["saved"],
+        playlists=options["playlists"],
+        playlist_size=options["playlist_size"],
+    )
+    servers = [
+        fake_servers.start(
+            handler,
+            catalog,
+            latency=options["latency"],
+            throttle=options["throttle"],
+            page_size=options["page_size"],
+        )
+        for handler in (fake_servers.SpotifyHandler, fake_servers.TidalHandler)
+    ]
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(
+        target=measure,
+        args=(scenario, options, servers[0].url, servers[1].url, results),
+    )
+    process.start()
+    result = results.get()
+    process.join()
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+    if "error" in result:
+        raise RuntimeError(
+            "Scenario %s failed:\n%s" % (scenario, result["error"])
+        )
+
+    spotify_requests, tidal_requests = (
+        sum(server.stats.values()) for server in servers
+    )
+    report = {
+        "scenario": scenario,
+        "workers": options["workers"],
+        "album_threshold": options["album_threshold"],
+        "items": result["items"],
+        "wall_seconds": round(result["wall"], 3),
+        "items_per_second": round(result["items"] / result["wall"], 1),
+        "spotify_requests": spotify_requests,
+        "tidal_requests": tidal_requests,
+        "throttled": result["throttled"],
+        "memo": result["memo"],
+        "metrics": result["metrics"],
+        "peak_rss_mb": round(result["peak_rss_mb"], 1),
+        "endpoints": dict(servers[0].stats + servers[1].stats),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS
+    )
+    parser.add_argument(
+        "--workers",
+        nargs="+",
+        type=int,
+        default=[1, 8],
+        help="Number of lookup threads, one run per value",
+    )
+    parser.add_argument("--tracks", type=int, default=10000)
+    parser.add_argument("--artists", type=int, default=500)
+    parser.add_argument("--tracks-per-album", type=int, default=10)
+    parser.add_argument(
+        "--saved",
+        type=int,
+        default=1000,
+        help="Number of saved tracks, also limits saved albums and artists",
+    )
+    parser.add_argument("--playlists", type=int, default=10)
+    parser.add_argument("--playlist-size", type=int, default=100)
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=100,
+        help="Maximum number of items per page the servers return",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.01,
+        help="Seconds the servers wait before answering each request",
+    )
+    parser.add_argument(
+        "--throttle",
+        type=float,
+        default=0.0,
+        help="Share of requests answered with HTTP 429",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=1000.0,
+        help="Requests per second the client allows itself per service",
+    )
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--album-threshold", type=int, default=None)
+    parser.add_argument("--output", help="Write all reports to this file")
+    args = parser.parse_args()
+
+    reports = []
+    for scenario in args.scenarios:
+        for workers in args.workers:
+            options = dict(vars(args), workers=workers)
+            report = run(scenario, options)
+            reports.append(report)
+            print(
+                "%-10s workers=%-3d %7d items %8.2fs %9.1f items/s"
+                " %6d requests %7.1f MB"
+                % (
+                    scenario,
+                    workers,
+                    report["items"],
+                    report["wall_seconds"],
+                    report["items_per_second"],
+                    report["spotify_requests"] + report["tidal_requests"],
+                    report["peak_rss_mb"],
+                )
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
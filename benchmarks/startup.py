@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Measure how long spotify2tidal takes to import and to set up.
+
+Every sample runs in a fresh interpreter. Neither Spotify nor Tidal is
+contacted, since connections are only made on first use. The script fails
+if the median startup exceeds the budget, or if spotipy, tidalapi or
+requests got imported without being used.
+
+Example
+-------
+    python benchmarks/startup.py --budget 100
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("spotipy", "tidalapi", "requests")
+
+SAMPLE = """
+import json, sys, time
+start = time.perf_counter()
+from spotify2tidal import Spotify2Tidal
+imported = time.perf_counter()
+Spotify2Tidal("bench", "bench", "bench", "bench", "bench", "http://localhost")
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "init_ms": (created - imported) * 1000,
+    "heavy": [m for m in %r if m in sys.modules],
+}))
+""" % (
+    HEAVY_MODULES,
+)
+
+
+def sample():
+    """Return the measurements of a single startup in a fresh interpreter."""
+    output = subprocess.check_output([sys.executable, "-c", SAMPLE])
+    return json.loads(output.decode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=100.0,
+        help="Milliseconds the median startup may take",
+    )
+    args = parser.parse_args()
+
+    samples = [sample() for _ in range(args.samples)]
+    import_ms = statistics.median(s["import_ms"] for s in samples)
+    init_ms = statistics.median(s["init_ms"] for s in samples)
+    heavy = sorted(set(m for s in samples for m in s["heavy"]))
+
+    print(
+        "import %.1f ms, init %.1f ms, total %.1f ms (budget %.1f ms)"
+        % (import_ms, init_ms, import_ms + init_ms, args.budget)
+    )
+    if heavy:
+        print("Imported without being used: %s" % ", ".join(heavy))
+
+    if heavy or import_ms + init_ms > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
+from .cache import MatchCache
+from .match import Match
 from .spotify2tidal import Spotify2Tidal
+from .aio import AsyncSpotify2Tidal
+from .batch import Batch, load_manifest
 
 import logging
 logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -0,0 +1,362 @@
+import asyncio
+import http.client
+import io
+import json
+import logging
+import time
+from urllib.parse import urlencode, urlsplit
+
+from spotify2tidal.scheduler import IDEMPOTENT_METHODS
+
+
+class RequestError(Exception):
+    """A request could not be completed."""
+
+
+class ConnectError(RequestError):
+    """No response arrived, because the connection failed or timed out."""
+
+
+class HTTPError(RequestError):
+    """The service answered with an error status.
+
+    Parameters
+    ----------
+    response: Response
+        Response with the error status
+    """
+    def __init__(self, response):
+        super().__init__(
+            "%d error for url: %s" % (response.status_code, response.url)
+        )
+        self.response = response
+
+
+class Response:
+    """Response to a request sent with AsyncHTTP.
+
+    Parameters
+    ----------
+    url: str
+        URL the request was sent to
+    status_code: int
+        HTTP status code
+    headers: http.client.HTTPMessage
+        Headers of the response
+    content: bytes
+        Body of the response
+    """
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        """Return the body decoded from JSON."""
+        return json.loads(self.content.decode("utf-8"))
+
+    def raise_for_status(self):
+        """Raise an HTTPError if the status is an error."""
+        if self.status_code >= 400:
+            raise HTTPError(self)
+
+
+class AsyncHTTP:
+    """Minimal HTTP/1.1 client for asyncio, keeping connections alive.
+
+    Only the standard library is used, so no thread is needed per request.
+    Every request goes through a Scheduler.
+
+    Connections belong to the event loop they were opened on. If the client
+    is used from another event loop, e.g. by a second asyncio.run(), the
+    connections of the previous one are dropped.
+
+    Parameters
+    ----------
+    scheduler: Scheduler
+        Scheduler of the service this client talks to
+    metrics: Metrics, optional
+        Records the latency and outcome of every request
+    service: str, optional
+        Name of the service to record the requests under
+    pool_size: int, optional
+        Maximum number of connections open at once
+    timeout: float, optional
+        Seconds to wait for a response
+    """
+    def __init__(
+        self, scheduler, metrics=None, service=None, pool_size=10, timeout=60
+    ):
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.service = service
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self._idle = {}
+        self._slots = None
+        self._loop = None
+        self._ssl = None
+
+    async def request(
+        self, method, url, params=None, data=None, headers=None
+    ):
+        """Send a request through the scheduler and return its response.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            Absolute URL
+        params: dict, optional
+            Query parameters to add to the URL
+        data: dict, optional
+            Form data to send
+        headers: dict, optional
+            Additional headers
+        """
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(params)
+
+        body = b""
+        headers = dict(headers or {})
+        if data is not None:
+            body = urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        attempts = []
+
+        async def send():
+            if attempts and self.metrics is not None:
+                self.metrics.observe_retry(self.service)
+            attempts.append(time.monotonic())
+
+            try:
+                response = await self._send(method, url, body, headers)
+            except ConnectError:
+                self._observe(method, url, attempts[-1], "error")
+                raise
+
+            self._observe(method, url, attempts[-1], response.status_code)
+            return response
+
+        return await self.scheduler.send_async(
+            send, idempotent=method.upper() in IDEMPOTENT_METHODS
+        )
+
+    async def close(self):
+        """Close all idle connections and wait until they are closed."""
+        self._use_running_loop()
+
+        writers = [
+            writer
+            for connections in self._idle.values()
+            for reader, writer in connections
+        ]
+        self._idle.clear()
+
+        for writer in writers:
+            writer.close()
+        for writer in writers:
+            # Only available since Python 3.7
+            if hasattr(writer, "wait_closed"):
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+
+    async def _send(self, method, url, body, headers):
+        """Send a request once and return its response.
+
+        A kept-alive connection may have been closed by the server in the
+        meantime. If it fails before any response arrived, the request is
+        sent again on a new connection.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            Absolute URL including the query
+        body: bytes
+            Body of the request
+        headers: dict
+            Additional headers
+        """
+        self._use_running_loop()
+
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        address = (
+            parts.scheme,
+            parts.hostname,
+            parts.port or (443 if https else 80),
+        )
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        lines = [
+            "%s %s HTTP/1.1" % (method, target),
+            "Host: %s" % parts.netloc,
+            "Accept: application/json",
+            "Content-Length: %d" % len(body),
+        ]
+        lines.extend("%s: %s" % item for item in headers.items())
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+        async with self._slots:
+            while True:
+                reused, (reader, writer) = await self._connection(address)
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    response, keep_alive = await asyncio.wait_for(
+                        self._receive(reader, method, url), self.timeout
+                    )
+                except (
+                    OSError,
+                    ValueError,
+                    asyncio.IncompleteReadError,
+                    asyncio.TimeoutError,
+                ) as e:
+                    writer.close()
+                    if reused and not isinstance(e, asyncio.TimeoutError):
+                        continue
+                    raise ConnectError("%s %s failed: %r" % (method, url, e))
+                except BaseException:
+                    # Cancelled while waiting, the response is unusable
+                    writer.close()
+                    raise
+
+                if keep_alive:
+                    self._idle.setdefault(address, []).append(
+                        (reader, writer)
+                    )
+                else:
+                    writer.close()
+                return response
+
+    async def _connection(self, address):
+        """Return a tuple (reused, (reader, writer)) for a connection.
+
+        Parameters
+        ----------
+        address: tuple
+            (scheme, host, port) to connect to
+        """
+        idle = self._idle.get(address)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof():
+                return True, (reader, writer)
+            writer.close()
+
+        scheme, host, port = address
+        ssl = None
+        if scheme == "https":
+            if self._ssl is None:
+                import ssl as ssl_module
+
+                self._ssl = ssl_module.create_default_context()
+            ssl = self._ssl
+
+        try:
+            connection = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=ssl), self.timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ConnectError("Could not connect to %s: %r" % (host, e))
+
+        logging.getLogger(__name__).debug("Connected to %s:%d", host, port)
+        return False, connection
+
+    @staticmethod
+    async def _receive(reader, method, url):
+        """Read a response and return a tuple (response, keep_alive).
+
+        Parameters
+        ----------
+        reader: asyncio.StreamReader
+            Connection to read from
+        method: str
+            HTTP method of the request
+        url: str
+            URL of the request
+        """
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+        version, status = status_line.split(None, 2)[:2]
+        status = int(status)
+
+        head = io.BytesIO()
+        while True:
+            line = await reader.readline()
+            head.write(line)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        head.seek(0)
+        headers = http.client.parse_headers(head)
+
+        keep_alive = (
+            version == b"HTTP/1.1"
+            and (headers.get("Connection") or "").lower() != "close"
+        )
+
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            content = b""
+        elif (headers.get("Transfer-Encoding") or "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            # Skip trailers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            content = b"".join(chunks)
+        elif headers.get("Content-Length") is not None:
+            content = await reader.readexactly(int(headers["Content-Length"]))
+        else:
+            content = await reader.read()
+            keep_alive = False
+
+        return Response(url, status, headers, content), keep_alive
+
+    def _use_running_loop(self):
+        """Drop the connections if the event loop changed since last use.
+
+        Connections and the semaphore limiting them can only be used from
+        the event loop they were created on. The previous loop is usually
+        closed already, so its connections are dropped without closing
+        them.
+        """
+        loop = asyncio.get_event_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._idle = {}
+            self._slots = asyncio.Semaphore(self.pool_size)
+
+    def _observe(self, method, url, start, status):
+        """Record a finished request, if metrics are collected.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            URL of the request
+        start: float
+            time.monotonic() when the request was sent
+        status:
+            HTTP status code, or 'error' if no response arrived
+        """
+        if self.metrics is not None:
+            self.metrics.observe_request(
+                self.service, method, url, time.monotonic() - start, status
+            )
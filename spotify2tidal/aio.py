@@ -0,0 +1,668 @@
+import functools
+
+from spotify2tidal.album_index import AlbumIndex
+from spotify2tidal.cache import MatchCache
+from spotify2tidal.match import Match
+from spotify2tidal.spotify2tidal import Spotify2Tidal
+
+
+def forget_lookups(method):
+    """Decorate a coroutine of AsyncSpotify2Tidal to forget its lookups.
+
+    See spotify2tidal.spotify2tidal.forget_lookups().
+    """
+    @functools.wraps(method)
+    async def run(self, *args, **kwargs):
+        stats = self.sync.memo.stats
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            self.sync._forget_lookups(stats)
+
+    return run
+
+
+class AsyncSpotify2Tidal:
+    """Provide the interface of Spotify2Tidal as coroutines.
+
+    This allows running migrations within an existing asyncio application.
+    All requests to Spotify and Tidal are sent by a small HTTP client on the
+    event loop, so no thread is needed per request. Only the authorization
+    at Spotify and the login at Tidal, which spotipy and tidalapi do on
+    their own, run once in a thread.
+
+    Items are looked up as soon as their page arrives from Spotify. They
+    pass through a queue to `concurrency` workers, so at most that many
+    lookups are in flight, and the queue holds back further pages while
+    the workers are busy. Writes to Tidal happen in order.
+
+    The cache, journal, sync state and measurements are shared with the
+    wrapped Spotify2Tidal in `sync`.
+
+    Parameters
+    ----------
+    concurrency: int, optional
+        Maximum number of lookups in flight at once
+
+    All other parameters are passed on to Spotify2Tidal.
+    """
+    sync_class = Spotify2Tidal
+
+    def __init__(self, *args, concurrency=8, **kwargs):
+        from spotify2tidal.ahttp import AsyncHTTP
+        from spotify2tidal.aio_spotify import AsyncSpotify
+        from spotify2tidal.aio_tidal import AsyncTidal
+
+        self.sync = self.sync_class(*args, **kwargs)
+        self.metrics = self.sync.metrics
+        self.concurrency = concurrency
+
+        self.spotify = AsyncSpotify(
+            self.sync.spotify,
+            AsyncHTTP(
+                self.sync.spotify.scheduler,
+                self.metrics,
+                "spotify",
+                pool_size=concurrency + self.sync.spotify.prefetch,
+            ),
+        )
+        self.tidal = AsyncTidal(
+            self.sync.tidal,
+            AsyncHTTP(
+                self.sync.tidal.scheduler,
+                self.metrics,
+                "tidal",
+                pool_size=concurrency,
+            ),
+        )
+
+    @forget_lookups
+    async def copy_all_spotify_playlists(self, incremental=False):
+        """Create all your spotify playlists in tidal.
+
+        Parameters
+        ----------
+        incremental: bool, optional
+            Only add and remove the tracks that changed in playlists that
+            already exist, instead of creating them from scratch
+        """
+        async def copy(playlist):
+            await self._add_spotify_playlist_to_tidal(
+                spotify_playlist=playlist,
+                delete_existing=True,
+                incremental=incremental,
+            )
+
+        await self.spotify.own_playlists(copy)
+
+    @forget_lookups
+    async def copy_all_saved_spotify_albums(self, delta=False):
+        """Add all your saved albums to Tidal's favorites.
+
+        Return a list of Match objects, one for each saved album.
+
+        Parameters
+        ----------
+        delta: bool, optional
+            Only copy the albums saved since the last delta run. Requires a
+            state_path.
+        """
+        if delta:
+            return await self._copy_saved_delta("album")
+
+        matches = await self._resolve_saved("album")
+        await self._save_favorites(matches)
+
+        return matches
+
+    @forget_lookups
+    async def copy_all_saved_spotify_artists(self):
+        """Add all your saved artists to Tidal's favorites.
+
+        Return a list of Match objects, one for each saved artist.
+        """
+        matches = await self._resolve_saved("artist")
+        await self._save_favorites(matches)
+
+        return matches
+
+    @forget_lookups
+    async def copy_all_saved_spotify_tracks(self, delta=False):
+        """Add all your saved tracks to Tidal's favorites.
+
+        Return a list of Match objects, one for each saved track.
+
+        Parameters
+        ----------
+        delta: bool, optional
+            Only copy the tracks saved since the last delta run. Requires a
+            state_path.
+        """
+        if delta:
+            return await self._copy_saved_delta("track")
+
+        matches = await self._resolve_saved("track")
+        await self._save_favorites(matches)
+
+        return matches
+
+    @forget_lookups
+    async def copy_discover_weekly(
+        self, playlist_name="Discover Weekly", incremental=False
+    ):
+        """Create a discover weekly in Tidal.
+
+        Parameters
+        ----------
+        playlist_name: str, optional
+            Name of the playlist in Tidal
+        incremental: bool, optional
+            Only add and remove the tracks that changed if the playlist
+            already exists, instead of creating it from scratch
+        """
+        playlist = await self.spotify.discover_weekly_playlist()
+
+        return await self._add_spotify_playlist_to_tidal(
+            playlist,
+            playlist_name=playlist_name,
+            delete_existing=True,
+            incremental=incremental,
+        )
+
+    async def close(self):
+        """Close all idle connections to Spotify and Tidal, then close sync.
+
+        See Spotify2Tidal.close().
+        """
+        await self.spotify.http.close()
+        await self.tidal.http.close()
+        self.sync.close()
+
+    async def _add_spotify_playlist_to_tidal(
+        self,
+        spotify_playlist,
+        playlist_name=None,
+        delete_existing=False,
+        incremental=False,
+    ):
+        """Create a tidal playlist and copy available tracks.
+
+        Return a list of Match objects, one for each track of the playlist.
+
+        Parameters
+        ----------
+        spotify_playlist:
+            Playlist to copy to tidal
+        playlist_name: string, optional
+            Overwrite the playlist name
+        delete_existing: bool
+            Delete any existing playlist with the same name
+        incremental: bool
+            Update an existing playlist with the same name in place
+        """
+        if playlist_name is None:
+            playlist_name = spotify_playlist["name"]
+
+        key = self.sync._playlist_key(spotify_playlist, playlist_name)
+        if self.sync._is_written("playlist", key):
+            return []
+        if await self._is_unchanged(spotify_playlist, key, playlist_name):
+            return []
+
+        with self.metrics.phase("resolve", playlist_name) as phase:
+            matches = await self._resolve_tracks(
+                self._fetch(
+                    functools.partial(
+                        self.spotify.tracks_from_playlist, spotify_playlist
+                    ),
+                    playlist_name,
+                )
+            )
+            phase.items = len(matches)
+
+        await self._write_playlist(
+            playlist_name,
+            matches,
+            delete_existing,
+            incremental,
+            key,
+            spotify_playlist.get("snapshot_id"),
+        )
+
+        return matches
+
+    async def _is_unchanged(self, spotify_playlist, key, playlist_name):
+        """Whether a playlist didn't change since it was last copied.
+
+        See Spotify2Tidal._is_unchanged().
+
+        Parameters
+        ----------
+        spotify_playlist:
+            Playlist to copy to tidal
+        key: str
+            Key of the playlist, see Spotify2Tidal._playlist_key()
+        playlist_name: str
+            Name of the playlist in Tidal
+        """
+        tidal_id = self.sync._synced_copy(spotify_playlist, key)
+        return tidal_id is not None and tidal_id in (
+            (await self.tidal._playlist_index()).get(playlist_name, ())
+        )
+
+    async def _write_playlist(
+        self,
+        playlist_name,
+        matches,
+        delete_existing=False,
+        incremental=False,
+        key=None,
+        snapshot_id=None,
+    ):
+        """Create a tidal playlist with all found tracks.
+
+        See Spotify2Tidal._write_playlist().
+        """
+        track_ids = self.sync._playlist_track_ids(matches)
+        chunk_size = self.sync.chunk_size
+
+        with self.metrics.phase("write", playlist_name) as phase:
+            tidal_playlist_id = None
+            if incremental:
+                tidal_playlist_id = await self.tidal.find_playlist(
+                    playlist_name
+                )
+
+            if tidal_playlist_id is not None:
+                await self.tidal.sync_playlist(
+                    tidal_playlist_id, track_ids, chunk_size=chunk_size
+                )
+            else:
+                tidal_playlist_id = await self.tidal.create_playlist(
+                    playlist_name, delete_existing
+                )
+                await self.tidal.add_tracks_to_playlist(
+                    tidal_playlist_id, track_ids, chunk_size=chunk_size
+                )
+            phase.items = len(track_ids)
+
+        self.sync._record_playlist(key, snapshot_id, tidal_playlist_id)
+
+        return tidal_playlist_id
+
+    async def _resolve_saved(self, kind, since=None, newest=None):
+        """Fetch the saved items of a kind and look them up at Tidal.
+
+        See Spotify2Tidal._resolve_saved().
+        """
+        if since is None:
+            self.sync._favorites[kind] = await self.tidal.favorites(
+                kind + "s"
+            )
+
+        if kind == "track":
+            produce = functools.partial(self.spotify.saved_tracks, since=since)
+        elif kind == "album":
+            produce = functools.partial(self.spotify.saved_albums, since=since)
+        else:
+            produce = self.spotify.saved_artists
+        if newest is not None:
+            produce = self._keep_first(produce, newest)
+
+        label = "saved %ss" % kind
+        with self.metrics.phase("resolve", label) as phase:
+            if kind == "track":
+                matches = await self._resolve_tracks(
+                    self._fetch(produce, label)
+                )
+            else:
+                matches = await self._resolve(
+                    self._find_album if kind == "album" else self._find_artist,
+                    self._fetch(produce, label),
+                )
+            phase.items = len(matches)
+
+        return matches
+
+    async def _copy_saved_delta(self, kind):
+        """Copy the items of a kind saved since the last delta run.
+
+        See Spotify2Tidal._copy_saved_delta().
+        """
+        state = self.sync.state
+        if state is None:
+            raise ValueError("Copying only new items requires a state_path")
+
+        newest = []
+        matches = await self._resolve_saved(kind, state.mark(kind), newest)
+        failed = await self._save_favorites(matches)
+
+        if newest and not failed:
+            state.record_mark(kind, newest[0].added_at, newest[0].id)
+
+        return matches
+
+    async def _save_favorites(self, matches):
+        """Add all found items to Tidal's favorites with bulk requests.
+
+        Return the number of items that could not be added.
+
+        Parameters
+        ----------
+        matches: list
+            Match objects of the items, all of the same kind
+        """
+        pending = self.sync._pending_favorites(matches)
+        if not pending:
+            return 0
+
+        kind = matches[0].kind
+        with self.metrics.phase("write", "saved %ss" % kind) as phase:
+            failed = set(
+                await self.tidal.save_favorites(
+                    kind + "s", list(pending), chunk_size=self.sync.chunk_size
+                )
+            )
+            phase.items = len(pending) - len(failed)
+
+        return self.sync._saved_favorites(kind, pending, failed)
+
+    def _fetch(self, produce, label):
+        """Wrap a producer of Spotify items to record a 'fetch' phase.
+
+        The phase lasts from the first request until the last item was
+        taken by the lookups.
+
+        Parameters
+        ----------
+        produce: callable
+            Coroutine function passing items to a coroutine function put
+        label: str
+            What is fetched
+        """
+        async def fetch(put):
+            with self.metrics.phase("fetch", label) as phase:
+                async def count(item):
+                    phase.items += 1
+                    await put(item)
+
+                await produce(count)
+
+        return fetch
+
+    @staticmethod
+    def _keep_first(produce, first):
+        """Wrap a producer to append the first item it produces to a list.
+
+        Parameters
+        ----------
+        produce: callable
+            Coroutine function passing items to a coroutine function put
+        first: list
+            Receives the first item
+        """
+        async def keep(put):
+            async def put_first(item):
+                if not first:
+                    first.append(item)
+                await put(item)
+
+            await produce(put_first)
+
+        return keep
+
+    async def _resolve(self, find, produce):
+        """Look up items at Tidal as they are produced, return their matches.
+
+        The producer puts the items into a queue of limited size, which
+        `concurrency` workers take them from. The matches are returned in
+        the same order as the items.
+
+        Parameters
+        ----------
+        find: callable
+            Coroutine function returning the Match of an item
+        produce: callable
+            Coroutine function passing items to a coroutine function put
+        """
+        import asyncio
+
+        queue = asyncio.Queue(maxsize=self.concurrency)
+        matches = []
+
+        async def put(item):
+            matches.append(None)
+            await queue.put((len(matches) - 1, item))
+
+        async def feed():
+            await produce(put)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def work():
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    return
+                index, item = entry
+                matches[index] = await find(item)
+
+        tasks = [asyncio.ensure_future(feed())] + [
+            asyncio.ensure_future(work()) for _ in range(self.concurrency)
+        ]
+        try:
+            done, _ = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_EXCEPTION
+            )
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return matches
+
+    async def _resolve_tracks(self, produce):
+        """Look up tracks at Tidal as they are produced, return their matches.
+
+        If album_threshold is set, tracks sharing an album are looked up
+        together, the same way as in Spotify2Tidal. This requires all tracks
+        to be fetched before searching starts.
+
+        Parameters
+        ----------
+        produce: callable
+            Coroutine function passing Track records to a coroutine function
+            put
+        """
+        if not self.sync.album_threshold:
+            return await self._resolve(self._find_track, produce)
+
+        tracks = []
+
+        async def collect(track):
+            tracks.append(track)
+
+        await produce(collect)
+
+        groups = self.sync._group_by_album(tracks)
+        results = await self._resolve(
+            self._find_album_tracks,
+            self._feed([[tracks[i] for i in group] for group in groups]),
+        )
+
+        return self.sync._ungroup(groups, results)
+
+    @staticmethod
+    def _feed(items):
+        """Return a producer passing the items of a list to put.
+
+        Parameters
+        ----------
+        items: list
+            Items to produce
+        """
+        async def produce(put):
+            for item in items:
+                await put(item)
+
+        return produce
+
+    async def _find_album_tracks(self, tracks):
+        """Return the Matches for tracks from the same Spotify album.
+
+        See Spotify2Tidal._find_album_tracks().
+
+        Parameters
+        ----------
+        tracks: list
+            Track records of the same album
+        """
+        if len(tracks) == 1:
+            return [await self._find_track(tracks[0])]
+
+        indexes = []
+
+        async def album_index():
+            if not indexes:
+                indexes.append(await self._album_index(tracks[0].album))
+            return indexes[0]
+
+        matches = []
+        for track in tracks:
+            matches.append(await self._find_track(track, album_index))
+
+        return matches
+
+    async def _album_index(self, album):
+        """Return an AlbumIndex for a Spotify album, or None if not found.
+
+        Parameters
+        ----------
+        album:
+            Album record
+        """
+        album_id = (await self._find_album(album)).tidal_id
+        if album_id is None:
+            return None
+
+        async def index():
+            return AlbumIndex(await self.tidal.album_tracks(album_id))
+
+        return await self.sync.memo.get_async(("tracklist", album_id), index)
+
+    async def _find_album(self, album):
+        """Return the Match for a Spotify album.
+
+        Parameters
+        ----------
+        album:
+            Album record
+        """
+        async def search():
+            favorite = self.sync._favorite("album", album.name, album.artist)
+            if favorite is not None:
+                return favorite
+            return await self.tidal.find_album(
+                album.name, album.artist, album.upc
+            )
+
+        tidal_id, strategy = await self._cached(
+            "album",
+            MatchCache.key(album.id, album.name, album.artist),
+            search,
+        )
+        return Match(
+            "album",
+            album.name,
+            album.artist,
+            album.id,
+            tidal_id,
+            strategy,
+        )
+
+    async def _find_artist(self, artist):
+        """Return the Match for a Spotify artist.
+
+        Parameters
+        ----------
+        artist:
+            Artist record
+        """
+        async def search():
+            favorite = self.sync._favorite("artist", artist.name)
+            if favorite is not None:
+                return favorite
+            return await self.tidal.find_artist(artist.name)
+
+        tidal_id, strategy = await self._cached(
+            "artist", MatchCache.key(artist.id, artist.name), search
+        )
+        return Match(
+            "artist",
+            artist.name,
+            artist.name,
+            artist.id,
+            tidal_id,
+            strategy,
+        )
+
+    async def _find_track(self, track, album_index=None):
+        """Return the Match for a Spotify track.
+
+        Parameters
+        ----------
+        track:
+            Track record
+        album_index: callable, optional
+            Coroutine function returning the AlbumIndex of the track's
+            album, or None. Only called if the track isn't cached.
+        """
+        artist = track.artist
+
+        async def search():
+            favorite = self.sync._favorite("track", track.name, artist)
+            if favorite is not None:
+                return favorite
+
+            index = await album_index() if album_index else None
+            track_id = index.find(track) if index else None
+            if track_id is not None:
+                return track_id, "album"
+            return await self.tidal.find_track(track.name, artist, track.isrc)
+
+        tidal_id, strategy = await self._cached(
+            "track", MatchCache.key(track.id, track.name, artist), search
+        )
+        return Match(
+            "track",
+            track.name,
+            artist,
+            track.id,
+            tidal_id,
+            strategy,
+        )
+
+    async def _cached(self, kind, key, search):
+        """Look up a Tidal ID in the cache and only search on a miss.
+
+        Return a tuple (tidal_id, strategy). Lookups are shared with the
+        wrapped Spotify2Tidal, see Spotify2Tidal._cached().
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        key: str
+            Cache key of the item
+        search: callable
+            Coroutine function returning a tuple (tidal_id, strategy)
+        """
+        async def lookup():
+            found, tidal_id, strategy = self.sync._recall(kind, key)
+            if not found:
+                tidal_id, strategy = await search()
+                self.sync._remember(kind, key, tidal_id, strategy)
+            return tidal_id, strategy
+
+        return await self.sync.memo.get_async((kind, key), lookup)
@@ -0,0 +1,260 @@
+import asyncio
+from collections import deque
+
+from spotify2tidal.records import Album, Artist, Track
+
+
+class AsyncSpotify:
+    """Read a Spotify-account with coroutines.
+
+    Pages are requested with an AsyncHTTP client and handed on item by item
+    as they arrive. Items are passed to a coroutine function `put`, which
+    can hold back further pages by not returning, e.g. while a bounded
+    queue is full.
+
+    Authorization, which may need to ask the user, is left to a Spotify
+    object. It runs once in a thread, and again only if a token expired.
+
+    Parameters
+    ----------
+    spotify: Spotify
+        Account to read, used for authorization
+    http: AsyncHTTP
+        Client to send all requests with
+    """
+    def __init__(self, spotify, http):
+        self.spotify = spotify
+        self.http = http
+
+    async def discover_weekly_playlist(self):
+        """Return the playlist object of the 'Discover Weekly' playlist."""
+        if not self.spotify._discover_weekly_id:
+            raise ValueError("No discover weekly ID set")
+
+        return await self._get(
+            "users/%s/playlists/%s"
+            % (self.spotify.username, self.spotify._discover_weekly_id),
+            {"fields": "id,name,owner(id),snapshot_id"},
+        )
+
+    async def own_playlists(self, put):
+        """Pass all playlists of the user to put.
+
+        Parameters
+        ----------
+        put: callable
+            Coroutine function receiving the playlists one by one
+        """
+        await self._offset_pages("me/playlists", {}, 50, put)
+
+    async def saved_albums(self, put, since=None):
+        """Pass all saved albums as Album records to put, newest first.
+
+        Parameters
+        ----------
+        put: callable
+            Coroutine function receiving the albums one by one
+        since: tuple, optional
+            (added_at, album_id) of an album saved before. Stop at that
+            album, or at the first album saved earlier.
+        """
+        async def put_album(item):
+            await put(Album.from_spotify(item["album"], item["added_at"]))
+
+        await self._offset_pages(
+            "me/albums",
+            {},
+            50,
+            put_album,
+            until=self.spotify._saved_before(since, "album"),
+        )
+
+    async def saved_artists(self, put):
+        """Pass all saved artists as Artist records to put.
+
+        Followed artists are paginated with a cursor instead of an offset,
+        so these pages can't be prefetched.
+
+        Parameters
+        ----------
+        put: callable
+            Coroutine function receiving the artists one by one
+        """
+        page = (await self._get("me/following", {"type": "artist"}))[
+            "artists"
+        ]
+
+        while True:
+            for artist in page["items"]:
+                await put(Artist.from_spotify(artist))
+
+            if not page["next"]:
+                return
+            page = (await self._get(page["next"]))["artists"]
+
+    async def saved_tracks(self, put, since=None):
+        """Pass all saved tracks as Track records to put, newest first.
+
+        Parameters
+        ----------
+        put: callable
+            Coroutine function receiving the tracks one by one
+        since: tuple, optional
+            (added_at, track_id) of a track saved before. Stop at that
+            track, or at the first track saved earlier.
+        """
+        await self._offset_pages(
+            "me/tracks",
+            {},
+            50,
+            self._put_tracks(put),
+            until=self.spotify._saved_before(since, "track"),
+        )
+
+    async def tracks_from_playlist(self, playlist, put):
+        """Pass all tracks from a playlist as Track records to put.
+
+        Parameters
+        ----------
+        playlist:
+            Playlist object to get tracks from
+        put: callable
+            Coroutine function receiving the tracks one by one
+        """
+        await self._offset_pages(
+            "users/%s/playlists/%s/tracks"
+            % (playlist["owner"]["id"], playlist["id"]),
+            {
+                "fields": "items(added_at,track(%s)),total,limit"
+                % self.spotify.TRACK_FIELDS
+            },
+            100,
+            self._put_tracks(put),
+        )
+
+    async def _get(self, path, params=None):
+        """Request a JSON object, refreshing the token if needed.
+
+        Parameters
+        ----------
+        path: str
+            Path relative to the API location, or an absolute URL
+        params: dict, optional
+            Query parameters
+        """
+        loop = asyncio.get_event_loop()
+        if self.spotify._spotify_session is None:
+            await loop.run_in_executor(None, self.spotify._connect_once)
+
+        url = path
+        if "://" not in url:
+            url = self.spotify.api_location + path
+
+        token = self.spotify._token_info["access_token"]
+        response = await self._send(url, params, token)
+
+        if response.status_code == 401:
+            await loop.run_in_executor(
+                None, self.spotify._refresh_expired_token, token
+            )
+            response = await self._send(
+                url, params, self.spotify._token_info["access_token"]
+            )
+
+        response.raise_for_status()
+        return response.json()
+
+    async def _send(self, url, params, token):
+        """Send a GET request with a token and return the response.
+
+        Parameters
+        ----------
+        url: str
+            Absolute URL
+        params: dict
+            Query parameters
+        token: str
+            Access token
+        """
+        return await self.http.request(
+            "GET",
+            url,
+            params=params,
+            headers={"Authorization": "Bearer " + token},
+        )
+
+    async def _offset_pages(self, path, params, limit, put, until=None):
+        """Pass the items of an offset-based paginated result to put.
+
+        The first page tells how many items there are in total, and how many
+        items per page the service actually allows. All following pages are
+        then requested concurrently, up to `prefetch` pages ahead of the page
+        currently being passed on.
+
+        Parameters
+        ----------
+        path: str
+            Path relative to the API location
+        params: dict
+            Query parameters besides limit and offset
+        limit: int
+            Number of items per page
+        put: callable
+            Coroutine function receiving the items one by one
+        until: callable, optional
+            Stop at the first item it returns True for. Pages are then
+            requested one after the other, since usually only the first few
+            are needed.
+        """
+        def request(offset):
+            return self._get(path, dict(params, limit=limit, offset=offset))
+
+        page = await request(0)
+        limit = page.get("limit") or limit
+        offsets = iter(range(limit, page["total"], limit))
+        prefetch = 0 if until is not None else self.spotify.prefetch
+
+        pending = deque()
+        try:
+            while True:
+                for item in page["items"]:
+                    if until is not None and until(item):
+                        return
+                    await put(item)
+
+                for offset in offsets:
+                    pending.append(asyncio.ensure_future(request(offset)))
+                    if len(pending) >= prefetch:
+                        break
+
+                if not pending:
+                    return
+                page = await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _put_tracks(put):
+        """Return a coroutine function passing Track records on to put.
+
+        Items without a track, like unavailable episodes, are skipped.
+        Tracks of the same album share a single Album record.
+
+        Parameters
+        ----------
+        put: callable
+            Coroutine function receiving the tracks one by one
+        """
+        albums = {}
+
+        async def put_track(item):
+            if item.get("track"):
+                await put(
+                    Track.from_spotify(
+                        item["track"], item.get("added_at"), albums
+                    )
+                )
+
+        return put_track
+
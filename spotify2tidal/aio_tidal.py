@@ -0,0 +1,550 @@
+import asyncio
+import logging
+from urllib.parse import urljoin
+
+from spotify2tidal.ahttp import HTTPError, RequestError
+from spotify2tidal.favorites import Favorites
+from spotify2tidal.tidal import (
+    favorite_entry,
+    first_available,
+    playlist_changes,
+)
+
+
+class AsyncTidal:
+    """Look up and write to a Tidal-account with coroutines.
+
+    All requests are sent with an AsyncHTTP client. The login, which
+    tidalapi does on its own, is left to a Tidal object and runs once in a
+    thread.
+
+    Parameters
+    ----------
+    tidal: Tidal
+        Account to write to, used to log in
+    http: AsyncHTTP
+        Client to send all requests with
+    """
+    def __init__(self, tidal, http):
+        self.tidal = tidal
+        self.http = http
+
+        self._favorites = {}
+        self._playlists = None
+
+    async def add_tracks_to_playlist(
+        self, playlist_id, track_ids, to_index=0, chunk_size=100
+    ):
+        """Add already resolved tracks to a playlist, keeping their order.
+
+        Parameters
+        ----------
+        playlist_id:
+            Playlist to add tracks to
+        track_ids: list
+            Tidal IDs of the tracks to add, in the intended order
+        to_index: int, optional
+            Position in the playlist to insert the first track at
+        chunk_size: int, optional
+            Maximum number of tracks to add with a single request
+        """
+        for start in range(0, len(track_ids), chunk_size):
+            chunk = track_ids[start:start + chunk_size]
+            await self._request(
+                "POST",
+                "playlists/" + str(playlist_id) + "/items",
+                headers={"if-none-match": "*"},
+                data={
+                    "trackIds": ",".join(str(t) for t in chunk),
+                    "toIndex": to_index + start,
+                },
+            )
+            logging.getLogger(__name__).info(
+                "Added %d tracks to playlist %s", len(chunk), playlist_id
+            )
+
+    async def album_tracks(self, album_id):
+        """Return all tracks of an album as returned by Tidal's API.
+
+        Parameters
+        ----------
+        album_id: int
+            Album to get the tracks from
+        """
+        return (
+            await self._get("albums/" + str(album_id) + "/tracks")
+        )["items"]
+
+    async def create_playlist(self, playlist_name, delete_existing=False):
+        """Create a tidal playlist and return its ID.
+
+        Parameters
+        ----------
+        playlist_name: str
+            Name of the playlist to create
+        delete_existing: str
+            Delete any existing playlist with the same name
+        """
+        if delete_existing is True:
+            await self.delete_existing_playlist(playlist_name)
+
+        user_id = await self._user_id()
+        result = await self._request(
+            "POST",
+            "users/" + str(user_id) + "/playlists",
+            data={"title": playlist_name, "description": ""},
+        )
+
+        logging.getLogger(__name__).debug(
+            "Created playlist: %s", playlist_name
+        )
+
+        playlist_id = result.json()["uuid"]
+        if self._playlists is not None:
+            self._playlists.setdefault(playlist_name, []).append(playlist_id)
+
+        return playlist_id
+
+    async def delete_existing_playlist(self, playlist_name):
+        """Delete any existing playlist with a given name.
+
+        A playlist that doesn't exist anymore counts as deleted.
+
+        Parameters
+        ----------
+        playlist_name: str
+            Playlist name to delete
+        """
+        playlists = await self._playlist_index()
+        for playlist_id in list(playlists.get(playlist_name, [])):
+            try:
+                await self._request("DELETE", "playlists/" + playlist_id)
+            except HTTPError as e:
+                if e.response.status_code != 404:
+                    raise
+                logging.getLogger(__name__).info(
+                    "Playlist %s was already deleted", playlist_id
+                )
+            self._forget_playlist(playlist_id)
+
+    async def favorites(self, kind):
+        """Return the Favorites index of the user's favorite items.
+
+        The favorites are only fetched from Tidal on the first call. Items
+        added with save_favorites() afterwards are added to the index as
+        well.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'albums', 'artists' or 'tracks'
+        """
+        if kind not in self._favorites:
+            self._favorites[kind] = await self._fetch_favorites(kind)
+        return self._favorites[kind]
+
+    async def find_album(self, name, artist, upc=None):
+        """Find an album and return a tuple (album_id, strategy).
+
+        See Tidal.find_album().
+
+        Parameters
+        ----------
+        name: str
+            Name of the album
+        artist: str
+            Artist of the album
+        upc: str, optional
+            Universal Product Code of the album
+        """
+        if upc:
+            album_id = await self._lookup(
+                "albums/byBarcodeId", {"barcodeId": upc}
+            )
+            if album_id is not None:
+                return album_id, "upc"
+
+        album_id = await self._search("albums", name, artist)
+        return album_id, "search" if album_id is not None else None
+
+    async def find_artist(self, name):
+        """Find an artist and return a tuple (artist_id, strategy).
+
+        Parameters
+        ----------
+        name: str
+            Name of the artist
+        """
+        artist_id = await self._search("artists", name)
+        return artist_id, "search" if artist_id is not None else None
+
+    async def find_playlist(self, playlist_name):
+        """Return the ID of an existing playlist, or None if there is none.
+
+        Parameters
+        ----------
+        playlist_name: str
+            Name of the playlist
+        """
+        playlist_ids = (await self._playlist_index()).get(playlist_name)
+        return playlist_ids[0] if playlist_ids else None
+
+    async def find_track(self, name, artist, isrc=None):
+        """Find a track and return a tuple (track_id, strategy).
+
+        See Tidal.find_track().
+
+        Parameters
+        ----------
+        name: str
+            Name of the track
+        artist: str
+            Artist of the track
+        isrc: str, optional
+            International Standard Recording Code of the track
+        """
+        if isrc:
+            track_id = await self._lookup("tracks/byIsrc", {"isrc": isrc})
+            if track_id is not None:
+                return track_id, "isrc"
+
+        track_id = await self._search("tracks", name, artist)
+        return track_id, "search" if track_id is not None else None
+
+    async def playlist_track_ids(self, playlist_id):
+        """Return the IDs of all tracks in a playlist, in order.
+
+        Parameters
+        ----------
+        playlist_id: str
+            Playlist to get the tracks from
+        """
+        items = await self._items("playlists/" + str(playlist_id) + "/tracks")
+        return [t["id"] for t in items]
+
+    async def remove_tracks_from_playlist(
+        self, playlist_id, indices, chunk_size=100
+    ):
+        """Remove the tracks at the given positions from a playlist.
+
+        Parameters
+        ----------
+        playlist_id: str
+            Playlist to remove tracks from
+        indices: list
+            Positions of the tracks to remove
+        chunk_size: int, optional
+            Maximum number of tracks to remove with a single request
+        """
+        indices = sorted(indices)
+
+        # Start at the end, so that earlier positions are not shifted
+        for end in range(len(indices), 0, -chunk_size):
+            chunk = indices[max(0, end - chunk_size):end]
+            await self._request(
+                "DELETE",
+                "playlists/"
+                + str(playlist_id)
+                + "/items/"
+                + ",".join(str(i) for i in chunk),
+                headers={"if-none-match": "*"},
+            )
+            logging.getLogger(__name__).info(
+                "Removed %d tracks from playlist %s", len(chunk), playlist_id
+            )
+
+    async def save_favorites(self, kind, ids, chunk_size=100):
+        """Add items to the favorites in chunks of comma-separated IDs.
+
+        A chunk that fails doesn't stop the others. Return a list of the IDs
+        in failed chunks.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'albums', 'artists' or 'tracks'
+        ids: list
+            Tidal IDs of the items
+        chunk_size: int, optional
+            Maximum number of items to add with a single request
+        """
+        user_id = await self._user_id()
+        # Named like tidalapi's Favorites, e.g. 'trackId'
+        field = kind[:-1] + "Id"
+        failed = []
+
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            try:
+                await self._session_request(
+                    "POST",
+                    "users/%s/favorites/%s" % (user_id, kind),
+                    data={field: ",".join(str(i) for i in chunk)},
+                )
+            except RequestError as e:
+                logging.getLogger(__name__).warning(
+                    "Could not add %d %s to favorites: %s", len(chunk), kind, e
+                )
+                failed.extend(chunk)
+            else:
+                logging.getLogger(__name__).info(
+                    "Added %d %s to favorites", len(chunk), kind
+                )
+                if kind in self._favorites:
+                    for tidal_id in chunk:
+                        self._favorites[kind].add(tidal_id)
+
+        return failed
+
+    async def sync_playlist(self, playlist_id, track_ids, chunk_size=100):
+        """Change an existing playlist to contain exactly the given tracks.
+
+        See Tidal.sync_playlist().
+
+        Parameters
+        ----------
+        playlist_id: str
+            Playlist to change
+        track_ids: list
+            Tidal IDs of the tracks the playlist should contain, in order
+        chunk_size: int, optional
+            Maximum number of tracks to add or remove with a single request
+        """
+        current = await self.playlist_track_ids(playlist_id)
+
+        for start, end, insert in playlist_changes(current, track_ids):
+            if end > start:
+                await self.remove_tracks_from_playlist(
+                    playlist_id, range(start, end), chunk_size
+                )
+            if insert:
+                await self.add_tracks_to_playlist(
+                    playlist_id, insert, start, chunk_size
+                )
+
+    async def _fetch_favorites(self, kind):
+        """Fetch all favorite items of a kind into a Favorites index.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'albums', 'artists' or 'tracks'
+        """
+        user_id = await self._user_id()
+        items = await self._items("users/%s/favorites/%s" % (user_id, kind))
+        favorites = Favorites(favorite_entry(kind, i["item"]) for i in items)
+
+        logging.getLogger(__name__).info(
+            "Found %d favorite %s", len(favorites), kind
+        )
+        return favorites
+
+    def _forget_playlist(self, playlist_id):
+        """Remove a deleted playlist from the index.
+
+        Parameters
+        ----------
+        playlist_id: str
+            Playlist ID that was deleted
+        """
+        if self._playlists is None:
+            return
+
+        for name, playlist_ids in list(self._playlists.items()):
+            if playlist_id in playlist_ids:
+                playlist_ids.remove(playlist_id)
+            if not playlist_ids:
+                del self._playlists[name]
+
+    async def _get(self, path, params=None):
+        """Send a GET request and return the decoded JSON.
+
+        Parameters
+        ----------
+        path: str
+            Path relative to the API location
+        params: dict, optional
+            Additional query parameters
+        """
+        return (
+            await self._session_request("GET", path, params=params)
+        ).json()
+
+    async def _items(self, path):
+        """Return all items of a paginated result, in order.
+
+        Parameters
+        ----------
+        path: str
+            Path relative to the API location
+        """
+        items = []
+
+        while True:
+            result = await self._get(path, {"offset": len(items)})
+            items.extend(result["items"])
+
+            if not result["items"]:
+                return items
+            if len(items) >= result["totalNumberOfItems"]:
+                return items
+
+    async def _lookup(self, path, params):
+        """Look up an item by a code and return its ID.
+
+        Return None if there is no item that can be streamed.
+
+        Parameters
+        ----------
+        path: str
+            Path of the lookup, relative to the API location
+        params: dict
+            Query parameters holding the code
+        """
+        try:
+            items = (await self._get(path, params))["items"]
+        except HTTPError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+
+        return first_available(items)
+
+    async def _playlist_index(self):
+        """Return a dictionary of the IDs of the user's playlists by name.
+
+        All playlists are only fetched on the first call. Afterwards, the
+        index is kept up to date as playlists are created and deleted.
+        """
+        if self._playlists is None:
+            user_id = await self._user_id()
+            playlists = {}
+            for playlist in await self._items("users/%s/playlists" % user_id):
+                playlists.setdefault(playlist["title"], []).append(
+                    playlist["uuid"]
+                )
+            if self._playlists is None:
+                self._playlists = playlists
+
+        return self._playlists
+
+    async def _request(
+        self, method, path, params=None, data=None, headers=None
+    ):
+        """Send a request to Tidal's listen API and return the response.
+
+        The session is identified by a header, like Tidal._request() does.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        path: str
+            Path relative to the API location
+        params: dict, optional
+            Additional query parameters
+        data: dict, optional
+            Form data to send
+        headers: dict, optional
+            Additional headers
+        """
+        session = await self._session()
+
+        headers = dict(headers or {})
+        headers["x-tidal-sessionid"] = session.session_id
+
+        return await self._send(
+            method, self.tidal.api_location + path, params, data, headers
+        )
+
+    async def _search(self, kind, name, artist=None):
+        """Search tidal and return the ID of the first item matching exactly.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'albums', 'artists' or 'tracks'
+        name: str
+            Name of the item
+        artist: str, optional
+            Artist of the item, if it isn't an artist itself
+        """
+        items = (
+            await self._get("search/" + kind, {"query": name, "limit": 50})
+        )["items"]
+
+        for item in items:
+            if artist is None:
+                if item["name"].lower() == name.lower():
+                    return item["id"]
+            elif item["artist"]["name"].lower() == artist.lower():
+                return item["id"]
+
+    async def _send(self, method, url, params, data, headers):
+        """Send a request and return the response, raising on errors.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            Absolute URL
+        params: dict
+            Query parameters
+        data: dict
+            Form data to send
+        headers: dict
+            Additional headers
+        """
+        response = await self.http.request(
+            method, url, params=params, data=data, headers=headers
+        )
+        response.raise_for_status()
+        return response
+
+    async def _session(self):
+        """Return the tidalapi session, logging in on first use."""
+        if self.tidal._tidal_session is None:
+            await asyncio.get_event_loop().run_in_executor(
+                None, self.tidal._connect_once
+            )
+        return self.tidal._tidal_session
+
+    async def _session_request(self, method, path, params=None, data=None):
+        """Send a request to tidalapi's API location and return the response.
+
+        The session parameters are added the same way tidalapi does, so
+        this goes where Tidal.tidal_session.request() goes.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        path: str
+            Path relative to tidalapi's API location
+        params: dict, optional
+            Additional query parameters
+        data: dict, optional
+            Form data to send
+        """
+        session = await self._session()
+
+        request_params = {
+            "sessionId": session.session_id,
+            "countryCode": session.country_code,
+            "limit": "999",
+        }
+        if params:
+            request_params.update(params)
+
+        return await self._send(
+            method,
+            urljoin(session._config.api_location, path),
+            request_params,
+            data,
+            {"x-tidal-sessionid": session.session_id},
+        )
+
+    async def _user_id(self):
+        """Return the ID of the logged in user."""
+        return (await self._session()).user.id
@@ -0,0 +1,105 @@
+from spotify2tidal.cache import normalize
+
+
+class AlbumIndex:
+    """In-memory index of all tracks of a single Tidal album.
+
+    Allows matching many Spotify tracks from the same album with a single
+    request for the album's tracklist, instead of one search per track.
+
+    Parameters
+    ----------
+    tracks: list
+        Track objects of the album as returned by Tidal's API
+    duration_tolerance: int, optional
+        Maximum difference in seconds for tracks to be considered the same
+    """
+    def __init__(self, tracks, duration_tolerance=3):
+        self.duration_tolerance = duration_tolerance
+
+        self._by_isrc = {}
+        self._by_position = {}
+        self._by_title = {}
+
+        for track in tracks:
+            if track.get("isrc"):
+                self._by_isrc.setdefault(track["isrc"], track)
+            position = (track.get("volumeNumber"), track.get("trackNumber"))
+            self._by_position.setdefault(position, track)
+            self._by_title.setdefault(normalize(track["title"]), []).append(
+                track
+            )
+
+    def find(self, track):
+        """Return the Tidal ID for a Spotify track, or None if not found.
+
+        Tracks are matched by ISRC first. Otherwise, a track at the same
+        position or with the same title is only accepted if the durations
+        agree as well.
+
+        Parameters
+        ----------
+        track: Track
+            Record of the Spotify track
+        """
+        if track.isrc in self._by_isrc:
+            return self._by_isrc[track.isrc]["id"]
+
+        duration = track.duration
+
+        position = (track.disc_number, track.track_number)
+        candidate = self._by_position.get(position)
+        if candidate and self._same(candidate, track.name, duration):
+            return candidate["id"]
+
+        for title in self._titles(track.name):
+            for candidate in self._by_title.get(title, []):
+                if self._similar_duration(candidate, duration):
+                    return candidate["id"]
+
+    def _same(self, candidate, name, duration):
+        """Whether a Tidal track has the given name and duration.
+
+        Parameters
+        ----------
+        candidate: dict
+            Tidal track object
+        name: str
+            Name of the Spotify track
+        duration: float
+            Duration of the Spotify track in seconds
+        """
+        return normalize(candidate["title"]) in self._titles(
+            name
+        ) and self._similar_duration(candidate, duration)
+
+    def _similar_duration(self, candidate, duration):
+        """Whether a Tidal track has about the given duration.
+
+        Parameters
+        ----------
+        candidate: dict
+            Tidal track object
+        duration: float
+            Duration of the Spotify track in seconds
+        """
+        if not duration or not candidate.get("duration"):
+            return True
+        return abs(candidate["duration"] - duration) <= self.duration_tolerance
+
+    @staticmethod
+    def _titles(name):
+        """Return the normalized titles a Spotify track name could match.
+
+        Spotify appends versions like ' - Remastered 2011' to the name, while
+        Tidal keeps them separately.
+
+        Parameters
+        ----------
+        name: str
+            Name of the Spotify track
+        """
+        titles = [normalize(name)]
+        if " - " in name:
+            titles.append(normalize(name.split(" - ")[0]))
+        return titles
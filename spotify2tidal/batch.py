@@ -0,0 +1,497 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from spotify2tidal.scheduler import Scheduler
+from spotify2tidal.spotify2tidal import Spotify2Tidal
+
+
+TASKS = {
+    "playlists": "copy_all_spotify_playlists",
+    "albums": "copy_all_saved_spotify_albums",
+    "artists": "copy_all_saved_spotify_artists",
+    "tracks": "copy_all_saved_spotify_tracks",
+    "discover_weekly": "copy_discover_weekly",
+}
+
+
+def load_manifest(path):
+    """Return the accounts listed in a manifest file.
+
+    The manifest is a JSON list with one object per account. Each object
+    holds the arguments for Spotify2Tidal, e.g. 'tidal_username' or
+    'spotify_client_id'. Two optional entries control the job:
+
+    - 'id': identifies the job, defaults to the Spotify and Tidal usernames
+    - 'tasks': what to copy, any of 'playlists', 'albums', 'artists',
+      'tracks' and 'discover_weekly'. Defaults to all but the latter.
+
+    Parameters
+    ----------
+    path: str
+        Location of the manifest
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def job_id(account):
+    """Return the ID of the job for an account.
+
+    Parameters
+    ----------
+    account: dict
+        Entry of the manifest
+    """
+    return account.get("id") or "%s:%s" % (
+        account["spotify_username"],
+        account["tidal_username"],
+    )
+
+
+class WorkQueue:
+    """Queue of migration jobs in a SQLite database.
+
+    Several processes, even on different machines sharing a filesystem, can
+    take jobs from the same queue. A job is leased to a single worker at a
+    time, which renews the lease while working on it. If the worker dies,
+    the lease runs out and another worker takes the job.
+
+    Only the IDs of the jobs are stored, so the passwords and secrets of
+    the accounts stay in the manifest.
+
+    The database is used without write-ahead logging, which doesn't work on
+    network filesystems.
+
+    Parameters
+    ----------
+    path: str
+        Location of the SQLite database
+    lease: int, optional
+        Seconds a lease lasts unless renewed, before others may take the job
+    max_attempts: int, optional
+        Number of times to try a job before giving up on it
+    """
+    def __init__(self, path, lease=6 * 3600, max_attempts=3):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+        self._connection = sqlite3.connect(
+            path, timeout=60, isolation_level=None
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT,"
+            " leased_until REAL,"
+            " error TEXT)"
+        )
+
+    def add(self, job_ids):
+        """Add each job not queued yet.
+
+        Return the number of jobs added.
+
+        Parameters
+        ----------
+        job_ids: list
+            IDs of the jobs, see job_id()
+        """
+        added = 0
+        with self._transaction():
+            for job in job_ids:
+                added += self._connection.execute(
+                    "INSERT OR IGNORE INTO jobs (id) VALUES (?)", (job,)
+                ).rowcount
+
+        return added
+
+    def claim(self, worker):
+        """Lease the next job to a worker.
+
+        Return the ID of the job, or None if there is no job left.
+
+        Jobs whose lease ran out on their last attempt are marked as failed.
+
+        Parameters
+        ----------
+        worker: str
+            Identifies the worker
+        """
+        now = time.time()
+
+        with self._transaction():
+            self._connection.execute(
+                "UPDATE jobs SET status = 'failed', leased_until = NULL,"
+                " error = 'Lease of ' || worker || ' ran out'"
+                " WHERE status = 'running' AND leased_until < ?"
+                " AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = self._connection.execute(
+                "SELECT id FROM jobs"
+                " WHERE attempts < ?"
+                " AND (status = 'pending'"
+                " OR (status = 'running' AND leased_until < ?))"
+                " ORDER BY attempts, rowid LIMIT 1",
+                (self.max_attempts, now),
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._connection.execute(
+                "UPDATE jobs SET status = 'running', worker = ?,"
+                " leased_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker, now + self.lease, row[0]),
+            )
+
+        return row[0]
+
+    def renew(self, job_id, worker):
+        """Extend the lease of a job by another lease period.
+
+        Return False if the worker doesn't hold the lease anymore.
+
+        Parameters
+        ----------
+        job_id: str
+            ID of the job
+        worker: str
+            Worker holding the lease
+        """
+        with self._transaction():
+            return bool(
+                self._connection.execute(
+                    "UPDATE jobs SET leased_until = ?"
+                    " WHERE id = ? AND worker = ? AND status = 'running'",
+                    (time.time() + self.lease, job_id, worker),
+                ).rowcount
+            )
+
+    def finish(self, job_id, worker, error=None):
+        """Mark a leased job as done, or as failed with an error.
+
+        Failed jobs are tried again until max_attempts is reached, then their
+        status becomes 'failed'. Return False and leave the job alone if the
+        worker doesn't hold the lease anymore, e.g. because it ran out and
+        another worker took the job over.
+
+        Parameters
+        ----------
+        job_id: str
+            ID of the job
+        worker: str
+            Worker holding the lease
+        error: str, optional
+            Description of the error, if the job failed
+        """
+        with self._transaction():
+            return bool(
+                self._connection.execute(
+                    "UPDATE jobs SET status = CASE"
+                    " WHEN ? IS NULL THEN 'done'"
+                    " WHEN attempts >= ? THEN 'failed'"
+                    " ELSE 'pending' END,"
+                    " leased_until = NULL, error = ?"
+                    " WHERE id = ? AND worker = ? AND status = 'running'",
+                    (error, self.max_attempts, error, job_id, worker),
+                ).rowcount
+            )
+
+    def counts(self):
+        """Return a dictionary with the number of jobs per status.
+
+        The status is one of 'pending', 'running', 'done' or 'failed'.
+        """
+        return dict(
+            self._connection.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            )
+        )
+
+    def close(self):
+        """Close the database."""
+        self._connection.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the write lock of the database until the block ends."""
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+
+class Batch:
+    """Migrate many accounts at once with a pool of processes.
+
+    Accounts are queued in a WorkQueue, from which every process takes one
+    job after the other. To add more machines, run work() on each of them
+    with the same queue_path on a shared filesystem. Each of them reads the
+    accounts from its own copy of the manifest.
+
+    All jobs share a single match cache, so an item found for one account
+    is not searched again for any other account. Each job also records its
+    progress in a journal under its ID, so failed jobs continue where they
+    stopped when they are tried again.
+
+    Spotify can't ask for permission without the user, so every Spotify
+    account needs a cached token, created by running Spotify2Tidal once
+    for it interactively.
+
+    Parameters
+    ----------
+    queue_path: str
+        Location of the work queue database
+    manifest_path: str
+        Location of the manifest listing the accounts, see load_manifest()
+    cache_path: str, optional
+        Location of the match cache shared by all jobs
+    journal_path: str, optional
+        Location of the journal shared by all jobs. It uses write-ahead
+        logging, so it has to be on a local disk.
+    lease: int, optional
+        Seconds without a sign of life from the worker of a job, before
+        another worker takes it over
+    max_attempts: int, optional
+        Number of times to try a job before giving up on it
+    spotify_limits: dict, optional
+        Arguments for the Scheduler of the requests to Spotify, e.g. rate
+        and burst. Every process has its own scheduler with these limits.
+    tidal_limits: dict, optional
+        Arguments for the Scheduler of the requests to Tidal
+
+    All other keyword arguments, like workers or chunk_size, are passed on
+    to Spotify2Tidal for every job.
+    """
+    spotify2tidal_class = Spotify2Tidal
+
+    def __init__(
+        self,
+        queue_path,
+        manifest_path,
+        cache_path=None,
+        journal_path=None,
+        lease=6 * 3600,
+        max_attempts=3,
+        spotify_limits=None,
+        tidal_limits=None,
+        **options
+    ):
+        self.queue_path = queue_path
+        self.manifest_path = manifest_path
+        self.cache_path = cache_path
+        self.journal_path = journal_path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.spotify_limits = spotify_limits
+        self.tidal_limits = tidal_limits
+        self.options = options
+
+        self._spotify_scheduler = None
+        self._tidal_scheduler = None
+
+    def add(self, accounts=None):
+        """Queue a job for each account not queued yet.
+
+        Return the number of jobs added.
+
+        Parameters
+        ----------
+        accounts: list, optional
+            Entries of the manifest to queue. Defaults to all of them.
+        """
+        if accounts is None:
+            accounts = load_manifest(self.manifest_path)
+
+        queue = self._queue()
+        try:
+            return queue.add(job_id(account) for account in accounts)
+        finally:
+            queue.close()
+
+    def run(self, processes=4):
+        """Work on all queued jobs with a pool of processes.
+
+        Return a dictionary with the number of jobs per status afterwards.
+
+        Parameters
+        ----------
+        processes: int, optional
+            Number of processes to run jobs in
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [
+                executor.submit(_work, self, "%d" % i)
+                for i in range(processes)
+            ]
+            for future in futures:
+                future.result()
+
+        queue = self._queue()
+        try:
+            return queue.counts()
+        finally:
+            queue.close()
+
+    def work(self, worker=None):
+        """Take jobs from the queue and run them until none are left.
+
+        Return the number of jobs finished successfully.
+
+        Parameters
+        ----------
+        worker: str, optional
+            Identifies this worker in the queue. Defaults to the host name
+            and process ID.
+        """
+        worker = worker or "%s:%d" % (socket.gethostname(), os.getpid())
+        accounts = {
+            job_id(account): account
+            for account in load_manifest(self.manifest_path)
+        }
+        queue = self._queue()
+        done = 0
+
+        try:
+            while True:
+                job = queue.claim(worker)
+                if job is None:
+                    return done
+
+                logging.getLogger(__name__).info(
+                    "%s: starting job %s", worker, job
+                )
+                stop = threading.Event()
+                heartbeat = threading.Thread(
+                    target=self._renew, args=(job, worker, stop)
+                )
+                heartbeat.daemon = True
+                heartbeat.start()
+                try:
+                    if job not in accounts:
+                        raise KeyError("Not in the manifest: %s" % job)
+                    self._migrate(job, accounts[job])
+                except Exception as e:
+                    logging.getLogger(__name__).exception(
+                        "%s: job %s failed", worker, job
+                    )
+                    error = "%s: %s" % (type(e).__name__, e)
+                else:
+                    error = None
+                finally:
+                    stop.set()
+                    heartbeat.join()
+
+                if not queue.finish(job, worker, error):
+                    logging.getLogger(__name__).warning(
+                        "%s: lost the lease of job %s", worker, job
+                    )
+                elif error is None:
+                    done += 1
+        finally:
+            queue.close()
+
+    def _renew(self, job, worker, stop):
+        """Renew the lease of a job until stop is set.
+
+        The lease is renewed three times per lease period, so a single
+        delayed renewal doesn't let it run out.
+
+        Parameters
+        ----------
+        job: str
+            ID of the job
+        worker: str
+            Worker holding the lease
+        stop: threading.Event
+            Set once the job is finished
+        """
+        # SQLite connections can't be shared between threads
+        queue = self._queue()
+        try:
+            while not stop.wait(self.lease / 3.0):
+                try:
+                    renewed = queue.renew(job, worker)
+                except sqlite3.Error:
+                    logging.getLogger(__name__).exception(
+                        "%s: could not renew the lease of job %s", worker, job
+                    )
+                    continue
+
+                if not renewed:
+                    logging.getLogger(__name__).warning(
+                        "%s: lost the lease of job %s", worker, job
+                    )
+                    return
+        finally:
+            queue.close()
+
+    def _migrate(self, job_id, account):
+        """Run the migration of a single account.
+
+        Parameters
+        ----------
+        job_id: str
+            ID of the job, also used in the journal
+        account: dict
+            Entry of the manifest
+        """
+        account = dict(account)
+        account.pop("id", None)
+        tasks = account.pop(
+            "tasks", ["playlists", "albums", "artists", "tracks"]
+        )
+        options = dict(self.options, **account)
+
+        # Jobs run one after the other in this process, so they share the
+        # limits. Schedulers can't be pickled, so they are created here.
+        if self._spotify_scheduler is None:
+            self._spotify_scheduler = Scheduler(**(self.spotify_limits or {}))
+            self._tidal_scheduler = Scheduler(**(self.tidal_limits or {}))
+
+        st = self.spotify2tidal_class(
+            spotify_scheduler=self._spotify_scheduler,
+            tidal_scheduler=self._tidal_scheduler,
+            cache_path=self.cache_path,
+            journal_path=self.journal_path,
+            job_id=job_id,
+            **options
+        )
+        try:
+            for task in tasks:
+                getattr(st, TASKS[task])()
+        finally:
+            st.close()
+
+    def _queue(self):
+        """Return a new connection to the work queue."""
+        return WorkQueue(self.queue_path, self.lease, self.max_attempts)
+
+
+def _work(batch, worker):
+    """Run Batch.work() in a pool process.
+
+    Parameters
+    ----------
+    batch: Batch
+        Batch to work on
+    worker: str
+        Number of the process within the pool
+    """
+    return batch.work(
+        "%s:%d:%s" % (socket.gethostname(), os.getpid(), worker)
+    )
@@ -0,0 +1,215 @@
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+def normalize(text):
+    """Return a normalized version of a name for matching and cache keys.
+
+    Parameters
+    ----------
+    text: str
+        Name of a track, album or artist
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.lower().split())
+
+
+class MatchCache:
+    """Persistent mapping of Spotify items to Tidal IDs.
+
+    Every resolved track, album or artist is stored in a SQLite database, so
+    consecutive runs don't have to search Tidal again for things that have
+    already been found.
+    Items that could not be found are stored as well, but only trusted for
+    `negative_ttl` seconds, since Tidal's catalog changes over time.
+
+    New entries are written to disk in batches, so the database is locked
+    only once per batch instead of once per item. Call flush() or close()
+    to write the last batch.
+
+    Parameters
+    ----------
+    path: str
+        Location of the SQLite database. Use ':memory:' for a cache that only
+        lives as long as the object.
+    negative_ttl: int, optional
+        Seconds to remember that an item could not be found
+    max_age: int, optional
+        Seconds after which any entry is evicted. Never evict if None.
+    max_entries: int, optional
+        Maximum number of entries to keep. The least recently updated entries
+        are evicted first. Unlimited if None.
+    batch_size: int, optional
+        Number of entries to collect before writing them to disk
+    """
+    PRUNE_INTERVAL = 1000
+
+    def __init__(
+        self,
+        path,
+        negative_ttl=7 * 24 * 3600,
+        max_age=180 * 24 * 3600,
+        max_entries=None,
+        batch_size=500,
+    ):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._writes = 0
+        # Other processes may share the database, wait for their writes
+        self._connection = sqlite3.connect(
+            path, timeout=60, check_same_thread=False
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            " kind TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " tidal_id,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (kind, key))"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS matches_updated ON matches (updated)"
+        )
+        self._connection.commit()
+        self.prune()
+
+    @staticmethod
+    def key(spotify_id, name, artist=None):
+        """Return the cache key for an item.
+
+        Parameters
+        ----------
+        spotify_id: str
+            Spotify ID of the item, if known
+        name: str
+            Name of the track, album or artist
+        artist: str, optional
+            Name of the artist of a track or album
+        """
+        return "%s:%s:%s" % (
+            spotify_id or "",
+            normalize(name),
+            normalize(artist),
+        )
+
+    def get(self, kind, key):
+        """Look up an item and return a tuple (found, tidal_id).
+
+        If found is False, the item has to be searched for. If found is True
+        and tidal_id is None, the item is known to be unavailable at Tidal.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        key: str
+            Key as created by key()
+        """
+        with self._lock:
+            row = self._pending.get((kind, key))
+            if row is None:
+                row = self._connection.execute(
+                    "SELECT tidal_id, updated FROM matches"
+                    " WHERE kind = ? AND key = ?",
+                    (kind, key),
+                ).fetchone()
+
+        if row is None:
+            return False, None
+
+        tidal_id, updated = row
+        age = time.time() - updated
+
+        if self.max_age is not None and age > self.max_age:
+            return False, None
+        if tidal_id is None and age > self.negative_ttl:
+            return False, None
+
+        return True, tidal_id
+
+    def set(self, kind, key, tidal_id):
+        """Store the Tidal ID for an item.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        key: str
+            Key as created by key()
+        tidal_id:
+            ID at Tidal, or None if the item could not be found
+        """
+        with self._lock:
+            self._pending[kind, key] = (tidal_id, time.time())
+            self._writes += 1
+            flush = len(self._pending) >= self.batch_size
+            prune = self._writes % self.PRUNE_INTERVAL == 0
+
+        if prune:
+            self.prune()
+        elif flush:
+            self.flush()
+
+    def flush(self):
+        """Write all new entries to disk."""
+        with self._lock:
+            self._flush()
+
+    def prune(self):
+        """Evict expired entries and enforce max_entries."""
+        now = time.time()
+
+        with self._lock:
+            self._flush()
+            if self.max_age is not None:
+                self._connection.execute(
+                    "DELETE FROM matches WHERE updated < ?",
+                    (now - self.max_age,),
+                )
+            self._connection.execute(
+                "DELETE FROM matches WHERE tidal_id IS NULL AND updated < ?",
+                (now - self.negative_ttl,),
+            )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    "DELETE FROM matches WHERE rowid IN ("
+                    " SELECT rowid FROM matches ORDER BY updated DESC"
+                    " LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._connection.commit()
+
+        logging.getLogger(__name__).debug("Pruned match cache: %s", self.path)
+
+    def close(self):
+        """Write all new entries to disk and close the database."""
+        with self._lock:
+            self._flush()
+            self._connection.close()
+
+    def _flush(self):
+        """Write all new entries to disk, while holding the lock."""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO matches (kind, key, tidal_id, updated)"
+            " VALUES (?, ?, ?, ?)",
+            [
+                (kind, key, tidal_id, updated)
+                for (kind, key), (tidal_id, updated) in pending.items()
+            ],
+        )
+        self._connection.commit()
@@ -0,0 +1,72 @@
+import threading
+
+from spotify2tidal.cache import normalize
+
+
+class Favorites:
+    """In-memory index of the favorite albums, artists or tracks at Tidal.
+
+    Items can be looked up by their Tidal ID, or by name and artist to find
+    out whether a Spotify item is already a favorite without searching.
+
+    Parameters
+    ----------
+    items: iterable, optional
+        Tuples (tidal_id, name, artist) of the favorites. The artist is None
+        for favorite artists.
+    """
+    def __init__(self, items=()):
+        self._lock = threading.Lock()
+        self._ids = set()
+        self._names = {}
+
+        for tidal_id, name, artist in items:
+            self.add(tidal_id, name, artist)
+
+    def __contains__(self, tidal_id):
+        return tidal_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    @staticmethod
+    def key(name, artist=None):
+        """Return the key to look up an item by name with.
+
+        Parameters
+        ----------
+        name: str
+            Name of the item
+        artist: str, optional
+            Name of the artist, if the item isn't an artist itself
+        """
+        return normalize(name), normalize(artist)
+
+    def add(self, tidal_id, name=None, artist=None):
+        """Add an item to the index.
+
+        Parameters
+        ----------
+        tidal_id: int
+            Tidal ID of the item
+        name: str, optional
+            Name of the item, if known
+        artist: str, optional
+            Name of the artist, if the item isn't an artist itself
+        """
+        with self._lock:
+            self._ids.add(tidal_id)
+            if name:
+                self._names.setdefault(self.key(name, artist), tidal_id)
+
+    def find(self, name, artist=None):
+        """Return the Tidal ID of a favorite by name, or None if not found.
+
+        Parameters
+        ----------
+        name: str
+            Name of the item
+        artist: str, optional
+            Name of the artist, if the item isn't an artist itself
+        """
+        return self._names.get(self.key(name, artist))
@@ -0,0 +1,154 @@
+import sqlite3
+import threading
+
+
+class Journal:
+    """Durable record of the progress of a migration job.
+
+    Every resolved item and every item written to Tidal is recorded under a
+    job ID. Running the same job again skips everything already done, so an
+    interrupted migration continues where it stopped.
+
+    The whole job is loaded into memory when the journal is opened, so
+    checking progress doesn't touch the database.
+
+    Parameters
+    ----------
+    path: str
+        Location of the SQLite database
+    job_id: str
+        Identifies the job. Use a new one to start over.
+    batch_size: int, optional
+        Number of resolutions to collect before writing them to disk
+    """
+    def __init__(self, path, job_id, batch_size=500):
+        self.path = path
+        self.job_id = job_id
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._pending = []
+        # Other processes may share the database, wait for their writes
+        self._connection = sqlite3.connect(
+            path, timeout=60, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            " job TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " tidal_id,"
+            " PRIMARY KEY (job, kind, key))"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS writes ("
+            " job TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " PRIMARY KEY (job, kind, key))"
+        )
+        self._connection.commit()
+
+        self._resolved = {
+            (kind, key): tidal_id
+            for kind, key, tidal_id in self._connection.execute(
+                "SELECT kind, key, tidal_id FROM resolutions WHERE job = ?",
+                (job_id,),
+            )
+        }
+        self._written = set(
+            self._connection.execute(
+                "SELECT kind, key FROM writes WHERE job = ?", (job_id,)
+            )
+        )
+
+    def resolved(self, kind, key):
+        """Return a tuple (found, tidal_id) for an item resolved before.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        key: str
+            Key of the item
+        """
+        try:
+            return True, self._resolved[kind, key]
+        except KeyError:
+            return False, None
+
+    def written(self, kind, key):
+        """Whether an item was already written to Tidal in this job.
+
+        Parameters
+        ----------
+        kind: str
+            Kind of the item, e.g. 'track' or 'playlist'
+        key: str
+            Key of the item
+        """
+        return (kind, key) in self._written
+
+    def record_resolution(self, kind, key, tidal_id):
+        """Record the Tidal ID found for an item.
+
+        Resolutions are written to disk in batches. Losing the last batch on
+        a crash only means resolving these items again.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        key: str
+            Key of the item
+        tidal_id:
+            ID at Tidal, or None if the item could not be found
+        """
+        with self._lock:
+            self._resolved[kind, key] = tidal_id
+            self._pending.append((self.job_id, kind, key, tidal_id))
+            flush = len(self._pending) >= self.batch_size
+
+        if flush:
+            self.flush()
+
+    def record_written(self, kind, keys):
+        """Record that items were written to Tidal and save it to disk.
+
+        Parameters
+        ----------
+        kind: str
+            Kind of the items, e.g. 'track' or 'playlist'
+        keys: list
+            Keys of the items
+        """
+        keys = list(keys)
+
+        with self._lock:
+            self._written.update((kind, key) for key in keys)
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO writes (job, kind, key)"
+                " VALUES (?, ?, ?)",
+                [(self.job_id, kind, key) for key in keys],
+            )
+
+        self.flush()
+
+    def flush(self):
+        """Write all recorded progress to disk."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO resolutions (job, kind, key, tidal_id)"
+                " VALUES (?, ?, ?, ?)",
+                pending,
+            )
+            self._connection.commit()
+
+    def close(self):
+        """Write all recorded progress to disk and close the database."""
+        self.flush()
+        with self._lock:
+            self._connection.close()
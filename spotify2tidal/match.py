@@ -0,0 +1,61 @@
+from spotify2tidal.cache import MatchCache
+
+
+class Match:
+    """Result of looking up a single Spotify item at Tidal.
+
+    Parameters
+    ----------
+    kind: str
+        One of 'track', 'album' or 'artist'
+    name: str
+        Name of the item
+    artist: str
+        Name of the artist. For artists, this is the same as name.
+    spotify_id: str
+        ID of the item at Spotify
+    tidal_id: int
+        ID of the item at Tidal, or None if it could not be found
+    strategy: str, optional
+        How the item was found, e.g. 'isrc', 'upc', 'search', 'cache' or
+        'favorite'
+    """
+    __slots__ = (
+        "kind",
+        "name",
+        "artist",
+        "spotify_id",
+        "tidal_id",
+        "strategy",
+    )
+
+    def __init__(
+        self, kind, name, artist, spotify_id, tidal_id, strategy=None
+    ):
+        self.kind = kind
+        self.name = name
+        self.artist = artist
+        self.spotify_id = spotify_id
+        self.tidal_id = tidal_id
+        self.strategy = strategy
+
+    @property
+    def found(self):
+        """Whether the item is available at Tidal."""
+        return self.tidal_id is not None
+
+    @property
+    def key(self):
+        """Key of the item in the match cache and the journal."""
+        if self.kind == "artist":
+            return MatchCache.key(self.spotify_id, self.name)
+        return MatchCache.key(self.spotify_id, self.name, self.artist)
+
+    def __repr__(self):
+        return "Match(%s: %s - %s -> %s via %s)" % (
+            self.kind,
+            self.artist,
+            self.name,
+            self.tidal_id,
+            self.strategy,
+        )
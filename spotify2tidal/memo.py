@@ -0,0 +1,153 @@
+import threading
+from concurrent.futures import Future
+
+
+class Memo:
+    """Remember the results of lookups until they are cleared.
+
+    Identical lookups are only done once. If a lookup is requested while the
+    same lookup is still in progress in another thread, the caller waits for
+    that result instead of sending another request.
+
+    Statistics about how many lookups were saved are kept in `hits`
+    (already known), `coalesced` (waited for a running lookup) and `misses`
+    (actually looked up).
+    """
+    def __init__(self):
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._results = {}
+        self._pending = {}
+
+    @property
+    def stats(self):
+        """Dictionary with the number of hits, coalesced lookups and misses."""
+        return {
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+        }
+
+    def get(self, key, compute):
+        """Return the result for a key, computing it only once.
+
+        If compute raises an exception, the exception is passed on to all
+        callers waiting for it, and the next call tries again.
+
+        Parameters
+        ----------
+        key:
+            Hashable key identifying the lookup
+        compute: callable
+            Does the actual lookup and returns its result
+        """
+        known, result, future, owner = self._begin(key)
+        if known:
+            return result
+        if not owner:
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+
+        self._finish(key, future, result)
+        return result
+
+    async def get_async(self, key, compute):
+        """Return the result for a key from a coroutine, see get().
+
+        Lookups running in threads and in coroutines are coalesced alike.
+
+        Parameters
+        ----------
+        key:
+            Hashable key identifying the lookup
+        compute: callable
+            Returns an awaitable doing the actual lookup
+        """
+        import asyncio
+
+        known, result, future, owner = self._begin(key)
+        if known:
+            return result
+        if not owner:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+
+        self._finish(key, future, result)
+        return result
+
+    def clear(self):
+        """Forget all remembered results. The statistics are kept."""
+        with self._lock:
+            self._results.clear()
+
+    def _begin(self, key):
+        """Start a lookup and return a tuple (known, result, future, owner).
+
+        If the result is known already, known is True. Otherwise, future
+        receives the result, and owner tells whether the caller has to do
+        the lookup.
+
+        Parameters
+        ----------
+        key:
+            Hashable key identifying the lookup
+        """
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                return True, self._results[key], None, False
+
+            future = self._pending.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return False, None, future, False
+
+            self.misses += 1
+            future = self._pending[key] = Future()
+            return False, None, future, True
+
+    def _finish(self, key, future, result):
+        """Remember the result of a lookup and pass it on to waiting callers.
+
+        Parameters
+        ----------
+        key:
+            Hashable key identifying the lookup
+        future: concurrent.futures.Future
+            Future returned by _begin()
+        result:
+            Result of the lookup
+        """
+        with self._lock:
+            self._results[key] = result
+            del self._pending[key]
+        future.set_result(result)
+
+    def _fail(self, key, future, error):
+        """Pass the exception of a failed lookup on to waiting callers.
+
+        Parameters
+        ----------
+        key:
+            Hashable key identifying the lookup
+        future: concurrent.futures.Future
+            Future returned by _begin()
+        error: BaseException
+            Exception raised by the lookup
+        """
+        with self._lock:
+            del self._pending[key]
+        future.set_exception(error)
@@ -0,0 +1,477 @@
+import copy
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def endpoint(url):
+    """Return the path of a URL with all IDs replaced by '{id}'.
+
+    Parameters
+    ----------
+    url: str
+        URL of a request to Spotify or Tidal
+    """
+    path = urlparse(url).path
+    path = re.sub(r"^/v1", "", path)
+    path = re.sub(r"/users/[^/]+", "/users/{id}", path)
+    return re.sub(r"/(?=[^/]*\d)[^/]+", "/{id}", path)
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets.
+
+    Parameters
+    ----------
+    buckets: tuple
+        Upper bounds of the buckets, in ascending order
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Add a single value.
+
+        Parameters
+        ----------
+        value: float
+            Value to add
+        """
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket containing a quantile.
+
+        Returns None if nothing was observed, and infinity if the quantile
+        is beyond the largest bucket.
+
+        Parameters
+        ----------
+        q: float
+            Quantile between 0 and 1
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def cumulative(self):
+        """Return a list of tuples (upper bound, number of values <= bound).
+
+        The last bound is infinity and counts all values.
+        """
+        result = []
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            result.append((bound, seen))
+        return result
+
+
+class Phase:
+    """A span of time in which part of a migration happened.
+
+    Parameters
+    ----------
+    name: str
+        One of 'fetch', 'resolve' or 'write'
+    label: str
+        What was processed, e.g. the name of a playlist
+    start: float
+        Seconds since the start of the run
+    """
+    __slots__ = ("name", "label", "start", "duration", "items")
+
+    def __init__(self, name, label, start):
+        self.name = name
+        self.label = label
+        self.start = start
+        self.duration = 0.0
+        self.items = 0
+
+    def to_dict(self):
+        """Return the phase as a JSON serializable dictionary."""
+        return {
+            "phase": self.name,
+            "label": self.label,
+            "start": round(self.start, 3),
+            "duration": round(self.duration, 3),
+            "items": self.items,
+        }
+
+
+class Metrics:
+    """Collect measurements of a migration run.
+
+    Records the latency and outcome of every request sent to Spotify and
+    Tidal, how items were matched, and how long the phases of the migration
+    took. Everything can be exported as a JSON report with write_json(), or
+    as a Prometheus textfile with write_prometheus().
+
+    Fetching from Spotify happens while resolving at Tidal, so 'fetch'
+    phases only count the time spent waiting for Spotify and overlap with
+    'resolve' phases.
+
+    It is safe to record measurements from several threads at once.
+    """
+    def __init__(self):
+        self.started = time.time()
+
+        self._clock = time.monotonic()
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._requests = Counter()
+        self._retries = Counter()
+        self._matches = Counter()
+        self._phases = []
+
+    def observe_request(self, service, method, url, seconds, status):
+        """Record a single request.
+
+        Parameters
+        ----------
+        service: str
+            'spotify' or 'tidal'
+        method: str
+            HTTP method
+        url: str
+            URL of the request
+        seconds: float
+            Time until the response arrived
+        status:
+            HTTP status code, or 'error' if no response arrived
+        """
+        key = (service, method.upper(), endpoint(url))
+
+        with self._lock:
+            if key not in self._latency:
+                self._latency[key] = Histogram()
+            self._latency[key].observe(seconds)
+            self._requests[key + (str(status),)] += 1
+
+    def observe_retry(self, service):
+        """Record that a request to a service is being sent again.
+
+        Parameters
+        ----------
+        service: str
+            'spotify' or 'tidal'
+        """
+        with self._lock:
+            self._retries[service] += 1
+
+    def observe_matches(self, matches):
+        """Record how items were matched.
+
+        Parameters
+        ----------
+        matches: list
+            Match objects
+        """
+        counts = Counter((m.kind, m.strategy or "none") for m in matches)
+
+        with self._lock:
+            self._matches.update(counts)
+
+    @contextmanager
+    def phase(self, name, label=None):
+        """Record the duration of a phase.
+
+        Use as a context manager. The number of items processed can be set
+        on the Phase object it returns.
+
+        Parameters
+        ----------
+        name: str
+            One of 'fetch', 'resolve' or 'write'
+        label: str, optional
+            What is processed, e.g. the name of a playlist
+        """
+        phase = Phase(name, label, time.monotonic() - self._clock)
+        try:
+            yield phase
+        finally:
+            phase.duration = time.monotonic() - self._clock - phase.start
+            with self._lock:
+                self._phases.append(phase)
+
+    def fetch(self, items, label=None):
+        """Yield items, recording the time spent waiting for them.
+
+        Parameters
+        ----------
+        items: iterable
+            Items fetched lazily, e.g. pages from Spotify
+        label: str, optional
+            What is fetched
+        """
+        phase = Phase("fetch", label, time.monotonic() - self._clock)
+        iterator = iter(items)
+
+        try:
+            while True:
+                start = time.monotonic()
+                try:
+                    item = next(iterator)
+                finally:
+                    phase.duration += time.monotonic() - start
+                phase.items += 1
+                yield item
+        except StopIteration:
+            return
+        finally:
+            with self._lock:
+                self._phases.append(phase)
+
+    def report(self):
+        """Return all measurements as a JSON serializable dictionary."""
+        latency, requests, retries, matches, phases = self._snapshot()
+
+        endpoints = []
+        for (service, method, path), histogram in sorted(latency.items()):
+            endpoints.append(
+                {
+                    "service": service,
+                    "method": method,
+                    "endpoint": path,
+                    "requests": histogram.count,
+                    "seconds": round(histogram.sum, 3),
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "status": {
+                        status: count
+                        for (s, m, p, status), count in sorted(
+                            requests.items()
+                        )
+                        if (s, m, p) == (service, method, path)
+                    },
+                }
+            )
+
+        kinds = {}
+        for (kind, strategy), count in sorted(matches.items()):
+            kinds.setdefault(kind, {})[strategy] = count
+        for kind, strategies in kinds.items():
+            total = sum(strategies.values())
+            strategies["hit_rate"] = round(
+                1 - strategies.get("none", 0) / float(total), 4
+            )
+
+        totals = {}
+        for phase in phases:
+            total = totals.setdefault(
+                phase.name, {"seconds": 0.0, "items": 0}
+            )
+            total["seconds"] += phase.duration
+            total["items"] += phase.items
+        for total in totals.values():
+            total["items_per_second"] = (
+                round(total["items"] / total["seconds"], 1)
+                if total["seconds"]
+                else None
+            )
+            total["seconds"] = round(total["seconds"], 3)
+
+        return {
+            "started": self.started,
+            "duration": round(time.monotonic() - self._clock, 3),
+            "requests": sum(requests.values()),
+            "errors": sum(
+                count
+                for key, count in requests.items()
+                if not key[3].isdigit() or int(key[3]) >= 400
+            ),
+            "retries": dict(retries),
+            "endpoints": endpoints,
+            "matches": kinds,
+            "phases": totals,
+            "timeline": [p.to_dict() for p in sorted(
+                phases, key=lambda p: p.start
+            )],
+        }
+
+    def write_json(self, path):
+        """Write the report as JSON to a file.
+
+        Parameters
+        ----------
+        path: str
+            Location of the file
+        """
+        self._write(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, path):
+        """Write the measurements in Prometheus' text format to a file.
+
+        The file is replaced atomically, so it can be picked up by the
+        textfile collector of the node exporter at any time.
+
+        Parameters
+        ----------
+        path: str
+            Location of the file, should end with '.prom'
+        """
+        latency, requests, retries, matches, phases = self._snapshot()
+
+        lines = [
+            "# HELP spotify2tidal_request_duration_seconds"
+            " Latency of requests to Spotify and Tidal",
+            "# TYPE spotify2tidal_request_duration_seconds histogram",
+        ]
+        for (service, method, path_), histogram in sorted(latency.items()):
+            labels = _labels(service=service, method=method, endpoint=path_)
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else str(bound)
+                lines.append(
+                    "spotify2tidal_request_duration_seconds_bucket{%s} %d"
+                    % (labels + ',le="%s"' % le, count)
+                )
+            lines.append(
+                "spotify2tidal_request_duration_seconds_sum{%s} %f"
+                % (labels, histogram.sum)
+            )
+            lines.append(
+                "spotify2tidal_request_duration_seconds_count{%s} %d"
+                % (labels, histogram.count)
+            )
+
+        lines += [
+            "# HELP spotify2tidal_requests_total Responses by status",
+            "# TYPE spotify2tidal_requests_total counter",
+        ]
+        for (service, method, path_, status), count in sorted(
+            requests.items()
+        ):
+            lines.append(
+                "spotify2tidal_requests_total{%s} %d"
+                % (
+                    _labels(
+                        service=service,
+                        method=method,
+                        endpoint=path_,
+                        status=status,
+                    ),
+                    count,
+                )
+            )
+
+        lines += [
+            "# HELP spotify2tidal_retries_total Requests sent again",
+            "# TYPE spotify2tidal_retries_total counter",
+        ]
+        for service, count in sorted(retries.items()):
+            lines.append(
+                "spotify2tidal_retries_total{%s} %d"
+                % (_labels(service=service), count)
+            )
+
+        lines += [
+            "# HELP spotify2tidal_matches_total Items by how they were found",
+            "# TYPE spotify2tidal_matches_total counter",
+        ]
+        for (kind, strategy), count in sorted(matches.items()):
+            lines.append(
+                "spotify2tidal_matches_total{%s} %d"
+                % (_labels(kind=kind, strategy=strategy), count)
+            )
+
+        totals = Counter()
+        items = Counter()
+        for phase in phases:
+            totals[phase.name] += phase.duration
+            items[phase.name] += phase.items
+
+        lines += [
+            "# HELP spotify2tidal_phase_seconds Time spent in each phase",
+            "# TYPE spotify2tidal_phase_seconds gauge",
+        ]
+        for name, seconds in sorted(totals.items()):
+            lines.append(
+                "spotify2tidal_phase_seconds{%s} %f"
+                % (_labels(phase=name), seconds)
+            )
+        lines += [
+            "# HELP spotify2tidal_phase_items Items processed in each phase",
+            "# TYPE spotify2tidal_phase_items gauge",
+        ]
+        for name, count in sorted(items.items()):
+            lines.append(
+                "spotify2tidal_phase_items{%s} %d"
+                % (_labels(phase=name), count)
+            )
+
+        lines += [
+            "# HELP spotify2tidal_run_start_time_seconds Start of the run",
+            "# TYPE spotify2tidal_run_start_time_seconds gauge",
+            "spotify2tidal_run_start_time_seconds %f" % self.started,
+        ]
+
+        self._write(path, "\n".join(lines) + "\n")
+
+    def _snapshot(self):
+        """Return copies of all measurements taken so far."""
+        with self._lock:
+            return (
+                {
+                    key: copy.deepcopy(histogram)
+                    for key, histogram in self._latency.items()
+                },
+                Counter(self._requests),
+                Counter(self._retries),
+                Counter(self._matches),
+                list(self._phases),
+            )
+
+    @staticmethod
+    def _write(path, text):
+        """Replace a file atomically with some text.
+
+        Parameters
+        ----------
+        path: str
+            Location of the file
+        text: str
+            New content of the file
+        """
+        temporary = path + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(text)
+        os.replace(temporary, path)
+
+
+def _labels(**labels):
+    """Return Prometheus labels for keyword arguments, sorted by name."""
+    return ",".join(
+        '%s="%s"'
+        % (
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in sorted(labels.items())
+    )
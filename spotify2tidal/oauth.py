@@ -0,0 +1,57 @@
+import base64
+import logging
+
+import spotipy.oauth2
+
+
+class ScheduledOAuth(spotipy.oauth2.SpotifyOAuth):
+    """spotipy OAuth refreshing tokens through a shared HTTP session.
+
+    spotipy requests new tokens on its own. This sends these requests with
+    a requests.Session instead, so they go through its scheduler like all
+    other requests to Spotify.
+
+    Parameters
+    ----------
+    http: requests.Session
+        Session to send the requests for new tokens with
+
+    All other parameters are passed on to SpotifyOAuth.
+    """
+    def __init__(self, http, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.http = http
+
+    def refresh_access_token(self, refresh_token):
+        """Return new token info, or None if Spotify refused to refresh.
+
+        Parameters
+        ----------
+        refresh_token: str
+            Refresh token of the expired token
+        """
+        credentials = "%s:%s" % (self.client_id, self.client_secret)
+        response = self.http.post(
+            self.OAUTH_TOKEN_URL,
+            data={
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token",
+            },
+            headers={
+                "Authorization": "Basic %s"
+                % base64.b64encode(credentials.encode()).decode()
+            },
+            proxies=self.proxies,
+        )
+        if response.status_code != 200:
+            logging.getLogger(__name__).warning(
+                "Could not refresh token: %d %s",
+                response.status_code,
+                response.reason,
+            )
+            return None
+
+        token_info = self._add_custom_values_to_token_info(response.json())
+        token_info.setdefault("refresh_token", refresh_token)
+        self._save_token_info(token_info)
+        return token_info
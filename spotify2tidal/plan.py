@@ -0,0 +1,133 @@
+import json
+
+from spotify2tidal.match import Match
+
+
+class PlanWriter:
+    """Write a migration plan to a file, one JSON object per line.
+
+    A plan is a sequence of sections. Each section starts with a header and
+    is followed by its items:
+
+    - {"type": "playlist", "name": ..., "key": ..., "action": ...} starts a
+      playlist. The action is 'replace' to create it from scratch, 'sync' to
+      update a playlist with the same name in place, 'done' if the journal
+      has it recorded as written already, or 'unchanged' if it didn't
+      change at Spotify since it was last copied. Playlists to write also
+      have the 'snapshot_id' they were planned at.
+    - {"type": "favorites", "kind": ...} starts the saved albums, artists or
+      tracks.
+
+    Items are {"type": "item", "kind": ..., "name": ..., "artist": ...,
+    "spotify_id": ..., "tidal_id": ..., "strategy": ..., "action": ...}.
+    Their action is one of:
+
+    - 'add': add the item to the playlist or to the favorites
+    - 'missing': the item could not be found at Tidal
+    - 'exists': the item is a favorite at Tidal already
+    - 'done': the journal has the item recorded as written already
+
+    Parameters
+    ----------
+    path: str
+        Location of the plan. An existing file is overwritten.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w")
+
+    def playlist(self, name, key, action, snapshot_id=None):
+        """Start the section of a playlist.
+
+        Parameters
+        ----------
+        name: str
+            Name of the playlist in Tidal
+        key: str
+            Key of the playlist in the journal
+        action: str
+            One of 'replace', 'sync', 'done' or 'unchanged'
+        snapshot_id: str, optional
+            Snapshot ID of the Spotify playlist
+        """
+        entry = {
+            "type": "playlist",
+            "name": name,
+            "key": key,
+            "action": action,
+        }
+        if snapshot_id:
+            entry["snapshot_id"] = snapshot_id
+        self._write(entry)
+
+    def favorites(self, kind):
+        """Start the section of the saved items of a kind.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        """
+        self._write({"type": "favorites", "kind": kind})
+
+    def item(self, match, action):
+        """Add an item to the current section.
+
+        Parameters
+        ----------
+        match: Match
+            Result of looking up the item at Tidal
+        action: str
+            One of 'add', 'missing', 'exists' or 'done'
+        """
+        self._write(
+            {
+                "type": "item",
+                "kind": match.kind,
+                "name": match.name,
+                "artist": match.artist,
+                "spotify_id": match.spotify_id,
+                "tidal_id": match.tidal_id,
+                "strategy": match.strategy,
+                "action": action,
+            }
+        )
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+def read_plan(path):
+    """Yield the entries of a migration plan one after the other.
+
+    Parameters
+    ----------
+    path: str
+        Location of a plan written by PlanWriter
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def to_match(entry):
+    """Return the Match of an item entry of a plan.
+
+    Parameters
+    ----------
+    entry: dict
+        Entry of type 'item'
+    """
+    return Match(
+        entry["kind"],
+        entry["name"],
+        entry["artist"],
+        entry["spotify_id"],
+        entry["tidal_id"],
+        entry["strategy"],
+    )
@@ -0,0 +1,73 @@
+from urllib.parse import urljoin
+
+import tidalapi
+
+
+class PooledSession(tidalapi.Session):
+    """tidalapi session sending all requests through a shared HTTP session.
+
+    tidalapi opens a new connection for every request, including the login.
+    This reuses the connections of a requests.Session instead.
+
+    Parameters
+    ----------
+    http: requests.Session
+        Session to send all requests with
+    """
+    def __init__(self, http):
+        super().__init__()
+        self.http = http
+
+    def login(self, username, password):
+        """Log in to Tidal and return True.
+
+        Parameters
+        ----------
+        username: str
+            Tidal username
+        password: str
+            Tidal password
+        """
+        r = self.http.post(
+            urljoin(self._config.api_location, "login/username"),
+            params={"token": self._config.api_token},
+            data={"username": username, "password": password},
+        )
+        r.raise_for_status()
+
+        body = r.json()
+        self.session_id = body["sessionId"]
+        self.country_code = body["countryCode"]
+        self.user = tidalapi.User(self, id=body["userId"])
+        return True
+
+    def request(self, method, path, params=None, data=None):
+        """Send a request to the Tidal API and return the response.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        path: str
+            Path relative to the API location
+        params: dict, optional
+            Additional query parameters
+        data: dict, optional
+            Form data to send
+        """
+        request_params = {
+            "sessionId": self.session_id,
+            "countryCode": self.country_code,
+            "limit": "999",
+        }
+        if params:
+            request_params.update(params)
+
+        r = self.http.request(
+            method,
+            urljoin(self._config.api_location, path),
+            params=request_params,
+            data=data,
+        )
+        r.raise_for_status()
+        return r
@@ -0,0 +1,188 @@
+class Artist:
+    """Compact record of a Spotify artist.
+
+    Parameters
+    ----------
+    id: str
+        ID of the artist at Spotify
+    name: str
+        Name of the artist
+    """
+    __slots__ = ("id", "name")
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def __repr__(self):
+        return "Artist(%s)" % self.name
+
+    @classmethod
+    def from_spotify(cls, artist):
+        """Return a record for a spotipy artist object.
+
+        Parameters
+        ----------
+        artist: dict
+            spotipy artist object
+        """
+        return cls(artist.get("id"), artist["name"])
+
+
+class Album:
+    """Compact record of a Spotify album.
+
+    Parameters
+    ----------
+    id: str
+        ID of the album at Spotify
+    name: str
+        Name of the album
+    artists: tuple
+        Names of the album's artists
+    upc: str, optional
+        Universal Product Code of the album, if known
+    added_at: str, optional
+        When the album was saved, for saved albums
+    """
+    __slots__ = ("id", "name", "artists", "upc", "added_at")
+
+    def __init__(self, id, name, artists, upc=None, added_at=None):
+        self.id = id
+        self.name = name
+        self.artists = artists
+        self.upc = upc
+        self.added_at = added_at
+
+    def __repr__(self):
+        return "Album(%s - %s)" % (self.artist, self.name)
+
+    @property
+    def artist(self):
+        """Name of the first artist, or None if there is none."""
+        return self.artists[0] if self.artists else None
+
+    @classmethod
+    def from_spotify(cls, album, added_at=None):
+        """Return a record for a spotipy album object.
+
+        Parameters
+        ----------
+        album: dict
+            spotipy album object
+        added_at: str, optional
+            When the album was saved
+        """
+        return cls(
+            album.get("id"),
+            album["name"],
+            tuple(a["name"] for a in album.get("artists", ())),
+            (album.get("external_ids") or {}).get("upc"),
+            added_at,
+        )
+
+
+class Track:
+    """Compact record of a Spotify track.
+
+    Only keeps what is needed to find the track at Tidal.
+
+    Parameters
+    ----------
+    id: str
+        ID of the track at Spotify. None for local files.
+    name: str
+        Name of the track
+    artists: tuple
+        Names of the track's artists
+    album: Album
+        Album of the track
+    isrc: str, optional
+        International Standard Recording Code of the track, if known
+    duration: float, optional
+        Length of the track in seconds
+    disc_number: int, optional
+        Disc of the album the track is on
+    track_number: int, optional
+        Position of the track on its disc
+    added_at: str, optional
+        When the track was saved or added to the playlist
+    """
+    __slots__ = (
+        "id",
+        "name",
+        "artists",
+        "album",
+        "isrc",
+        "duration",
+        "disc_number",
+        "track_number",
+        "added_at",
+    )
+
+    def __init__(
+        self,
+        id,
+        name,
+        artists,
+        album,
+        isrc=None,
+        duration=None,
+        disc_number=None,
+        track_number=None,
+        added_at=None,
+    ):
+        self.id = id
+        self.name = name
+        self.artists = artists
+        self.album = album
+        self.isrc = isrc
+        self.duration = duration
+        self.disc_number = disc_number
+        self.track_number = track_number
+        self.added_at = added_at
+
+    def __repr__(self):
+        return "Track(%s - %s)" % (self.artist, self.name)
+
+    @property
+    def artist(self):
+        """Name of the first artist, or None if there is none."""
+        return self.artists[0] if self.artists else None
+
+    @classmethod
+    def from_spotify(cls, track, added_at=None, albums=None):
+        """Return a record for a spotipy track object.
+
+        Parameters
+        ----------
+        track: dict
+            spotipy track object
+        added_at: str, optional
+            When the track was saved or added to the playlist
+        albums: dict, optional
+            Album records by ID to share between tracks of the same album
+        """
+        album = None
+        if track.get("album"):
+            album_id = track["album"].get("id")
+            if albums is not None and album_id in albums:
+                album = albums[album_id]
+            else:
+                album = Album.from_spotify(track["album"])
+                if albums is not None and album_id:
+                    albums[album_id] = album
+
+        duration = track.get("duration_ms")
+
+        return cls(
+            track.get("id"),
+            track["name"],
+            tuple(a["name"] for a in track.get("artists", ())),
+            album,
+            (track.get("external_ids") or {}).get("isrc"),
+            duration / 1000.0 if duration else None,
+            track.get("disc_number"),
+            track.get("track_number"),
+            added_at,
+        )
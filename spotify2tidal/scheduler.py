@@ -0,0 +1,323 @@
+import logging
+import random
+import threading
+import time
+
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class TokenBucket:
+    """Limit the rate of requests to a service.
+
+    Parameters
+    ----------
+    rate: float
+        Requests per second allowed on average
+    burst: int
+        Number of requests allowed at once after a quiet period
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def acquire(self):
+        """Wait until a request may be sent."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def reserve(self):
+        """Take a token and return the seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+
+            # Reserve a token even if there is none yet, so that waiting
+            # callers are served in order
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+
+class Scheduler:
+    """Send requests to a service without exceeding its limits.
+
+    Requests are limited by a token bucket and by the number of requests in
+    flight at once. The latter adapts to the service: every throttled
+    response (HTTP 429) halves it, every successful response raises it
+    slowly again, up to max_concurrency.
+
+    Throttled requests are retried after the time given by the service in
+    'Retry-After'. Meanwhile, no other request is sent to the service.
+    Server errors and connection problems are retried with a jittered
+    exponential backoff, but only for idempotent requests.
+
+    Requests can be sent from threads with send() and from coroutines with
+    send_async(). Both share the same limits.
+
+    Parameters
+    ----------
+    rate: float, optional
+        Requests per second allowed on average
+    burst: int, optional
+        Number of requests allowed at once after a quiet period
+    max_concurrency: int, optional
+        Maximum number of requests in flight at once
+    max_retries: int, optional
+        Number of times to retry a single request
+    backoff: float, optional
+        Seconds to wait before the first retry of a failed request
+    max_backoff: float, optional
+        Maximum number of seconds to wait before a retry
+    """
+    def __init__(
+        self,
+        rate=10.0,
+        burst=20,
+        max_concurrency=16,
+        max_retries=5,
+        backoff=1.0,
+        max_backoff=60.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.throttled = 0
+        self.retries = 0
+
+        self._bucket = TokenBucket(rate, burst)
+        self._condition = threading.Condition()
+        self._limit = float(max_concurrency)
+        self._active = 0
+        self._blocked_until = 0.0
+        self._waiters = []
+
+    @property
+    def concurrency(self):
+        """Current number of requests allowed in flight at once."""
+        return max(1, int(self._limit))
+
+    def send(self, request, idempotent=True):
+        """Send a request and return its response.
+
+        Parameters
+        ----------
+        request: callable
+            Sends the request and returns a requests.Response
+        idempotent: bool, optional
+            Whether the request may be repeated after a server error
+        """
+        import requests
+
+        attempt = 0
+
+        while True:
+            self._acquire()
+            try:
+                response = request()
+            except (requests.ConnectionError, requests.Timeout):
+                self._release()
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            except BaseException:
+                self._release()
+                raise
+            else:
+                delay = self._outcome(response, idempotent, attempt)
+                if delay is None:
+                    return response
+
+            attempt += 1
+            self.retries += 1
+            logging.getLogger(__name__).debug(
+                "Retrying request in %.1f seconds", delay
+            )
+            time.sleep(delay)
+
+    async def send_async(self, request, idempotent=True):
+        """Send a request from a coroutine and return its response.
+
+        Like send(), but waits without blocking the event loop.
+
+        Parameters
+        ----------
+        request: callable
+            Returns an awaitable sending the request and returning a
+            spotify2tidal.ahttp.Response
+        idempotent: bool, optional
+            Whether the request may be repeated after a server error
+        """
+        import asyncio
+
+        from spotify2tidal.ahttp import ConnectError
+
+        attempt = 0
+
+        while True:
+            await self._acquire_async()
+            try:
+                response = await request()
+            except ConnectError:
+                self._release()
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            except BaseException:
+                self._release()
+                raise
+            else:
+                delay = self._outcome(response, idempotent, attempt)
+                if delay is None:
+                    return response
+
+            attempt += 1
+            self.retries += 1
+            logging.getLogger(__name__).debug(
+                "Retrying request in %.1f seconds", delay
+            )
+            await asyncio.sleep(delay)
+
+    def _outcome(self, response, idempotent, attempt):
+        """Release a sent request and return the seconds to wait for a retry.
+
+        Return None if the response is final.
+
+        Parameters
+        ----------
+        response:
+            Response of the request, with status_code and headers
+        idempotent: bool
+            Whether the request may be repeated after a server error
+        attempt: int
+            Number of retries so far
+        """
+        status = response.status_code
+        if status == 429 and attempt < self.max_retries:
+            self._release(throttled=True)
+            delay = self._retry_after(response, attempt)
+            self._block(delay)
+            return delay
+        if 500 <= status < 600 and idempotent and attempt < self.max_retries:
+            self._release()
+            return self._backoff(attempt)
+
+        self._release(success=status < 400)
+        return None
+
+    def _acquire(self):
+        """Wait until a request may be sent."""
+        with self._condition:
+            while self._active >= self.concurrency:
+                self._condition.wait()
+            self._active += 1
+
+        wait = self._blocked_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        self._bucket.acquire()
+
+    async def _acquire_async(self):
+        """Wait until a request may be sent, without blocking the loop."""
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+
+        while True:
+            with self._condition:
+                if self._active < self.concurrency:
+                    self._active += 1
+                    break
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            await waiter
+
+        wait = self._blocked_until - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        wait = self._bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _release(self, success=False, throttled=False):
+        """Mark a request as finished and adapt the concurrency.
+
+        Parameters
+        ----------
+        success: bool, optional
+            Whether the request succeeded
+        throttled: bool, optional
+            Whether the service asked to slow down
+        """
+        with self._condition:
+            self._active -= 1
+
+            if throttled:
+                self.throttled += 1
+                self._limit = max(1.0, self._limit / 2)
+            elif success:
+                self._limit = min(
+                    float(self.max_concurrency), self._limit + 1 / self._limit
+                )
+
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def _block(self, delay):
+        """Hold back all requests for some time.
+
+        Parameters
+        ----------
+        delay: float
+            Seconds to hold back requests
+        """
+        with self._condition:
+            self._blocked_until = max(
+                self._blocked_until, time.monotonic() + delay
+            )
+
+    def _backoff(self, attempt):
+        """Return the seconds to wait before retrying a failed request.
+
+        Parameters
+        ----------
+        attempt: int
+            Number of retries so far
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.5)
+
+    def _retry_after(self, response, attempt):
+        """Return the seconds to wait before retrying a throttled request.
+
+        Parameters
+        ----------
+        response: requests.Response or spotify2tidal.ahttp.Response
+            Response of the throttled request
+        attempt: int
+            Number of retries so far
+        """
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, TypeError, ValueError):
+            return self._backoff(attempt)
+
+
+def _wake(waiter):
+    """Let a coroutine waiting in Scheduler._acquire_async() try again."""
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,67 @@
+import time
+
+import requests
+
+from spotify2tidal.scheduler import IDEMPOTENT_METHODS
+
+
+class ScheduledSession(requests.Session):
+    """requests session sending every request through a Scheduler.
+
+    Parameters
+    ----------
+    scheduler: Scheduler
+        Scheduler of the service this session talks to
+    metrics: Metrics, optional
+        Records the latency and outcome of every request
+    service: str, optional
+        Name of the service to record the requests under
+    """
+    def __init__(self, scheduler, metrics=None, service=None):
+        super().__init__()
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.service = service
+
+    def request(self, method, url, *args, **kwargs):
+        """Send a request through the scheduler and return its response."""
+        attempts = []
+
+        def send():
+            if attempts and self.metrics is not None:
+                self.metrics.observe_retry(self.service)
+            attempts.append(time.monotonic())
+
+            try:
+                response = super(ScheduledSession, self).request(
+                    method, url, *args, **kwargs
+                )
+            except requests.RequestException:
+                self._observe(method, url, attempts[-1], "error")
+                raise
+
+            self._observe(method, url, attempts[-1], response.status_code)
+            return response
+
+        return self.scheduler.send(
+            send, idempotent=method.upper() in IDEMPOTENT_METHODS
+        )
+
+    def _observe(self, method, url, start, status):
+        """Record a finished request, if metrics are collected.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            URL of the request
+        start: float
+            time.monotonic() when the request was sent
+        status:
+            HTTP status code, or 'error' if no response arrived
+        """
+        if self.metrics is not None:
+            self.metrics.observe_request(
+                self.service, method, url, time.monotonic() - start, status
+            )
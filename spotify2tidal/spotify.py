@@ -1,11 +1,20 @@
+import functools
 import logging
-import spotipy
-import spotipy.util as util
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from spotify2tidal.records import Album, Artist, Track
+from spotify2tidal.scheduler import Scheduler
 
 
 class Spotify:
     """Access a Spotify-account.
 
+    The authorization happens on first use, so does importing spotipy and
+    requests. Creating a Spotify object is cheap.
+
     Parameters
     ----------
     username: str
@@ -18,7 +27,25 @@ class Spotify:
         Link to redirect after successful authentification
     discover_weekly_id: str, optional
         Playlist-ID for the 'Discover Weekly' playlist provided by Spotify
+    prefetch: int, optional
+        Number of pages to request at once for long lists
+    scheduler: Scheduler, optional
+        Limits the rate of requests to Spotify and retries throttled ones
+    metrics: Metrics, optional
+        Records the latency and outcome of every request to Spotify
     """
+    SCOPE = (
+        "user-library-read playlist-read-private user-follow-read"
+        " playlist-modify-private playlist-modify-public"
+    )
+    REFRESH_MARGIN = 300
+    REFRESH_RETRY = 60
+    api_location = "https://api.spotify.com/v1/"
+    TRACK_FIELDS = (
+        "id,name,duration_ms,disc_number,track_number,external_ids(isrc),"
+        "artists(name),album(id,name,artists(name))"
+    )
+
     def __init__(
         self,
         username,
@@ -26,14 +53,31 @@ class Spotify:
         client_secret,
         client_redirect_uri,
         discover_weekly_id=None,
+        prefetch=4,
+        scheduler=None,
+        metrics=None,
     ):
         self.username = username
         self._client_id = client_id
         self._client_secret = client_secret
         self._client_redirect_uri = client_redirect_uri
         self._discover_weekly_id = discover_weekly_id
+        self.prefetch = prefetch
+        self.scheduler = scheduler or Scheduler()
+        self.metrics = metrics
 
-        self.spotify_session = self._connect()
+        self._http = None
+        self._spotify_session = None
+        self._token_info = None
+        self._token_lock = threading.Lock()
+        self._refresh_timer = None
+        self._closed = False
+
+    @property
+    def spotify_session(self):
+        """spotipy session, connected on first use."""
+        self._connect_once()
+        return self._spotify_session
 
     @property
     def own_playlists(self):
@@ -42,68 +86,22 @@ class Spotify:
         This does not include things like 'Discover Weekly', since these are
         technically owned by Spotify, not the user.
         """
-        try:
-            result = self.spotify_session.current_user_playlists()
-            playlists = result["items"]
-
-            while result["next"]:
-                result = self.spotify_sesion.next(result)
-                playlists.extend(result["items"])
-        except spotipy.client.SpotifyException:
-            self._refresh_expired_token()
-            return self.own_playlists
-
-        return playlists
+        return list(self.iter_own_playlists())
 
     @property
     def saved_artists(self):
-        """List with all saved artists."""
-        try:
-            result = self.spotify_session.current_user_followed_artists()[
-                "artists"
-            ]
-            artists = result["items"]
-
-            while result["next"]:
-                result = self.spotify_session.next(result)["artists"]
-                artists.extend(result["items"])
-        except spotipy.client.SpotifyException:
-            self._refresh_expired_token()
-            return self.saved_artists
-
-        return artists
+        """List with all saved artists as Artist records."""
+        return list(self.iter_saved_artists())
 
     @property
     def saved_albums(self):
-        """List with all saved albums."""
-        try:
-            result = self.spotify_session.current_user_saved_albums()
-            albums = result["items"]
-
-            while result["next"]:
-                result = self.spotify_session.next(result)
-                albums.extend(result["items"])
-        except spotipy.client.SpotifyException:
-            self._refresh_expired_token()
-            return self.saved_albums
-
-        return albums
+        """List with all saved albums as Album records."""
+        return list(self.iter_saved_albums())
 
     @property
     def saved_tracks(self):
-        """List with all saved tracks."""
-        try:
-            result = self.spotify_session.current_user_saved_tracks()
-            tracks = result["items"]
-
-            while result["next"]:
-                result = self.spotify_session.next(result)
-                tracks.extend(result["items"])
-        except spotipy.client.SpotifyException:
-            self._refresh_expired_token()
-            return self.saved_tracks
-
-        return tracks
+        """List with all saved tracks as Track records."""
+        return list(self.iter_saved_tracks())
 
     @property
     def discover_weekly_playlist(self):
@@ -115,39 +113,275 @@ class Spotify:
         if not self._discover_weekly_id:
             raise ValueError("No discover weekly ID set")
 
-        try:
-            return self.spotify_session.user_playlist(
-                self.username, self._discover_weekly_id
+        return self._call(
+            lambda: self.spotify_session.user_playlist(
+                self.username,
+                self._discover_weekly_id,
+                fields="id,name,owner(id),snapshot_id",
             )
-        except spotipy.client.SpotifyException:
-            self._refresh_expired_token()
-            return self.discover_weekly_playlist()
+        )
+
+    def close(self):
+        """Stop refreshing the token in the background.
+
+        The Spotify object can still be used afterwards, its token is then
+        only refreshed once a request is rejected because it expired.
+        """
+        with self._token_lock:
+            self._closed = True
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+                self._refresh_timer = None
+
+    def iter_own_playlists(self):
+        """Yield all playlists of the user, one page at a time."""
+        return self._iter_offset_pages(
+            lambda **page: self.spotify_session.current_user_playlists(**page),
+            limit=50,
+        )
+
+    def iter_saved_artists(self):
+        """Yield all saved artists as Artist records, one page at a time.
+
+        Followed artists are paginated with a cursor instead of an offset, so
+        these pages can't be prefetched.
+        """
+        artists = self._iter_pages(
+            lambda: self.spotify_session.current_user_followed_artists()[
+                "artists"
+            ],
+            key="artists",
+        )
+        for artist in artists:
+            yield Artist.from_spotify(artist)
+
+    def iter_saved_albums(self, since=None):
+        """Yield all saved albums as Album records, one page at a time.
+
+        Albums are yielded newest first.
+
+        Parameters
+        ----------
+        since: tuple, optional
+            (added_at, album_id) of an album saved before. Stop at that
+            album, or at the first album saved earlier.
+        """
+        items = self._iter_offset_pages(
+            lambda **page: self.spotify_session.current_user_saved_albums(
+                **page
+            ),
+            limit=50,
+            until=self._saved_before(since, "album"),
+        )
+        for item in items:
+            yield Album.from_spotify(item["album"], item["added_at"])
+
+    def iter_saved_tracks(self, since=None):
+        """Yield all saved tracks as Track records, one page at a time.
+
+        Tracks are yielded newest first.
+
+        Parameters
+        ----------
+        since: tuple, optional
+            (added_at, track_id) of a track saved before. Stop at that
+            track, or at the first track saved earlier.
+        """
+        return self._iter_tracks(
+            self._iter_offset_pages(
+                lambda **page: self.spotify_session.current_user_saved_tracks(
+                    **page
+                ),
+                limit=50,
+                until=self._saved_before(since, "track"),
+            )
+        )
+
+    def iter_tracks_from_playlist(self, playlist):
+        """Yield all tracks from a playlist as Track records.
+
+        Only the fields needed to find the tracks at Tidal are requested.
+
+        Parameters
+        ----------
+        playlist:
+            spotipy playlist to get tracks from
+        """
+        return self._iter_tracks(
+            self._iter_offset_pages(
+                lambda **page: self.spotify_session.user_playlist_tracks(
+                    user=playlist["owner"]["id"],
+                    playlist_id=playlist["id"],
+                    fields="items(added_at,track(%s)),total,limit"
+                    % self.TRACK_FIELDS,
+                    **page
+                ),
+                limit=100,
+            )
+        )
 
     def tracks_from_playlist(self, playlist):
-        """Return a list with all tracks from a given playlist.
+        """Return a list with all tracks from a playlist as Track records.
 
         Parameters
         ----------
         playlist:
             spotipy playlist to get tracks from
         """
+        return list(self.iter_tracks_from_playlist(playlist))
+
+    def _call(self, request):
+        """Return the result of a request, refreshing the token if needed.
+
+        If the request is rejected because the token expired, the token is
+        refreshed and the request is tried once more. All other errors are
+        raised right away.
+
+        Parameters
+        ----------
+        request: callable
+            Sends the request using the current spotify_session
+        """
+        from spotipy.client import SpotifyException
+
+        self._connect_once()
+        token = self._token_info["access_token"]
+
         try:
-            result = self.spotify_session.user_playlist(
-                user=playlist["owner"]["id"],
-                playlist_id=playlist["id"],
-                fields="tracks,next",
-            )["tracks"]
+            return request()
+        except SpotifyException as e:
+            if e.http_status != 401:
+                raise
+            self._refresh_expired_token(token)
+            return request()
 
-            tracks = result["items"]
+    def _iter_tracks(self, items):
+        """Yield Track records for saved or playlist items.
 
-            while result["next"]:
-                result = self.spotify_session.next(result)
-                tracks.extend(result["items"])
-        except spotipy.client.SpotifyException:
-            self._refresh_expired_token()
-            return self.tracks_from_playlist(playlist)
+        Items without a track, like unavailable episodes, are skipped.
+        Tracks of the same album share a single Album record.
+
+        Parameters
+        ----------
+        items: iterable
+            spotipy saved track or playlist track objects
+        """
+        albums = {}
 
-        return tracks
+        for item in items:
+            if item.get("track"):
+                yield Track.from_spotify(
+                    item["track"], item.get("added_at"), albums
+                )
+
+    def _iter_offset_pages(self, request, limit, until=None):
+        """Yield the items of an offset-based paginated result in order.
+
+        The first page tells how many items there are in total, and how many
+        items per page the service actually allows. All following pages are
+        then requested concurrently, up to `prefetch` pages ahead of the page
+        currently being yielded.
+
+        Parameters
+        ----------
+        request: callable
+            Requests a single page, given limit and offset as keywords
+        limit: int
+            Number of items per page
+        until: callable, optional
+            Stop at the first item it returns True for. Pages are then
+            requested one after the other, since usually only the first few
+            are needed.
+        """
+        page = self._call(lambda: request(limit=limit, offset=0))
+        for item in page["items"]:
+            if until is not None and until(item):
+                return
+            yield item
+
+        limit = page.get("limit") or limit
+        offsets = iter(range(limit, page["total"], limit))
+
+        if until is not None:
+            for offset in offsets:
+                page = self._call(
+                    functools.partial(request, limit=limit, offset=offset)
+                )
+                for item in page["items"]:
+                    if until(item):
+                        return
+                    yield item
+            return
+
+        with ThreadPoolExecutor(max_workers=self.prefetch) as executor:
+            pending = deque()
+
+            for offset in offsets:
+                pending.append(
+                    executor.submit(
+                        self._call,
+                        functools.partial(request, limit=limit, offset=offset),
+                    )
+                )
+                if len(pending) < self.prefetch:
+                    continue
+
+                for item in pending.popleft().result()["items"]:
+                    yield item
+
+            while pending:
+                for item in pending.popleft().result()["items"]:
+                    yield item
+
+    @staticmethod
+    def _saved_before(since, key):
+        """Return a function telling whether a saved item is older than since.
+
+        Return None if since is None.
+
+        Parameters
+        ----------
+        since: tuple
+            (added_at, spotify_id) of an item saved before
+        key: str
+            Key of the item within the saved item objects, 'track' or 'album'
+        """
+        if since is None:
+            return None
+
+        added_at, spotify_id = since
+
+        def saved_before(item):
+            if item["added_at"] < added_at:
+                return True
+            return (item.get(key) or {}).get("id") == spotify_id
+
+        return saved_before
+
+    def _iter_pages(self, first_page, key=None):
+        """Yield the items of a paginated result, one page at a time.
+
+        If a page fails to load, only that page is requested again after
+        refreshing the token, instead of starting all over.
+
+        Parameters
+        ----------
+        first_page: callable
+            Requests the first page and returns its paging object
+        key: str, optional
+            Key of the paging object within the following pages, if nested
+        """
+        page = self._call(first_page)
+
+        while True:
+            for item in page["items"]:
+                yield item
+
+            if not page["next"]:
+                return
+
+            result = self._call(lambda: self.spotify_session.next(page))
+            page = result[key] if key else result
 
     def _connect(self):
         """Connect to Spotify and return a session object.
@@ -158,11 +392,50 @@ class Spotify:
         More information on authorization:
         https://developer.spotify.com/documentation/general/guides/authorization-guide/
         https://spotipy.readthedocs.io/en/latest/#authorized-requests
+
+        The token is refreshed in the background shortly before it expires.
+        Refreshing goes through the scheduler as well.
         """
-        scope = "user-library-read playlist-read-private user-follow-read playlist-modify-private playlist-modify-public"
+        from spotify2tidal.oauth import ScheduledOAuth
+
+        self._oauth = ScheduledOAuth(
+            self._http,
+            self._client_id,
+            self._client_secret,
+            self._client_redirect_uri,
+            scope=self.SCOPE,
+            cache_path=".cache-" + self.username,
+        )
+        self._token_info = self._authorize()
+        self._schedule_refresh()
+
+        return self._session()
+
+    def _connect_once(self):
+        """Connect to Spotify, unless that happened already."""
+        if self._spotify_session is not None:
+            return
+
+        from spotify2tidal.sessions import ScheduledSession
+
+        with self._token_lock:
+            if self._spotify_session is None:
+                self._http = ScheduledSession(
+                    self.scheduler, self.metrics, "spotify"
+                )
+                self._spotify_session = self._connect()
+
+    def _authorize(self):
+        """Return new token info, asking the user for access if needed."""
+        import spotipy.util as util
+
+        token_info = self._oauth.get_cached_token()
+        if token_info:
+            return token_info
+
         token = util.prompt_for_user_token(
             self.username,
-            scope=scope,
+            scope=self.SCOPE,
             client_id=self._client_id,
             client_secret=self._client_secret,
             redirect_uri=self._client_redirect_uri,
@@ -171,14 +444,114 @@ class Spotify:
         if not token:
             raise ValueError("Could not connect to Spotify")
 
-        return spotipy.Spotify(auth=token)
+        return self._oauth.get_cached_token() or {
+            "access_token": token,
+            "expires_at": time.time() + 3600,
+            "refresh_token": None,
+        }
 
-    def _refresh_expired_token(self):
-        """When the token expires after 1h, refresh it.
+    def _session(self):
+        """Return a spotipy session using the current token."""
+        import spotipy
+
+        session = spotipy.Spotify(
+            auth=self._token_info["access_token"], requests_session=self._http
+        )
+        session.prefix = self.api_location
+        return session
 
-        When the token expires, spotipy throws spotipy.client.SpotifyException.
-        To refresh the expired token, simply reauthenticate. Spotipy refreshes
-        the token automatically in case it is expired.
+    def _schedule_refresh(self, delay=None):
+        """Refresh the token in the background shortly before it expires.
+
+        Parameters
+        ----------
+        delay: float, optional
+            Seconds to wait before refreshing instead
         """
-        logging.getLogger(__name__).debug("Refreshing token")
-        self.spotify_session = self._connect()
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+        if self._closed:
+            return
+
+        if delay is None:
+            delay = (
+                self._token_info["expires_at"]
+                - time.time()
+                - self.REFRESH_MARGIN
+            )
+        self._refresh_timer = threading.Timer(
+            max(0, delay),
+            self._refresh_in_background,
+            args=(self._token_info["access_token"],),
+        )
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _refresh_in_background(self, expiring_token):
+        """Refresh a token about to expire, run by the refresh timer.
+
+        Only the refresh token is used, since nobody may be there to
+        authorize again. If that fails, refreshing is tried again later.
+        Once the token expired, the next request rejected because of it
+        refreshes the token instead, asking the user if needed.
+
+        Parameters
+        ----------
+        expiring_token: str
+            Access token about to expire
+        """
+        try:
+            self._refresh_expired_token(expiring_token, authorize=False)
+        except Exception:
+            logging.getLogger(__name__).exception("Could not refresh token")
+
+        with self._token_lock:
+            if self._token_info["access_token"] != expiring_token:
+                return
+
+            remaining = self._token_info["expires_at"] - time.time()
+            if remaining > 0:
+                logging.getLogger(__name__).warning(
+                    "Token not refreshed, trying again in %d seconds",
+                    min(self.REFRESH_RETRY, remaining),
+                )
+                self._schedule_refresh(min(self.REFRESH_RETRY, remaining))
+
+    def _refresh_expired_token(self, expired_token=None, authorize=True):
+        """Replace an expired token with a new one.
+
+        Use the refresh token, so the user doesn't need to authorize again.
+        Only if that fails, go through the whole authorization.
+        If several threads notice the same expired token, it is only
+        refreshed once.
+
+        Parameters
+        ----------
+        expired_token: str, optional
+            Access token that expired. Nothing is done if the token was
+            replaced in the meantime.
+        authorize: bool, optional
+            Whether to go through the whole authorization if the refresh
+            token doesn't work. Otherwise the token is kept as it is.
+        """
+        with self._token_lock:
+            token_info = self._token_info
+            if expired_token and expired_token != token_info["access_token"]:
+                return
+
+            logging.getLogger(__name__).debug("Refreshing token")
+
+            new_token_info = None
+            if token_info.get("refresh_token"):
+                new_token_info = self._oauth.refresh_access_token(
+                    token_info["refresh_token"]
+                )
+            if new_token_info is None:
+                if not authorize:
+                    return
+                new_token_info = self._authorize()
+
+            self._token_info = new_token_info
+            self._spotify_session = self._session()
+            self._schedule_refresh()
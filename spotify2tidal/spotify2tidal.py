@@ -1,6 +1,37 @@
+import functools
+import logging
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from spotify2tidal.album_index import AlbumIndex
+from spotify2tidal.cache import MatchCache
+from spotify2tidal.journal import Journal
+from spotify2tidal.match import Match
+from spotify2tidal.memo import Memo
+from spotify2tidal.metrics import Metrics
+from spotify2tidal.plan import PlanWriter, read_plan, to_match
 from spotify2tidal.spotify import Spotify
+from spotify2tidal.state import SyncState
 from spotify2tidal.tidal import Tidal
 
+PLAN_TASKS = ("playlists", "discover_weekly", "albums", "artists", "tracks")
+
+
+def forget_lookups(method):
+    """Decorate a method of Spotify2Tidal to forget its lookups afterwards.
+
+    How many lookups were saved is logged when the method returns.
+    """
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        stats = self.memo.stats
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._forget_lookups(stats)
+
+    return run
+
 
 class Spotify2Tidal:
     """Provide a interface for moving from Spotify to Tidal.
@@ -24,6 +55,18 @@ class Spotify2Tidal:
     click on the three dots -> Share -> Copy Link. The ID you are looking for is
     then between "https://open.spotify.com/user/spotify/playlist/" and "?si=".
 
+    Within a call of a copy method or plan(), every Spotify item is only
+    looked up once, even if it appears in many playlists. How many lookups
+    were saved that way is logged and counted in memo.stats.
+
+    Copying saved albums, artists or tracks first fetches the existing
+    favorites at Tidal. Items already among them are neither searched nor
+    added again.
+
+    Every request and every phase of the migration is measured in metrics,
+    which can be exported with metrics.write_json() or
+    metrics.write_prometheus().
+
     Parameters
     ----------
     tidal_username: str
@@ -40,7 +83,38 @@ class Spotify2Tidal:
         URL to redirect after requesting a token, needs whitelisting
     spotify_discover_weekly_id: str, optional
         ID for the users Discover Weekly playlist
+    cache_path: str, optional
+        Location of a database to remember which Spotify items were found at
+        Tidal. Repeated runs will then skip searching for known items.
+    chunk_size: int, optional
+        Maximum number of items to write to Tidal with a single request
+    workers: int, optional
+        Number of threads to search Tidal with in parallel. The order of
+        the results does not depend on it.
+    album_threshold: int, optional
+        Minimum number of tracks from the same album to look them up with a
+        single request for the album's tracklist, instead of searching for
+        each of them. Disabled if None.
+    journal_path: str, optional
+        Location of a database to record the progress of the migration in.
+        If a job is interrupted, running it again with the same job_id only
+        does what is left. Requires a job_id.
+    job_id: str, optional
+        Identifies the migration job within the journal. Everything done
+        under it is skipped by later runs, so use a new one for every
+        migration that should start over, e.g. a daily sync.
+    state_path: str, optional
+        Location of a database to remember the Spotify snapshot each
+        playlist was copied at. Later runs skip playlists that didn't change
+        since, without fetching their tracks.
+    spotify_scheduler: Scheduler, optional
+        Limits the rate of requests to Spotify. Defaults to Scheduler().
+    tidal_scheduler: Scheduler, optional
+        Limits the rate of requests to Tidal. Defaults to Scheduler().
     """
+    spotify_class = Spotify
+    tidal_class = Tidal
+
     def __init__(
         self,
         tidal_username,
@@ -50,45 +124,121 @@ class Spotify2Tidal:
         spotify_client_secret,
         spotify_redirect_uri,
         spotify_discover_weekly_id=None,
+        cache_path=None,
+        chunk_size=100,
+        workers=1,
+        album_threshold=None,
+        journal_path=None,
+        job_id=None,
+        state_path=None,
+        spotify_scheduler=None,
+        tidal_scheduler=None,
     ):
-        self.spotify = Spotify(
+        if journal_path and job_id is None:
+            raise ValueError("A journal_path requires a job_id")
+
+        self.metrics = Metrics()
+        self.spotify = self.spotify_class(
             spotify_username,
             spotify_client_id,
             spotify_client_secret,
             spotify_redirect_uri,
             spotify_discover_weekly_id,
+            scheduler=spotify_scheduler,
+            metrics=self.metrics,
         )
-        self.tidal = Tidal(tidal_username, tidal_password)
+        self.tidal = self.tidal_class(
+            tidal_username,
+            tidal_password,
+            pool_size=max(workers, 10),
+            scheduler=tidal_scheduler,
+            metrics=self.metrics,
+        )
+        self.cache = MatchCache(cache_path) if cache_path else None
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.album_threshold = album_threshold
+        self.memo = Memo()
+        self._favorites = {}
+        self.journal = Journal(journal_path, job_id) if journal_path else None
+        self.state = (
+            SyncState(state_path, "%s:%s" % (spotify_username, tidal_username))
+            if state_path
+            else None
+        )
+
+    @forget_lookups
+    def copy_all_spotify_playlists(self, incremental=False):
+        """Create all your spotify playlists in tidal.
 
-    def copy_all_spotify_playlists(self):
-        """Create all your spotify playlists in tidal."""
-        for playlist in self.spotify.own_playlists:
+        Parameters
+        ----------
+        incremental: bool, optional
+            Only add and remove the tracks that changed in playlists that
+            already exist, instead of creating them from scratch
+        """
+        for playlist in self.spotify.iter_own_playlists():
             self._add_spotify_playlist_to_tidal(
-                spotify_playlist=playlist, delete_existing=True
+                spotify_playlist=playlist,
+                delete_existing=True,
+                incremental=incremental,
             )
 
-    def copy_all_saved_spotify_albums(self):
-        """Add all your saved albums to Tidal's favorites."""
-        for album in self.spotify.saved_albums:
-            artist_name = album["album"]["artists"][0]["name"]
-            album_name = album["album"]["name"]
+    @forget_lookups
+    def copy_all_saved_spotify_albums(self, delta=False):
+        """Add all your saved albums to Tidal's favorites.
+
+        Return a list of Match objects, one for each saved album.
+
+        Parameters
+        ----------
+        delta: bool, optional
+            Only copy the albums saved since the last delta run. Requires a
+            state_path.
+        """
+        if delta:
+            return self._copy_saved_delta("album", self._save_albums)
+
+        matches = self._resolve_saved("album")
+        self._save_albums(matches)
 
-            self.tidal.save_album(album_name, artist_name)
+        return matches
 
+    @forget_lookups
     def copy_all_saved_spotify_artists(self):
-        """Add all your saved artists to Tidal's favorites."""
-        for artist in self.spotify.saved_artists:
-            self.tidal.save_artist(artist["name"])
+        """Add all your saved artists to Tidal's favorites.
 
-    def copy_all_saved_spotify_tracks(self):
-        """Add all your saved artists to Tidal's favorites."""
-        for track in self.spotify.saved_tracks:
-            artist_name = track["track"]["artists"][0]["name"]
-            track_name = track["track"]["name"]
+        Return a list of Match objects, one for each saved artist.
+        """
+        matches = self._resolve_saved("artist")
+        self._save_artists(matches)
+
+        return matches
+
+    @forget_lookups
+    def copy_all_saved_spotify_tracks(self, delta=False):
+        """Add all your saved tracks to Tidal's favorites.
+
+        Return a list of Match objects, one for each saved track.
+
+        Parameters
+        ----------
+        delta: bool, optional
+            Only copy the tracks saved since the last delta run. Requires a
+            state_path.
+        """
+        if delta:
+            return self._copy_saved_delta("track", self._save_tracks)
+
+        matches = self._resolve_saved("track")
+        self._save_tracks(matches)
 
-            self.tidal.save_track(track_name, artist_name)
+        return matches
 
-    def copy_discover_weekly(self, playlist_name="Discover Weekly"):
+    @forget_lookups
+    def copy_discover_weekly(
+        self, playlist_name="Discover Weekly", incremental=False
+    ):
         """Create a discover weekly in Tidal.
 
         To save a specific weekly playlist under a different name, use the
@@ -98,18 +248,240 @@ class Spotify2Tidal:
         ----------
         playlist_name: str, optional
             Name of the playlist in Tidal
+        incremental: bool, optional
+            Only add and remove the tracks that changed if the playlist
+            already exists, instead of creating it from scratch
         """
-        self._add_spotify_playlist_to_tidal(
+        return self._add_spotify_playlist_to_tidal(
             self.spotify.discover_weekly_playlist,
             playlist_name=playlist_name,
             delete_existing=True,
+            incremental=incremental,
         )
 
+    @forget_lookups
+    def plan(
+        self,
+        path,
+        tasks=("playlists", "albums", "artists", "tracks"),
+        incremental=False,
+        discover_weekly_name="Discover Weekly",
+    ):
+        """Look up everything to copy and write a migration plan to a file.
+
+        Nothing is written to Tidal. The plan lists every item with its ID at
+        Tidal, how it was found and what apply() is going to do with it, so
+        it can be reviewed first. See PlanWriter for the format.
+
+        Return a dictionary with the number of items per action.
+
+        Parameters
+        ----------
+        path: str
+            Location of the plan
+        tasks: iterable, optional
+            What to plan, any of 'playlists', 'discover_weekly', 'albums',
+            'artists' and 'tracks'
+        incremental: bool, optional
+            Plan to update playlists that already exist in place
+        discover_weekly_name: str, optional
+            Name of the discover weekly playlist in Tidal
+        """
+        unknown = set(tasks) - set(PLAN_TASKS)
+        if unknown:
+            raise ValueError("Unknown tasks: %s" % ", ".join(sorted(unknown)))
+
+        counts = Counter()
+        writer = PlanWriter(path)
+        try:
+            for task in tasks:
+                if task == "playlists":
+                    for playlist in self.spotify.iter_own_playlists():
+                        self._plan_playlist(
+                            writer,
+                            counts,
+                            playlist,
+                            playlist["name"],
+                            incremental,
+                        )
+                elif task == "discover_weekly":
+                    self._plan_playlist(
+                        writer,
+                        counts,
+                        self.spotify.discover_weekly_playlist,
+                        discover_weekly_name,
+                        incremental,
+                    )
+                else:
+                    self._plan_saved(writer, counts, task[:-1])
+        finally:
+            writer.close()
+
+        return dict(counts)
+
+    def apply(self, path):
+        """Do all writes listed in a migration plan written by plan().
+
+        Nothing is looked up, the items are added to Tidal with bulk
+        requests only. With a journal, running apply() again after an
+        interruption only does what is left.
+
+        Parameters
+        ----------
+        path: str
+            Location of the plan
+        """
+        section = None
+        matches = []
+
+        for entry in read_plan(path):
+            if entry["type"] != "item":
+                self._apply_section(section, matches)
+                section, matches = entry, []
+            elif section is None:
+                raise ValueError("Plan item outside of a section: %s" % entry)
+            elif entry["action"] in ("add", "missing"):
+                matches.append(to_match(entry))
+
+        self._apply_section(section, matches)
+
+    def close(self):
+        """Stop refreshing the Spotify token and close all local databases.
+
+        Pending writes to the cache and the journal are saved first.
+        """
+        self.spotify.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.state is not None:
+            self.state.close()
+
+    def _forget_lookups(self, stats):
+        """Log how many lookups were saved since stats, and forget them all.
+
+        Results still waiting to be written to the cache are written now.
+
+        Parameters
+        ----------
+        stats: dict
+            memo.stats at the start
+        """
+        logging.getLogger(__name__).info(
+            "Lookups: %(misses)d searched, %(hits)d reused, "
+            "%(coalesced)d shared",
+            {k: v - stats[k] for k, v in self.memo.stats.items()},
+        )
+        self.memo.clear()
+        if self.cache is not None:
+            self.cache.flush()
+
+    def _plan_playlist(
+        self, writer, counts, spotify_playlist, playlist_name, incremental
+    ):
+        """Look up the tracks of a playlist and add them to a plan.
+
+        Parameters
+        ----------
+        writer: PlanWriter
+            Plan to add the playlist to
+        counts: Counter
+            Number of items per action, updated in place
+        spotify_playlist:
+            Playlist to copy to tidal
+        playlist_name: str
+            Name of the playlist in Tidal
+        incremental: bool
+            Update an existing playlist with the same name in place
+        """
+        key = self._playlist_key(spotify_playlist, playlist_name)
+        if self._is_written("playlist", key):
+            writer.playlist(playlist_name, key, "done")
+            return
+        if self._is_unchanged(spotify_playlist, key, playlist_name):
+            writer.playlist(playlist_name, key, "unchanged")
+            return
+
+        matches = self._resolve_playlist(spotify_playlist, playlist_name)
+        self.metrics.observe_matches(matches)
+
+        writer.playlist(
+            playlist_name,
+            key,
+            "sync" if incremental else "replace",
+            spotify_playlist.get("snapshot_id"),
+        )
+        for match in matches:
+            action = "add" if match.found else "missing"
+            writer.item(match, action)
+            counts[action] += 1
+
+    def _plan_saved(self, writer, counts, kind):
+        """Look up the saved items of a kind and add them to a plan.
+
+        Parameters
+        ----------
+        writer: PlanWriter
+            Plan to add the items to
+        counts: Counter
+            Number of items per action, updated in place
+        kind: str
+            One of 'track', 'album' or 'artist'
+        """
+        matches = self._resolve_saved(kind)
+        self.metrics.observe_matches(matches)
+
+        writer.favorites(kind)
+        for match in matches:
+            action = self._favorite_action(match)
+            writer.item(match, action)
+            counts[action] += 1
+
+    def _apply_section(self, section, matches):
+        """Write a section of a migration plan to Tidal.
+
+        Parameters
+        ----------
+        section: dict
+            Header of the section, or None before the first one
+        matches: list
+            Match objects of the items to add or report as missing
+        """
+        if section is None:
+            return
+
+        if section["type"] == "playlist":
+            if section["action"] in ("done", "unchanged") or self._is_written(
+                "playlist", section["key"]
+            ):
+                return
+            self._write_playlist(
+                section["name"],
+                matches,
+                delete_existing=True,
+                incremental=section["action"] == "sync",
+                key=section["key"],
+                snapshot_id=section.get("snapshot_id"),
+            )
+        elif section["kind"] == "album":
+            self._save_albums(matches)
+        elif section["kind"] == "artist":
+            self._save_artists(matches)
+        else:
+            self._save_tracks(matches)
+
     def _add_spotify_playlist_to_tidal(
-        self, spotify_playlist, playlist_name=None, delete_existing=False
+        self,
+        spotify_playlist,
+        playlist_name=None,
+        delete_existing=False,
+        incremental=False,
     ):
         """Create a tidal playlist and copy available tracks.
 
+        Return a list of Match objects, one for each track of the playlist.
+
         Parameters
         ----------
         spotify_playlist:
@@ -118,20 +490,841 @@ class Spotify2Tidal:
             Overwrite the playlist name
         delete_existing: bool
             Delete any existing playlist with the same name
+        incremental: bool
+            Update an existing playlist with the same name in place
         """
         if playlist_name is None:
             playlist_name = spotify_playlist["name"]
 
-        spotify_tracks = self.spotify.tracks_from_playlist(spotify_playlist)
+        key = self._playlist_key(spotify_playlist, playlist_name)
+        if self._is_written("playlist", key):
+            logging.getLogger(__name__).info(
+                "Skipping finished playlist: %s", playlist_name
+            )
+            return []
+        if self._is_unchanged(spotify_playlist, key, playlist_name):
+            logging.getLogger(__name__).info(
+                "Skipping unchanged playlist: %s", playlist_name
+            )
+            return []
+
+        matches = self._resolve_playlist(spotify_playlist, playlist_name)
+        self._write_playlist(
+            playlist_name,
+            matches,
+            delete_existing,
+            incremental,
+            key,
+            spotify_playlist.get("snapshot_id"),
+        )
+
+        return matches
+
+    def _resolve_playlist(self, spotify_playlist, playlist_name):
+        """Fetch the tracks of a playlist and look them up at Tidal.
+
+        Return a list of Match objects, one for each track of the playlist.
+
+        Parameters
+        ----------
+        spotify_playlist:
+            Playlist to look up the tracks of
+        playlist_name: str
+            Name of the playlist in Tidal
+        """
+        spotify_tracks = self.metrics.fetch(
+            self.spotify.iter_tracks_from_playlist(spotify_playlist),
+            playlist_name,
+        )
+        with self.metrics.phase("resolve", playlist_name) as phase:
+            matches = self._resolve_tracks(spotify_tracks)
+            phase.items = len(matches)
+
+        return matches
+
+    def _resolve_saved(self, kind, since=None, newest=None):
+        """Fetch the saved items of a kind and look them up at Tidal.
+
+        For a full run, the favorites of that kind at Tidal are fetched
+        first, so items among them need no search. When only items saved
+        after since are fetched, that would cost more than it saves.
+
+        Return a list of Match objects, one for each saved item.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        since: tuple, optional
+            (added_at, spotify_id) of the newest item synced before. Only
+            items saved after it are fetched. Not supported for artists.
+        newest: list, optional
+            Receives the record of the newest saved item, if there is any
+        """
+        if since is None:
+            self._load_favorites(kind)
+
+        if kind == "track":
+            items = self.spotify.iter_saved_tracks(since)
+        elif kind == "album":
+            items = self.spotify.iter_saved_albums(since)
+        else:
+            items = self.spotify.iter_saved_artists()
+        if newest is not None:
+            items = self._keep_first(items, newest)
+
+        label = "saved %ss" % kind
+        with self.metrics.phase("resolve", label) as phase:
+            if kind == "track":
+                matches = self._resolve_tracks(
+                    self.metrics.fetch(items, label)
+                )
+            else:
+                matches = self._resolve(
+                    self._find_album if kind == "album" else self._find_artist,
+                    self.metrics.fetch(items, label),
+                )
+            phase.items = len(matches)
+
+        return matches
+
+    def _copy_saved_delta(self, kind, save):
+        """Copy the items of a kind saved since the last delta run.
+
+        Spotify returns saved items newest first, so fetching stops at the
+        newest item synced before. That item becomes the newest one of this
+        run, unless adding any item to the favorites failed. Items that
+        could not be found at Tidal are not tried again by later delta
+        runs, only by full ones.
+
+        Return a list of Match objects, one for each newly saved item.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track' or 'album'
+        save: callable
+            One of _save_albums() or _save_tracks()
+        """
+        if self.state is None:
+            raise ValueError("Copying only new items requires a state_path")
+
+        newest = []
+        matches = self._resolve_saved(kind, self.state.mark(kind), newest)
+        failed = save(matches)
+
+        if newest and not failed:
+            self.state.record_mark(kind, newest[0].added_at, newest[0].id)
+
+        return matches
+
+    @staticmethod
+    def _keep_first(items, first):
+        """Yield all items, appending the first one to a list.
+
+        Parameters
+        ----------
+        items: iterable
+            Items to pass on
+        first: list
+            Receives the first item
+        """
+        for item in items:
+            if not first:
+                first.append(item)
+            yield item
+
+    def _write_playlist(
+        self,
+        playlist_name,
+        matches,
+        delete_existing=False,
+        incremental=False,
+        key=None,
+        snapshot_id=None,
+    ):
+        """Create a tidal playlist with all found tracks.
+
+        Return the ID of the playlist at Tidal.
+
+        Parameters
+        ----------
+        playlist_name: str
+            Name of the playlist in Tidal
+        matches: list
+            Match objects of the tracks, in order
+        delete_existing: bool
+            Delete any existing playlist with the same name
+        incremental: bool
+            Update an existing playlist with the same name in place
+        key: str, optional
+            Key to record the finished playlist with in the journal and the
+            sync state
+        snapshot_id: str, optional
+            Snapshot ID of the Spotify playlist, to record in the sync state
+        """
+        track_ids = self._playlist_track_ids(matches)
+
+        with self.metrics.phase("write", playlist_name) as phase:
+            tidal_playlist_id = None
+            if incremental:
+                tidal_playlist_id = self.tidal.find_playlist(playlist_name)
+
+            if tidal_playlist_id is not None:
+                self.tidal.sync_playlist(
+                    tidal_playlist_id, track_ids, chunk_size=self.chunk_size
+                )
+            else:
+                tidal_playlist_id = self.tidal._create_playlist(
+                    playlist_name, delete_existing
+                )
+                self.tidal.add_tracks_to_playlist(
+                    tidal_playlist_id, track_ids, chunk_size=self.chunk_size
+                )
+            phase.items = len(track_ids)
+
+        self._record_playlist(key, snapshot_id, tidal_playlist_id)
+
+        return tidal_playlist_id
+
+    def _playlist_track_ids(self, matches):
+        """Return the Tidal IDs of all found tracks of a playlist, in order.
+
+        Tracks that could not be found are logged.
+
+        Parameters
+        ----------
+        matches: list
+            Match objects of the tracks, in order
+        """
+        self.metrics.observe_matches(matches)
+
+        for match in matches:
+            if not match.found:
+                logging.getLogger(__name__).warning(
+                    "Could not find track: %s - %s", match.artist, match.name
+                )
+
+        return [m.tidal_id for m in matches if m.found]
+
+    def _record_playlist(self, key, snapshot_id, tidal_playlist_id):
+        """Record a written playlist in the journal and the sync state.
+
+        Parameters
+        ----------
+        key: str
+            Key of the playlist, or None to record nothing
+        snapshot_id: str
+            Snapshot ID of the Spotify playlist, or None
+        tidal_playlist_id: str
+            ID of the playlist at Tidal
+        """
+        if key is None:
+            return
+
+        self._mark_written("playlist", [key])
+        if self.state is not None and snapshot_id:
+            self.state.record_playlist(key, snapshot_id, tidal_playlist_id)
+
+    def _save_albums(self, matches):
+        """Add all found albums to Tidal's favorites.
+
+        Return the number of albums that could not be added.
+
+        Parameters
+        ----------
+        matches: list
+            Match objects of the albums
+        """
+        return self._save_favorites(matches, self.tidal.save_albums)
+
+    def _save_artists(self, matches):
+        """Add all found artists to Tidal's favorites.
+
+        Return the number of artists that could not be added.
+
+        Parameters
+        ----------
+        matches: list
+            Match objects of the artists
+        """
+        return self._save_favorites(matches, self.tidal.save_artists)
+
+    def _save_tracks(self, matches):
+        """Add all found tracks to Tidal's favorites.
+
+        Return the number of tracks that could not be added.
+
+        Parameters
+        ----------
+        matches: list
+            Match objects of the tracks
+        """
+        return self._save_favorites(matches, self.tidal.save_tracks)
+
+    def _save_favorites(self, matches, save):
+        """Add all found items to Tidal's favorites with bulk requests.
+
+        Items are only recorded as written in the journal if the chunk they
+        were sent in succeeded.
+
+        Return the number of items that could not be added.
+
+        Parameters
+        ----------
+        matches: list
+            Match objects of the items, all of the same kind
+        save: callable
+            One of Tidal's save_albums(), save_artists() or save_tracks()
+        """
+        pending = self._pending_favorites(matches)
+        if not pending:
+            return 0
+
+        kind = matches[0].kind
+        with self.metrics.phase("write", "saved %ss" % kind) as phase:
+            failed = set(save(list(pending), chunk_size=self.chunk_size))
+            phase.items = len(pending) - len(failed)
 
-        tidal_playlist_id = self.tidal._create_playlist(
-            playlist_name, delete_existing
+        return self._saved_favorites(kind, pending, failed)
+
+    def _pending_favorites(self, matches):
+        """Return the found items still to add to Tidal's favorites.
+
+        The result is an OrderedDict of the matches by Tidal ID. Items that
+        could not be found are logged.
+
+        Parameters
+        ----------
+        matches: list
+            Match objects of the items, all of the same kind
+        """
+        self.metrics.observe_matches(matches)
+
+        pending = OrderedDict()
+        for match in matches:
+            action = self._favorite_action(match)
+            if action == "missing":
+                self._warn_missing(match)
+            elif action == "add":
+                pending.setdefault(match.tidal_id, []).append(match)
+
+        return pending
+
+    def _saved_favorites(self, kind, pending, failed):
+        """Record the items added to the favorites in the journal.
+
+        Return the number of items that could not be added.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        pending: OrderedDict
+            Matches by Tidal ID, as returned by _pending_favorites()
+        failed: set
+            Tidal IDs that could not be added
+        """
+        self._mark_written(
+            kind,
+            [
+                match.key
+                for tidal_id, group in pending.items()
+                if tidal_id not in failed
+                for match in group
+            ],
         )
 
-        for track in spotify_tracks:
-            artist = track["track"]["artists"][0]["name"]
-            # album = track["track"]["album"]["name"]
-            name = track["track"]["name"]
-            self.tidal.add_track_to_playlist(
-                tidal_playlist_id, artist=artist, name=name
+        if failed:
+            logging.getLogger(__name__).warning(
+                "Could not add %d of %d %ss to favorites",
+                len(failed),
+                len(pending),
+                kind,
             )
+
+        return len(failed)
+
+    def _favorite_action(self, match):
+        """Return what to do with a saved item at Tidal.
+
+        The action is 'missing' if the item could not be found, 'done' if
+        the journal has it recorded as written, 'exists' if it is a favorite
+        already and 'add' otherwise.
+
+        Parameters
+        ----------
+        match: Match
+            Result of looking up the item
+        """
+        if not match.found:
+            return "missing"
+        if self._is_written(match.kind, match.key):
+            return "done"
+        if self._is_favorite(match.kind, match.tidal_id):
+            return "exists"
+        return "add"
+
+    @staticmethod
+    def _warn_missing(match):
+        """Log that an item could not be found at Tidal.
+
+        Parameters
+        ----------
+        match: Match
+            Result of looking up the item
+        """
+        if match.kind != "artist":
+            logging.getLogger(__name__).warning(
+                "Could not find %s: %s from %s",
+                match.kind,
+                match.name,
+                match.artist,
+            )
+        else:
+            logging.getLogger(__name__).warning(
+                "Could not find %s: %s", match.kind, match.name
+            )
+
+    def _load_favorites(self, kind):
+        """Fetch the favorites of a kind at Tidal, to skip items among them.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        """
+        self._favorites[kind] = self.tidal.favorites(kind + "s")
+
+    def _is_favorite(self, kind, tidal_id):
+        """Whether an item is known to be among the favorites at Tidal.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        tidal_id: int
+            ID of the item at Tidal
+        """
+        return kind in self._favorites and tidal_id in self._favorites[kind]
+
+    def _favorite(self, kind, name, artist=None):
+        """Look up an item among the favorites at Tidal by name.
+
+        Return a tuple (tidal_id, 'favorite'), or None if the item is not a
+        favorite or the favorites were not fetched.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        name: str
+            Name of the item
+        artist: str, optional
+            Name of the artist, if the item isn't an artist itself
+        """
+        if kind not in self._favorites:
+            return None
+
+        tidal_id = self._favorites[kind].find(name, artist)
+        return (tidal_id, "favorite") if tidal_id is not None else None
+
+    def _is_written(self, kind, key):
+        """Whether the journal has an item recorded as written.
+
+        Parameters
+        ----------
+        kind: str
+            Kind of the item, e.g. 'track' or 'playlist'
+        key: str
+            Key of the item
+        """
+        return self.journal is not None and self.journal.written(kind, key)
+
+    def _mark_written(self, kind, keys):
+        """Record in the journal that items were written to Tidal.
+
+        Parameters
+        ----------
+        kind: str
+            Kind of the items, e.g. 'track' or 'playlist'
+        keys: list
+            Keys of the items
+        """
+        if self.journal is not None:
+            self.journal.record_written(kind, keys)
+
+    def _is_unchanged(self, spotify_playlist, key, playlist_name):
+        """Whether a playlist didn't change since it was last copied.
+
+        The copy at Tidal has to exist under the same name still. If it was
+        deleted or renamed there, the playlist is copied again.
+
+        Parameters
+        ----------
+        spotify_playlist:
+            Playlist to copy to tidal
+        key: str
+            Key of the playlist, see _playlist_key()
+        playlist_name: str
+            Name of the playlist in Tidal
+        """
+        tidal_id = self._synced_copy(spotify_playlist, key)
+        return tidal_id is not None and tidal_id in (
+            self.tidal._playlist_index().get(playlist_name, ())
+        )
+
+    @staticmethod
+    def _playlist_key(spotify_playlist, playlist_name):
+        """Return the key to record a copied playlist with.
+
+        Parameters
+        ----------
+        spotify_playlist:
+            Playlist copied to tidal
+        playlist_name: str
+            Name of the playlist in Tidal
+        """
+        return "%s:%s" % (spotify_playlist["id"], playlist_name)
+
+    def _synced_copy(self, spotify_playlist, key):
+        """Return the Tidal ID of the copy of the playlist's snapshot.
+
+        Return None if the playlist changed since it was last copied, or
+        there is no sync state.
+
+        Parameters
+        ----------
+        spotify_playlist:
+            Playlist to copy to tidal
+        key: str
+            Key of the playlist, see _playlist_key()
+        """
+        if self.state is None or not spotify_playlist.get("snapshot_id"):
+            return None
+
+        synced = self.state.playlist(key)
+        if synced is None or synced[0] != spotify_playlist["snapshot_id"]:
+            return None
+        return synced[1]
+
+    def _resolve(self, find, items):
+        """Look up all items at Tidal and return their matches in order.
+
+        With more than one worker, the lookups run in a thread pool. Items
+        are looked up as soon as they are available, so searching can start
+        while later pages are still being fetched from Spotify.
+
+        Parameters
+        ----------
+        find: callable
+            One of _find_album(), _find_artist() or _find_track()
+        items: iterable
+            Spotify records to look up
+        """
+        if self.workers <= 1:
+            return [find(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(find, items))
+
+    def _resolve_tracks(self, tracks):
+        """Look up all tracks at Tidal and return their matches in order.
+
+        If album_threshold is set, tracks sharing an album are looked up
+        together with _find_album_tracks(). This requires all tracks to be
+        fetched from Spotify before searching starts.
+
+        Parameters
+        ----------
+        tracks: iterable
+            Track records to look up
+        """
+        if not self.album_threshold:
+            return self._resolve(self._find_track, tracks)
+
+        tracks = list(tracks)
+        groups = self._group_by_album(tracks)
+        results = self._resolve(
+            self._find_album_tracks,
+            [[tracks[i] for i in group] for group in groups],
+        )
+
+        return self._ungroup(groups, results)
+
+    def _group_by_album(self, tracks):
+        """Return lists of positions of tracks to look up together.
+
+        Tracks from albums with less than album_threshold tracks get a group
+        on their own.
+
+        Parameters
+        ----------
+        tracks: list
+            Track records
+        """
+        albums = OrderedDict()
+        for i, track in enumerate(tracks):
+            album_id = track.album.id if track.album else None
+            albums.setdefault(album_id, []).append(i)
+
+        groups = []
+        for album_id, positions in albums.items():
+            if album_id and len(positions) >= self.album_threshold:
+                groups.append(positions)
+            else:
+                groups.extend([i] for i in positions)
+
+        return groups
+
+    @staticmethod
+    def _ungroup(groups, results):
+        """Return the matches of all groups in the original track order.
+
+        Parameters
+        ----------
+        groups: list
+            Lists of positions, as returned by _group_by_album()
+        results: list
+            Lists of matches, one for each group
+        """
+        matches = [None] * sum(len(group) for group in groups)
+        for group, group_matches in zip(groups, results):
+            for i, match in zip(group, group_matches):
+                matches[i] = match
+
+        return matches
+
+    def _find_album_tracks(self, tracks):
+        """Return the Matches for tracks from the same Spotify album.
+
+        The album is looked up at Tidal only once, and its tracklist is used
+        to find all tracks that aren't cached yet. Tracks missing from the
+        tracklist are searched for one by one.
+
+        Parameters
+        ----------
+        tracks: list
+            Track records of the same album
+        """
+        if len(tracks) == 1:
+            return [self._find_track(tracks[0])]
+
+        indexes = []
+
+        def album_index():
+            if not indexes:
+                indexes.append(self._album_index(tracks[0].album))
+            return indexes[0]
+
+        return [self._find_track(t, album_index) for t in tracks]
+
+    def _album_index(self, album):
+        """Return an AlbumIndex for a Spotify album, or None if not found.
+
+        Parameters
+        ----------
+        album:
+            Album record
+        """
+        album_id = self._find_album(album).tidal_id
+        if album_id is None:
+            return None
+
+        return self.memo.get(
+            ("tracklist", album_id),
+            lambda: AlbumIndex(self.tidal.album_tracks(album_id)),
+        )
+
+    def _find_album(self, album):
+        """Return the Match for a Spotify album.
+
+        Parameters
+        ----------
+        album:
+            Album record
+        """
+        tidal_id, strategy = self._cached(
+            "album",
+            MatchCache.key(album.id, album.name, album.artist),
+            lambda: self._favorite("album", album.name, album.artist)
+            or self.tidal.find_album(album.name, album.artist, album.upc),
+        )
+        return Match(
+            "album",
+            album.name,
+            album.artist,
+            album.id,
+            tidal_id,
+            strategy,
+        )
+
+    def _find_artist(self, artist):
+        """Return the Match for a Spotify artist.
+
+        Parameters
+        ----------
+        artist:
+            Artist record
+        """
+        tidal_id, strategy = self._cached(
+            "artist",
+            MatchCache.key(artist.id, artist.name),
+            lambda: self._favorite("artist", artist.name)
+            or self._search_artist(artist.name),
+        )
+        return Match(
+            "artist",
+            artist.name,
+            artist.name,
+            artist.id,
+            tidal_id,
+            strategy,
+        )
+
+    def _find_track(self, track, album_index=None):
+        """Return the Match for a Spotify track.
+
+        Parameters
+        ----------
+        track:
+            Track record
+        album_index: callable, optional
+            Returns the AlbumIndex of the track's album, or None. Only called
+            if the track isn't cached.
+        """
+        artist = track.artist
+
+        def search():
+            favorite = self._favorite("track", track.name, artist)
+            if favorite is not None:
+                return favorite
+
+            index = album_index() if album_index else None
+            track_id = index.find(track) if index else None
+            if track_id is not None:
+                return track_id, "album"
+            return self.tidal.find_track(track.name, artist, track.isrc)
+
+        tidal_id, strategy = self._cached(
+            "track",
+            MatchCache.key(track.id, track.name, artist),
+            search,
+        )
+        return Match(
+            "track",
+            track.name,
+            artist,
+            track.id,
+            tidal_id,
+            strategy,
+        )
+
+    def _search_artist(self, name):
+        """Search an artist and return a tuple (artist_id, strategy).
+
+        Parameters
+        ----------
+        name: str
+            Name of the artist
+        """
+        artist_id = self.tidal._search_artist(name)
+        return artist_id, "search" if artist_id is not None else None
+
+    def _cached(self, kind, key, search):
+        """Look up a Tidal ID in the cache and only search on a miss.
+
+        Return a tuple (tidal_id, strategy). If the ID was taken from the
+        cache, the strategy is 'cache'.
+
+        Each item is only looked up once per run, even if it is requested
+        by several threads at the same time.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        key: str
+            Cache key of the item
+        search: callable
+            Returns a tuple (tidal_id, strategy) for the item
+        """
+        return self.memo.get(
+            (kind, key), lambda: self._cached_lookup(kind, key, search)
+        )
+
+    def _cached_lookup(self, kind, key, search):
+        """Look up a Tidal ID in the journal or cache, or search for it.
+
+        Every result is recorded in the journal, if there is one. IDs taken
+        from it have the strategy 'journal'.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        key: str
+            Cache key of the item
+        search: callable
+            Returns a tuple (tidal_id, strategy) for the item
+        """
+        found, tidal_id, strategy = self._recall(kind, key)
+        if not found:
+            tidal_id, strategy = search()
+            self._remember(kind, key, tidal_id, strategy)
+
+        return tidal_id, strategy
+
+    def _recall(self, kind, key):
+        """Look up a Tidal ID in the journal or cache.
+
+        Return a tuple (found, tidal_id, strategy). IDs from the cache are
+        recorded in the journal.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        key: str
+            Cache key of the item
+        """
+        if self.journal is not None:
+            found, tidal_id = self.journal.resolved(kind, key)
+            if found:
+                strategy = "journal" if tidal_id is not None else None
+                return True, tidal_id, strategy
+
+        if self.cache is not None:
+            found, tidal_id = self.cache.get(kind, key)
+            if found:
+                if self.journal is not None:
+                    self.journal.record_resolution(kind, key, tidal_id)
+                strategy = "cache" if tidal_id is not None else None
+                return True, tidal_id, strategy
+
+        return False, None, None
+
+    def _remember(self, kind, key, tidal_id, strategy):
+        """Record the result of a search in the cache and the journal.
+
+        Items matched by name among the favorites are not recorded. Names
+        alone may be ambiguous, so these matches are only used for the
+        current run.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track', 'album' or 'artist'
+        key: str
+            Cache key of the item
+        tidal_id: int
+            ID found at Tidal, or None
+        strategy: str
+            How the item was found
+        """
+        if strategy == "favorite":
+            return
+        if self.cache is not None:
+            self.cache.set(kind, key, tidal_id)
+        if self.journal is not None:
+            self.journal.record_resolution(kind, key, tidal_id)
@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+import time
+
+
+class SyncState:
+    """Persistent state of the last sync of an account.
+
+    For every copied playlist, the Spotify snapshot ID it was copied at and
+    the ID of the playlist at Tidal are stored, so playlists that didn't
+    change since can be skipped by the next run.
+
+    For saved albums and tracks, the newest item synced is stored as a high
+    water mark, so the next run only needs to fetch items saved after it.
+
+    The state of the account is loaded into memory when it is opened.
+
+    Parameters
+    ----------
+    path: str
+        Location of the SQLite database
+    account: str
+        Identifies the Spotify and Tidal accounts synced with each other
+    """
+    def __init__(self, path, account):
+        self.path = path
+        self.account = account
+
+        self._lock = threading.Lock()
+        # Other processes may share the database, wait for their writes
+        self._connection = sqlite3.connect(
+            path, timeout=60, check_same_thread=False
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS playlists ("
+            " account TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " snapshot_id TEXT NOT NULL,"
+            " tidal_id TEXT NOT NULL,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (account, key))"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS marks ("
+            " account TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " added_at TEXT NOT NULL,"
+            " spotify_id TEXT,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (account, kind))"
+        )
+        self._connection.commit()
+
+        self._marks = {
+            kind: (added_at, spotify_id)
+            for kind, added_at, spotify_id in self._connection.execute(
+                "SELECT kind, added_at, spotify_id FROM marks"
+                " WHERE account = ?",
+                (account,),
+            )
+        }
+        self._playlists = {
+            key: (snapshot_id, tidal_id)
+            for key, snapshot_id, tidal_id in self._connection.execute(
+                "SELECT key, snapshot_id, tidal_id FROM playlists"
+                " WHERE account = ?",
+                (account,),
+            )
+        }
+
+    def playlist(self, key):
+        """Return a tuple (snapshot_id, tidal_id) of a synced playlist.
+
+        Return None if the playlist was never synced.
+
+        Parameters
+        ----------
+        key: str
+            Key of the playlist
+        """
+        return self._playlists.get(key)
+
+    def record_playlist(self, key, snapshot_id, tidal_id):
+        """Record that a playlist was synced at a snapshot.
+
+        Parameters
+        ----------
+        key: str
+            Key of the playlist
+        snapshot_id: str
+            Snapshot ID of the playlist at Spotify
+        tidal_id: str
+            ID of the playlist at Tidal
+        """
+        with self._lock:
+            self._playlists[key] = (snapshot_id, tidal_id)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO playlists"
+                " (account, key, snapshot_id, tidal_id, updated)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.account, key, snapshot_id, tidal_id, time.time()),
+            )
+            self._connection.commit()
+
+    def mark(self, kind):
+        """Return a tuple (added_at, spotify_id) of the newest synced item.
+
+        Return None if no item of the kind was synced yet.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track' or 'album'
+        """
+        return self._marks.get(kind)
+
+    def record_mark(self, kind, added_at, spotify_id):
+        """Record the newest saved item synced of a kind.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'track' or 'album'
+        added_at: str
+            When the item was saved at Spotify
+        spotify_id: str
+            ID of the item at Spotify
+        """
+        with self._lock:
+            self._marks[kind] = (added_at, spotify_id)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO marks"
+                " (account, kind, added_at, spotify_id, updated)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.account, kind, added_at, spotify_id, time.time()),
+            )
+            self._connection.commit()
+
+    def close(self):
+        """Close the underlying database."""
+        with self._lock:
+            self._connection.close()
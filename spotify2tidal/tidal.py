@@ -1,6 +1,9 @@
+import difflib
 import logging
-import requests
-import tidalapi
+import threading
+
+from spotify2tidal.favorites import Favorites
+from spotify2tidal.scheduler import Scheduler
 
 
 class Tidal:
@@ -9,15 +12,55 @@ class Tidal:
     Add new artists/albums/tracks/albums by searching for them with
     save_artist(), save_album(), and save_track().
 
+    Searching is safe to do from several threads at once, all writes are
+    expected to happen from a single thread.
+
+    The login happens on first use, so does importing tidalapi and
+    requests. Creating a Tidal object is cheap.
+
     Parameters
     ----------
     username: str
         Tidal username
     password: str
         Tidal password
+    pool_size: int, optional
+        Number of connections to keep open to Tidal. Should be at least the
+        number of threads searching at once.
+    scheduler: Scheduler, optional
+        Limits the rate of requests to Tidal and retries throttled ones
+    metrics: Metrics, optional
+        Records the latency and outcome of every request to Tidal
     """
-    def __init__(self, username, password):
-        self.tidal_session = self._connect(username, password)
+    api_location = "https://listen.tidal.com/v1/"
+
+    def __init__(
+        self, username, password, pool_size=10, scheduler=None, metrics=None
+    ):
+        self.scheduler = scheduler or Scheduler()
+        self.metrics = metrics
+
+        self._username = username
+        self._password = password
+        self._pool_size = pool_size
+        self._http = None
+        self._tidal_session = None
+        self._connect_lock = threading.Lock()
+        self._favorites = {}
+        self._favorites_lock = threading.Lock()
+        self._playlists = None
+
+    @property
+    def tidal_session(self):
+        """tidalapi session, logged in on first use."""
+        self._connect_once()
+        return self._tidal_session
+
+    @property
+    def http(self):
+        """requests session for the logged in user, see tidal_session."""
+        self._connect_once()
+        return self._http
 
     @property
     def own_playlists(self):
@@ -26,41 +69,205 @@ class Tidal:
             self.tidal_session.user.id
         )
 
-    def add_track_to_playlist(self, playlist_id, name, artist):
-        """Search tidal for a track and add it to a playlist.
+    def add_tracks_to_playlist(
+        self, playlist_id, track_ids, to_index=0, chunk_size=100
+    ):
+        """Add already resolved tracks to a playlist, keeping their order.
+
+        Instead of one request per track, the tracks are sent in chunks of
+        comma-separated IDs.
 
         Parameters
         ----------
         playlist_id:
-            Playlist to add track to
+            Playlist to add tracks to
+        track_ids: list
+            Tidal IDs of the tracks to add, in the intended order
+        to_index: int, optional
+            Position in the playlist to insert the first track at
+        chunk_size: int, optional
+            Maximum number of tracks to add with a single request
+        """
+        for start in range(0, len(track_ids), chunk_size):
+            chunk = track_ids[start:start + chunk_size]
+            self._request(
+                "POST",
+                "playlists/" + str(playlist_id) + "/items",
+                headers={"if-none-match": "*"},
+                data={
+                    "trackIds": ",".join(str(t) for t in chunk),
+                    "toIndex": to_index + start,
+                },
+            )
+            logging.getLogger(__name__).info(
+                "Added %d tracks to playlist %s", len(chunk), playlist_id
+            )
+
+    def album_tracks(self, album_id):
+        """Return all tracks of an album as returned by Tidal's API.
+
+        Parameters
+        ----------
+        album_id: int
+            Album to get the tracks from
+        """
+        return self.tidal_session.request(
+            "GET", "albums/" + str(album_id) + "/tracks"
+        ).json()["items"]
+
+    def favorites(self, kind):
+        """Return the Favorites index of the user's favorite items.
+
+        The favorites are only fetched from Tidal on the first call. Items
+        added with save_albums(), save_artists() or save_tracks() afterwards
+        are added to the index as well.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'albums', 'artists' or 'tracks'
+        """
+        with self._favorites_lock:
+            if kind not in self._favorites:
+                self._favorites[kind] = Favorites(
+                    self._fetch_favorites(kind)
+                )
+                logging.getLogger(__name__).info(
+                    "Found %d favorite %s", len(self._favorites[kind]), kind
+                )
+            return self._favorites[kind]
+
+    def find_album(self, name, artist, upc=None):
+        """Find an album and return a tuple (album_id, strategy).
+
+        If the UPC is known, look the album up by it first, since that is
+        both faster and more reliable than searching by name. The strategy
+        is either 'upc', 'search' or None if the album could not be found.
+
+        Parameters
+        ----------
+        name: str
+            Name of the album
+        artist: str
+            Artist of the album
+        upc: str, optional
+            Universal Product Code of the album
+        """
+        if upc:
+            album_id = self._search_album_by_upc(upc)
+            if album_id is not None:
+                return album_id, "upc"
+
+        album_id = self._search_album(name, artist)
+        return album_id, "search" if album_id is not None else None
+
+    def find_track(self, name, artist, isrc=None):
+        """Find a track and return a tuple (track_id, strategy).
+
+        If the ISRC is known, look the track up by it first, since that is
+        both faster and more reliable than searching by name. The strategy
+        is either 'isrc', 'search' or None if the track could not be found.
+
+        Parameters
+        ----------
         name: str
             Name of the track
         artist: str
             Artist of the track
+        isrc: str, optional
+            International Standard Recording Code of the track
         """
+        if isrc:
+            track_id = self._search_track_by_isrc(isrc)
+            if track_id is not None:
+                return track_id, "isrc"
+
         track_id = self._search_track(name, artist)
+        return track_id, "search" if track_id is not None else None
+
+    def find_playlist(self, playlist_name):
+        """Return the ID of an existing playlist, or None if there is none.
+
+        Parameters
+        ----------
+        playlist_name: str
+            Name of the playlist
+        """
+        playlist_ids = self._playlist_index().get(playlist_name)
+        return playlist_ids[0] if playlist_ids else None
+
+    def playlist_track_ids(self, playlist_id):
+        """Return the IDs of all tracks in a playlist, in order.
+
+        Parameters
+        ----------
+        playlist_id: str
+            Playlist to get the tracks from
+        """
+        return [
+            track["id"]
+            for track in self._iter_items(
+                "playlists/" + str(playlist_id) + "/tracks"
+            )
+        ]
+
+    def remove_tracks_from_playlist(
+        self, playlist_id, indices, chunk_size=100
+    ):
+        """Remove the tracks at the given positions from a playlist.
 
-        if track_id:
-            tidal_add_track_url = (
-                "https://listen.tidal.com/v1/playlists/"
+        Parameters
+        ----------
+        playlist_id: str
+            Playlist to remove tracks from
+        indices: list
+            Positions of the tracks to remove
+        chunk_size: int, optional
+            Maximum number of tracks to remove with a single request
+        """
+        indices = sorted(indices)
+
+        # Start at the end, so that earlier positions are not shifted
+        for end in range(len(indices), 0, -chunk_size):
+            chunk = indices[max(0, end - chunk_size):end]
+            self._request(
+                "DELETE",
+                "playlists/"
                 + str(playlist_id)
-                + "/items"
+                + "/items/"
+                + ",".join(str(i) for i in chunk),
+                headers={"if-none-match": "*"},
             )
-            r = requests.post(
-                tidal_add_track_url,
-                headers={
-                    "x-tidal-sessionid": self.tidal_session.session_id,
-                    "if-none-match": "*",
-                },
-                data={"trackIds": track_id, "toIndex": 1},
+            logging.getLogger(__name__).info(
+                "Removed %d tracks from playlist %s", len(chunk), playlist_id
             )
-            r.raise_for_status()
-            logging.getLogger(__name__).info("Added: %s - %s", artist, name)
 
-        else:
-            logging.getLogger(__name__).warning(
-                "Could not find track: %s - %s", artist, name
-            )
+    def sync_playlist(self, playlist_id, track_ids, chunk_size=100):
+        """Change an existing playlist to contain exactly the given tracks.
+
+        Only the differences to the current content are added or removed.
+        Tracks that moved are removed and added again at their new position.
+
+        Parameters
+        ----------
+        playlist_id: str
+            Playlist to change
+        track_ids: list
+            Tidal IDs of the tracks the playlist should contain, in order
+        chunk_size: int, optional
+            Maximum number of tracks to add or remove with a single request
+        """
+        current = self.playlist_track_ids(playlist_id)
+
+        for start, end, insert in playlist_changes(current, track_ids):
+            if end > start:
+                self.remove_tracks_from_playlist(
+                    playlist_id, range(start, end), chunk_size
+                )
+            if insert:
+                self.add_tracks_to_playlist(
+                    playlist_id, insert, start, chunk_size
+                )
 
     def delete_existing_playlist(self, playlist_name):
         """Delete any existing playlist with a given name.
@@ -70,9 +277,8 @@ class Tidal:
         playlist_name: str
             Playlist name to delete
         """
-        for playlist in self.own_playlists:
-            if playlist.name == playlist_name:
-                self._delete_playlist(playlist.id)
+        for playlist_id in list(self._playlist_index().get(playlist_name, [])):
+            self._delete_playlist(playlist_id)
 
     def save_album(self, name, artist_name):
         """Find an album and save it to your favorites.
@@ -96,6 +302,22 @@ class Tidal:
                 "Could not find album: %s from %s", name, artist_name
             )
 
+    def save_albums(self, album_ids, chunk_size=100):
+        """Add already resolved albums to your favorites.
+
+        Return a list of the IDs that could not be added.
+
+        Parameters
+        ----------
+        album_ids: list
+            Tidal IDs of the albums
+        chunk_size: int, optional
+            Maximum number of albums to add with a single request
+        """
+        return self._save_favorites(
+            "albums", "albumId", album_ids, chunk_size
+        )
+
     def save_artist(self, name):
         """Find an artist by name and save it to your favorites.
 
@@ -114,6 +336,22 @@ class Tidal:
                 "Could not find artist: %s", name
             )
 
+    def save_artists(self, artist_ids, chunk_size=100):
+        """Add already resolved artists to your favorites.
+
+        Return a list of the IDs that could not be added.
+
+        Parameters
+        ----------
+        artist_ids: list
+            Tidal IDs of the artists
+        chunk_size: int, optional
+            Maximum number of artists to add with a single request
+        """
+        return self._save_favorites(
+            "artists", "artistId", artist_ids, chunk_size
+        )
+
     def save_track(self, name, artist_name):
         """Find a track and save it to your favorites.
 
@@ -136,6 +374,22 @@ class Tidal:
                 "Could not find track: %s from %s", name, artist_name
             )
 
+    def save_tracks(self, track_ids, chunk_size=100):
+        """Add already resolved tracks to your favorites.
+
+        Return a list of the IDs that could not be added.
+
+        Parameters
+        ----------
+        track_ids: list
+            Tidal IDs of the tracks
+        chunk_size: int, optional
+            Maximum number of tracks to add with a single request
+        """
+        return self._save_favorites(
+            "tracks", "trackId", track_ids, chunk_size
+        )
+
     def _create_playlist(self, playlist_name, delete_existing=False):
         """Create a tidal playlist and return its ID.
 
@@ -149,24 +403,21 @@ class Tidal:
         if delete_existing is True:
             self.delete_existing_playlist(playlist_name)
 
-        tidal_create_playlist_url = (
-            "https://listen.tidal.com/v1/users/"
-            + str(self.tidal_session.user.id)
-            + "/playlists"
-        )
-
-        r = requests.post(
-            tidal_create_playlist_url,
+        r = self._request(
+            "POST",
+            "users/" + str(self.tidal_session.user.id) + "/playlists",
             data={"title": playlist_name, "description": ""},
-            headers={"x-tidal-sessionid": self.tidal_session.session_id},
         )
-        r.raise_for_status()
 
         logging.getLogger(__name__).debug(
             "Created playlist: %s", playlist_name
         )
 
-        return r.json()["uuid"]
+        playlist_id = r.json()["uuid"]
+        if self._playlists is not None:
+            self._playlists.setdefault(playlist_name, []).append(playlist_id)
+
+        return playlist_id
 
     def _connect(self, username, password):
         """Connect to tidal and return a session object.
@@ -178,25 +429,193 @@ class Tidal:
         password: str
             Tidal password
         """
-        tidal_session = tidalapi.Session()
+        from spotify2tidal.pooled import PooledSession
+
+        tidal_session = PooledSession(self._http)
         tidal_session.login(username, password)
         return tidal_session
 
+    def _connect_once(self):
+        """Log in to Tidal, unless that happened already."""
+        if self._tidal_session is not None:
+            return
+
+        with self._connect_lock:
+            if self._tidal_session is None:
+                self._http = self._http_session(self._pool_size)
+                tidal_session = self._connect(self._username, self._password)
+                self._http.headers[
+                    "x-tidal-sessionid"
+                ] = tidal_session.session_id
+                self._tidal_session = tidal_session
+                self._password = None
+
     def _delete_playlist(self, playlist_id):
         """Delete a playlist.
 
+        A playlist that doesn't exist anymore counts as deleted, e.g. if it
+        was deleted elsewhere after the playlists were fetched.
+
         Parameters
         ----------
         playlist_id: str
             Playlist ID to delete
         """
-        playlist_url = "https://listen.tidal.com/v1/playlists/" + playlist_id
+        import requests
+
+        try:
+            self._request("DELETE", "playlists/" + playlist_id)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            logging.getLogger(__name__).info(
+                "Playlist %s was already deleted", playlist_id
+            )
+
+        if self._playlists is not None:
+            for name, playlist_ids in list(self._playlists.items()):
+                if playlist_id in playlist_ids:
+                    playlist_ids.remove(playlist_id)
+                if not playlist_ids:
+                    del self._playlists[name]
+
+    def _fetch_favorites(self, kind):
+        """Yield tuples (tidal_id, name, artist) of all favorite items.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'albums', 'artists' or 'tracks'
+        """
+        for entry in self._iter_items(
+            "users/%s/favorites/%s" % (self.tidal_session.user.id, kind)
+        ):
+            yield favorite_entry(kind, entry["item"])
+
+    def _http_session(self, pool_size):
+        """Return a requests session keeping connections to Tidal alive.
+
+        All requests sent with it go through the scheduler.
 
-        r = requests.delete(
-            playlist_url,
-            headers={"x-tidal-sessionid": self.tidal_session.session_id},
+        Parameters
+        ----------
+        pool_size: int
+            Maximum number of connections to keep open
+        """
+        from requests.adapters import HTTPAdapter
+
+        from spotify2tidal.sessions import ScheduledSession
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
         )
+        http = ScheduledSession(self.scheduler, self.metrics, "tidal")
+        http.mount("https://", adapter)
+        return http
+
+    def _iter_items(self, path):
+        """Yield all items of a paginated result, fetching page by page.
+
+        Parameters
+        ----------
+        path: str
+            Path of the result relative to api_location
+        """
+        offset = 0
+
+        while True:
+            result = self.tidal_session.request(
+                "GET", path, params={"offset": offset}
+            ).json()
+
+            for item in result["items"]:
+                yield item
+
+            offset += len(result["items"])
+            if not result["items"] or offset >= result["totalNumberOfItems"]:
+                return
+
+    def _request(self, method, path, **kwargs):
+        """Send a request to Tidal's listen API and return the response.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        path: str
+            Path relative to api_location
+        kwargs:
+            Passed on to requests
+        """
+        r = self.http.request(method, self.api_location + path, **kwargs)
         r.raise_for_status()
+        return r
+
+    def _save_favorites(self, kind, field, ids, chunk_size):
+        """Add items to the favorites in chunks of comma-separated IDs.
+
+        A chunk that fails doesn't stop the others. Return a list of the IDs
+        in failed chunks.
+
+        Parameters
+        ----------
+        kind: str
+            One of 'albums', 'artists' or 'tracks'
+        field: str
+            Name of the form field holding the IDs, as used by tidalapi's
+            Favorites, e.g. 'trackId'
+        ids: list
+            Tidal IDs of the items
+        chunk_size: int
+            Maximum number of items to add with a single request
+        """
+        import requests
+
+        failed = []
+
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            try:
+                self.tidal_session.request(
+                    "POST",
+                    "users/%s/favorites/%s"
+                    % (self.tidal_session.user.id, kind),
+                    data={field: ",".join(str(i) for i in chunk)},
+                )
+            except requests.RequestException as e:
+                logging.getLogger(__name__).warning(
+                    "Could not add %d %s to favorites: %s", len(chunk), kind, e
+                )
+                failed.extend(chunk)
+            else:
+                logging.getLogger(__name__).info(
+                    "Added %d %s to favorites", len(chunk), kind
+                )
+                if kind in self._favorites:
+                    for tidal_id in chunk:
+                        self._favorites[kind].add(tidal_id)
+
+        return failed
+
+    def _playlist_index(self):
+        """Return a dictionary of the IDs of the user's playlists by name.
+
+        All playlists are only fetched on the first call. Afterwards, the
+        index is kept up to date as playlists are created and deleted.
+        """
+        if self._playlists is not None:
+            return self._playlists
+
+        playlists = {}
+        for playlist in self._iter_items(
+            "users/%s/playlists" % self.tidal_session.user.id
+        ):
+            playlists.setdefault(playlist["title"], []).append(
+                playlist["uuid"]
+            )
+
+        self._playlists = playlists
+        return playlists
 
     def _search_track(self, name, artist):
         """Search tidal and return the track ID.
@@ -214,6 +633,27 @@ class Tidal:
             if t.artist.name.lower() == artist.lower():
                 return t.id
 
+    def _search_track_by_isrc(self, isrc):
+        """Look up a track by its ISRC and return the track ID.
+
+        Parameters
+        ----------
+        isrc: str
+            International Standard Recording Code of the track
+        """
+        import requests
+
+        try:
+            tracks = self.tidal_session.request(
+                "GET", "tracks/byIsrc", params={"isrc": isrc}
+            ).json()["items"]
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+
+        return first_available(tracks)
+
     def _search_album(self, name, artist):
         """Search tidal and return the album ID.
 
@@ -230,6 +670,27 @@ class Tidal:
             if a.artist.name.lower() == artist.lower():
                 return a.id
 
+    def _search_album_by_upc(self, upc):
+        """Look up an album by its UPC and return the album ID.
+
+        Parameters
+        ----------
+        upc: str
+            Universal Product Code of the album
+        """
+        import requests
+
+        try:
+            albums = self.tidal_session.request(
+                "GET", "albums/byBarcodeId", params={"barcodeId": upc}
+            ).json()["items"]
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+
+        return first_available(albums)
+
     def _search_artist(self, name):
         """Search tidal and return the artist ID.
 
@@ -243,3 +704,56 @@ class Tidal:
         for a in artists:
             if a.name.lower() == name.lower():
                 return a.id
+
+
+def favorite_entry(kind, item):
+    """Return a tuple (tidal_id, name, artist) for a favorite item.
+
+    Parameters
+    ----------
+    kind: str
+        One of 'albums', 'artists' or 'tracks'
+    item: dict
+        Item as returned by Tidal's API
+    """
+    if kind == "artists":
+        return item["id"], item["name"], None
+    return item["id"], item["title"], item["artist"]["name"]
+
+
+def first_available(items):
+    """Return the ID of the first item that can be streamed, or None.
+
+    Parameters
+    ----------
+    items: list
+        Tracks or albums as returned by Tidal's API
+    """
+    for item in items:
+        if item.get("streamReady", True):
+            return item["id"]
+
+
+def playlist_changes(current, track_ids):
+    """Yield the changes turning the tracks of a playlist into others.
+
+    Each change is a tuple (start, end, insert): remove the tracks from
+    position start up to end, then insert the track IDs in insert at start.
+    Tracks that moved are removed and inserted again. The changes start at
+    the end of the playlist, so the positions of the remaining changes stay
+    valid while they are applied one after the other.
+
+    Parameters
+    ----------
+    current: list
+        Tidal IDs of the tracks in the playlist, in order
+    track_ids: list
+        Tidal IDs of the tracks the playlist should contain, in order
+    """
+    opcodes = difflib.SequenceMatcher(
+        None, current, track_ids, autojunk=False
+    ).get_opcodes()
+
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        if tag != "equal":
+            yield i1, i2, track_ids[j1:j2]
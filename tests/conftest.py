@@ -0,0 +1,108 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fake_servers  # noqa: E402
+import run as bench  # noqa: E402
+from spotify2tidal import AsyncSpotify2Tidal  # noqa: E402
+from spotify2tidal.scheduler import Scheduler  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def catalog():
+    """Small library shared by the fake services."""
+    return fake_servers.Catalog(
+        tracks=2000, saved=120, playlists=3, playlist_size=40
+    )
+
+
+@pytest.fixture(scope="session")
+def fake_spotify(catalog):
+    server = fake_servers.start(fake_servers.SpotifyHandler, catalog)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def fake_tidal(catalog):
+    server = fake_servers.start(fake_servers.TidalHandler, catalog)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def spotify_server(fake_spotify):
+    """Fake Spotify server with its request counts reset."""
+    fake_spotify.stats.clear()
+    return fake_spotify
+
+
+@pytest.fixture
+def tidal_server(fake_tidal):
+    """Fake Tidal server without any playlists or favorites."""
+    with fake_tidal.lock:
+        fake_tidal.page_size = 100
+        fake_tidal.stats.clear()
+        fake_tidal.playlists.clear()
+        for favorites in fake_tidal.favorites.values():
+            favorites.clear()
+    return fake_tidal
+
+
+@pytest.fixture
+def tidal(tidal_server):
+    """Tidal account at the fake server."""
+    tidal_class = type(
+        "TestTidal", (bench.BenchTidal,), {"url": tidal_server.url}
+    )
+    return tidal_class("user", "password", scheduler=fast_scheduler())
+
+
+@pytest.fixture
+def make_spotify2tidal(spotify_server, tidal_server):
+    """Return a function creating Spotify2Tidal for the fake services.
+
+    With asynchronous=True, it creates AsyncSpotify2Tidal instead.
+    """
+    spotify_class = type(
+        "TestSpotify", (bench.BenchSpotify,), {"url": spotify_server.url}
+    )
+    tidal_class = type(
+        "TestTidal", (bench.BenchTidal,), {"url": tidal_server.url}
+    )
+    spotify2tidal_class = type(
+        "TestSpotify2Tidal",
+        (bench.Spotify2Tidal,),
+        {"spotify_class": spotify_class, "tidal_class": tidal_class},
+    )
+
+    async_class = type(
+        "TestAsyncSpotify2Tidal",
+        (AsyncSpotify2Tidal,),
+        {"sync_class": spotify2tidal_class},
+    )
+
+    def make(asynchronous=False, **kwargs):
+        kwargs.setdefault("spotify_scheduler", fast_scheduler())
+        kwargs.setdefault("tidal_scheduler", fast_scheduler())
+        return (async_class if asynchronous else spotify2tidal_class)(
+            "tidal_user",
+            "tidal_password",
+            "spotify_user",
+            "client_id",
+            "client_secret",
+            "http://localhost",
+            **kwargs
+        )
+
+    return make
+
+
+def fast_scheduler():
+    """Return a Scheduler that doesn't slow down the tests."""
+    return Scheduler(rate=1000.0, burst=1000, backoff=0.01)
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+import tidalapi
+
+from conftest import fast_scheduler
+from fake_servers import TIDAL_OFFSET
+from spotify2tidal.ahttp import AsyncHTTP, HTTPError
+from spotify2tidal.aio_tidal import AsyncTidal
+from spotify2tidal.pooled import PooledSession
+from test_spotify2tidal import expected_playlists, ids, playlists
+
+
+def run(coroutine):
+    """Run a coroutine on a new event loop and close the loop afterwards."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def copy(st):
+    """Return the matches of copying saved tracks and playlists with st."""
+    async def main():
+        matches = await st.copy_all_saved_spotify_tracks()
+        await st.copy_all_spotify_playlists()
+        return matches
+
+    return run(main())
+
+
+def test_async_matches_sync(make_spotify2tidal, tidal_server, catalog):
+    expected = [
+        (m.spotify_id, m.tidal_id, m.strategy)
+        for m in make_spotify2tidal().copy_all_saved_spotify_tracks()
+    ]
+    tidal_server.favorites["tracks"].clear()
+
+    st = make_spotify2tidal(asynchronous=True, concurrency=4)
+    try:
+        matches = copy(st)
+    finally:
+        run(st.close())
+
+    assert [(m.spotify_id, m.tidal_id, m.strategy) for m in matches] == (
+        expected
+    )
+    assert tidal_server.favorites["tracks"] == set(ids(range(catalog.saved)))
+    assert playlists(tidal_server) == expected_playlists(catalog)
+
+
+def test_async_reused_on_another_event_loop(
+    make_spotify2tidal, tidal_server, catalog
+):
+    st = make_spotify2tidal(asynchronous=True, concurrency=4)
+    copy(st)
+    tidal_server.playlists.clear()
+
+    copy(st)
+    run(st.close())
+
+    assert playlists(tidal_server) == expected_playlists(catalog)
+
+
+def test_async_copies_playlist_again_if_copy_deleted(
+    make_spotify2tidal, tidal_server, catalog, tmp_path
+):
+    state_path = str(tmp_path / "state.sqlite")
+    make_spotify2tidal(state_path=state_path).copy_all_spotify_playlists()
+    tidal_server.playlists.pop(next(iter(tidal_server.playlists)))
+    tidal_server.stats.clear()
+
+    st = make_spotify2tidal(asynchronous=True, state_path=state_path)
+    try:
+        run(st.copy_all_spotify_playlists())
+    finally:
+        run(st.close())
+
+    assert playlists(tidal_server) == expected_playlists(catalog)
+    assert tidal_server.stats["POST /v1/users/{id}/playlists"] == 1
+
+
+def test_async_tidal_uses_tidalapi_location(tidal, tidal_server):
+    url = tidal_server.url
+
+    def connect(username, password):
+        # Only the playlists are changed at the listen API
+        tidal.api_location = "http://127.0.0.1:9/v1/"
+
+        tidal_session = PooledSession(tidal._http)
+        tidal_session._config = tidalapi.Config()
+        tidal_session._config.api_location = url + "/v1/"
+        tidal_session.login(username, password)
+        return tidal_session
+
+    tidal._connect = connect
+    async_tidal = AsyncTidal(tidal, AsyncHTTP(fast_scheduler()))
+
+    async def main():
+        track = await async_tidal.find_track("Track 3", "Artist 3")
+        isrc = await async_tidal.find_track("", "", isrc="QZ%010d" % 4)
+        failed = await async_tidal.save_favorites("tracks", [track[0]])
+        await async_tidal.http.close()
+        return track, isrc, failed
+
+    track, isrc, failed = run(main())
+
+    assert track == (TIDAL_OFFSET + 3, "search")
+    assert isrc == (TIDAL_OFFSET + 4, "isrc")
+    assert failed == []
+    assert tidal_server.favorites["tracks"] == {TIDAL_OFFSET + 3}
+
+
+def test_async_tidal_changes_playlists_with_session_header(
+    tidal, tidal_server
+):
+    async_tidal = AsyncTidal(tidal, AsyncHTTP(fast_scheduler()))
+
+    async def main():
+        uuid = await async_tidal.create_playlist("Playlist")
+        await async_tidal.add_tracks_to_playlist(uuid, [TIDAL_OFFSET])
+        await async_tidal.http.close()
+        return uuid
+
+    uuid = run(main())
+
+    assert tidal_server.playlists[uuid]["tracks"] == [TIDAL_OFFSET]
+
+
+def test_fake_tidal_requires_session(tidal_server):
+    http = AsyncHTTP(fast_scheduler())
+
+    async def main():
+        try:
+            response = await http.request(
+                "POST",
+                tidal_server.url + "/v1/users/1/playlists",
+                data={"title": "Playlist"},
+            )
+        finally:
+            await http.close()
+        response.raise_for_status()
+
+    with pytest.raises(HTTPError):
+        run(main())
+    assert not tidal_server.playlists
@@ -0,0 +1,74 @@
+from spotify2tidal.album_index import AlbumIndex
+from spotify2tidal.records import Album, Track
+
+ALBUM = Album("a1", "Album", ("Artist",))
+
+
+def tidal_track(tidal_id, title, number, duration=200, isrc=None, disc=1):
+    return {
+        "id": tidal_id,
+        "title": title,
+        "isrc": isrc,
+        "duration": duration,
+        "trackNumber": number,
+        "volumeNumber": disc,
+    }
+
+
+def spotify_track(name, number, duration=200.0, isrc=None, disc=1):
+    return Track(
+        "s" + name,
+        name,
+        ("Artist",),
+        ALBUM,
+        isrc=isrc,
+        duration=duration,
+        disc_number=disc,
+        track_number=number,
+    )
+
+
+INDEX = AlbumIndex(
+    [
+        tidal_track(1, "Intro", 1, 60, isrc="ISRC1"),
+        tidal_track(2, "Song", 2),
+        tidal_track(3, "Ballad", 3, 300),
+        tidal_track(4, "Song", 1, 250, disc=2),
+        tidal_track(5, "Outro", 2, 90, disc=2),
+    ]
+)
+
+
+def test_find_by_isrc_first():
+    track = spotify_track("Something else", 9, 1000.0, isrc="ISRC1")
+    assert INDEX.find(track) == 1
+
+
+def test_find_by_position_with_same_title_and_duration():
+    assert INDEX.find(spotify_track("Song", 2)) == 2
+    assert INDEX.find(spotify_track("song", 1, 251.0, disc=2)) == 4
+
+
+def test_find_by_title_at_other_position():
+    assert INDEX.find(spotify_track("Ballad", 7, 301.0)) == 3
+
+
+def test_find_picks_title_with_similar_duration():
+    assert INDEX.find(spotify_track("Song", 9, 249.0)) == 4
+    assert INDEX.find(spotify_track("Song", 9, 201.0)) == 2
+
+
+def test_find_ignores_version_suffix():
+    assert INDEX.find(spotify_track("Ballad - Remastered 2011", 3, 300.0)) == 3
+
+
+def test_find_rejects_different_duration():
+    assert INDEX.find(spotify_track("Ballad", 3, 200.0)) is None
+
+
+def test_find_rejects_different_title_at_same_position():
+    assert INDEX.find(spotify_track("Unknown", 2)) is None
+
+
+def test_find_accepts_unknown_duration():
+    assert INDEX.find(spotify_track("Outro", 5, None)) == 5
@@ -0,0 +1,236 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from spotify2tidal.batch import Batch, WorkQueue, job_id, load_manifest
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "queue.sqlite")
+
+
+def jobs(path):
+    """Return the rows of the queue as dictionaries by job ID."""
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    try:
+        return {
+            row["id"]: dict(row)
+            for row in connection.execute("SELECT * FROM jobs")
+        }
+    finally:
+        connection.close()
+
+
+def test_job_id():
+    assert job_id({"id": "a", "spotify_username": "s"}) == "a"
+    assert job_id({"spotify_username": "s", "tidal_username": "t"}) == "s:t"
+
+
+def test_add_ignores_queued_jobs(queue_path):
+    queue = WorkQueue(queue_path)
+    assert queue.add(["a", "b"]) == 2
+    assert queue.add(["b", "c"]) == 1
+    assert queue.counts() == {"pending": 3}
+
+
+def test_claim_leases_each_job_once(queue_path):
+    queue = WorkQueue(queue_path)
+    queue.add(["a", "b"])
+
+    assert queue.claim("w1") == "a"
+    assert queue.claim("w2") == "b"
+    assert queue.claim("w3") is None
+
+    job = jobs(queue_path)["a"]
+    assert job["status"] == "running"
+    assert job["worker"] == "w1"
+    assert job["attempts"] == 1
+    assert job["leased_until"] > time.time()
+
+
+def test_finish_marks_done(queue_path):
+    queue = WorkQueue(queue_path)
+    queue.add(["a"])
+    queue.claim("w1")
+    queue.finish("a", "w1")
+
+    assert queue.counts() == {"done": 1}
+    assert queue.claim("w1") is None
+
+
+def test_failed_job_is_retried_until_max_attempts(queue_path):
+    queue = WorkQueue(queue_path, max_attempts=2)
+    queue.add(["a"])
+
+    assert queue.claim("w1") == "a"
+    queue.finish("a", "w1", "first")
+    assert jobs(queue_path)["a"]["status"] == "pending"
+
+    assert queue.claim("w2") == "a"
+    queue.finish("a", "w2", "second")
+
+    job = jobs(queue_path)["a"]
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert job["error"] == "second"
+    assert queue.claim("w3") is None
+
+
+def test_claim_prefers_jobs_with_fewer_attempts(queue_path):
+    queue = WorkQueue(queue_path)
+    queue.add(["a", "b"])
+    queue.claim("w1")
+    queue.finish("a", "w1", "error")
+
+    assert queue.claim("w1") == "b"
+    assert queue.claim("w1") == "a"
+
+
+def test_expired_lease_is_taken_over(queue_path):
+    queue = WorkQueue(queue_path, lease=0.05)
+    queue.add(["a"])
+    queue.claim("w1")
+
+    assert queue.claim("w2") is None
+    time.sleep(0.1)
+    assert queue.claim("w2") == "a"
+
+    job = jobs(queue_path)["a"]
+    assert job["worker"] == "w2"
+    assert job["attempts"] == 2
+
+
+def test_expired_lease_of_last_attempt_fails(queue_path):
+    queue = WorkQueue(queue_path, lease=0.05, max_attempts=1)
+    queue.add(["a"])
+    queue.claim("w1")
+    time.sleep(0.1)
+
+    assert queue.claim("w2") is None
+    job = jobs(queue_path)["a"]
+    assert job["status"] == "failed"
+    assert job["leased_until"] is None
+    assert "w1" in job["error"]
+
+
+def test_finish_after_expired_lease_leaves_job_alone(queue_path):
+    queue = WorkQueue(queue_path, lease=0.05)
+    queue.add(["a"])
+    queue.claim("w1")
+    time.sleep(0.1)
+    queue.claim("w2")
+
+    assert not queue.finish("a", "w1", "too slow")
+
+    job = jobs(queue_path)["a"]
+    assert job["status"] == "running"
+    assert job["worker"] == "w2"
+    assert job["error"] is None
+    assert queue.finish("a", "w2")
+    assert queue.counts() == {"done": 1}
+
+
+def test_renew_extends_lease_of_holder_only(queue_path):
+    queue = WorkQueue(queue_path, lease=0.1)
+    queue.add(["a"])
+    queue.claim("w1")
+
+    for _ in range(3):
+        time.sleep(0.05)
+        assert queue.renew("a", "w1")
+        assert queue.claim("w2") is None
+
+    assert not queue.renew("a", "w2")
+    queue.finish("a", "w1")
+    assert not queue.renew("a", "w1")
+
+
+class RecordingBatch(Batch):
+    """Batch recording its migrations instead of running them."""
+    duration = 0.0
+
+    def _migrate(self, job_id, account):
+        time.sleep(self.duration)
+        if account.get("fail"):
+            raise ValueError("failing on purpose")
+        self.migrated.append((job_id, account))
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    with open(path, "w") as f:
+        json.dump(
+            [
+                {
+                    "spotify_username": "s1",
+                    "tidal_username": "t1",
+                    "tidal_password": "secret",
+                },
+                {"id": "broken", "fail": True},
+            ],
+            f,
+        )
+    return path
+
+
+def test_work_runs_all_jobs(queue_path, manifest_path):
+    batch = RecordingBatch(queue_path, manifest_path, max_attempts=2)
+    batch.migrated = []
+
+    assert batch.add() == 2
+    assert batch.work("w1") == 1
+
+    assert batch.migrated == [
+        (
+            "s1:t1",
+            {
+                "spotify_username": "s1",
+                "tidal_username": "t1",
+                "tidal_password": "secret",
+            },
+        )
+    ]
+    rows = jobs(queue_path)
+    assert rows["s1:t1"]["status"] == "done"
+    assert rows["broken"]["status"] == "failed"
+    assert rows["broken"]["attempts"] == 2
+    assert "failing on purpose" in rows["broken"]["error"]
+
+
+def test_queue_holds_no_secrets(queue_path, manifest_path):
+    batch = RecordingBatch(queue_path, manifest_path)
+    batch.add()
+
+    with open(queue_path, "rb") as f:
+        assert b"secret" not in f.read()
+
+
+def test_work_fails_jobs_missing_from_manifest(queue_path, manifest_path):
+    batch = RecordingBatch(queue_path, manifest_path, max_attempts=1)
+    batch.migrated = []
+    batch.add([{"id": "unknown"}])
+
+    assert batch.work("w1") == 0
+    assert "Not in the manifest" in jobs(queue_path)["unknown"]["error"]
+
+
+def test_work_renews_lease_while_running(queue_path, manifest_path):
+    batch = RecordingBatch(queue_path, manifest_path, lease=0.15)
+    batch.duration = 0.5
+    batch.migrated = []
+    batch.add(load_manifest(manifest_path)[:1])
+
+    worker = threading.Thread(target=batch.work, args=("w1",))
+    worker.start()
+    time.sleep(0.3)
+    assert WorkQueue(queue_path, lease=0.15).claim("w2") is None
+    worker.join()
+
+    assert jobs(queue_path)["s1:t1"]["attempts"] == 1
+    assert len(batch.migrated) == 1
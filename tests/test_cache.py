@@ -0,0 +1,147 @@
+import sqlite3
+import time
+
+import pytest
+
+import spotify2tidal.cache
+from spotify2tidal.cache import MatchCache, normalize
+
+
+class Clock:
+    """Stand-in for the time module with a time that only moves on demand."""
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(spotify2tidal.cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+
+def rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_normalize():
+    assert normalize("  Hello\tWORLD ") == "hello world"
+    assert normalize("ｆｕｌｌ") == "full"
+    assert normalize(None) == ""
+
+
+def test_key_ignores_case_and_spacing():
+    assert MatchCache.key("id", "Song  Name", "Artist") == MatchCache.key(
+        "id", "song name", " ARTIST"
+    )
+
+
+def test_get_unknown():
+    assert MatchCache(":memory:").get("track", "k") == (False, None)
+
+
+def test_set_and_get(path):
+    cache = MatchCache(path)
+    cache.set("track", "k", 1)
+    cache.set("album", "k", None)
+
+    assert cache.get("track", "k") == (True, 1)
+    assert cache.get("album", "k") == (True, None)
+    assert cache.get("artist", "k") == (False, None)
+
+
+def test_entries_survive_reopening(path):
+    cache = MatchCache(path)
+    cache.set("track", "k", 1)
+    cache.close()
+
+    assert MatchCache(path).get("track", "k") == (True, 1)
+
+
+def test_writes_are_batched(path):
+    cache = MatchCache(path, batch_size=3)
+    cache.set("track", "a", 1)
+    cache.set("track", "b", 2)
+    assert rows(path) == 0
+
+    cache.set("track", "c", 3)
+    assert rows(path) == 3
+
+    cache.set("track", "d", 4)
+    assert cache.get("track", "d") == (True, 4)
+    cache.flush()
+    assert rows(path) == 4
+
+
+def test_many_writes_are_fast(path):
+    cache = MatchCache(path)
+
+    start = time.perf_counter()
+    for i in range(3000):
+        cache.set("track", "k%d" % i, i)
+    cache.flush()
+
+    assert time.perf_counter() - start < 1.0
+    assert rows(path) == 3000
+
+
+def test_negative_entries_expire(clock):
+    cache = MatchCache(":memory:", negative_ttl=100)
+    cache.set("track", "missing", None)
+    cache.set("track", "found", 1)
+
+    clock.now += 99
+    assert cache.get("track", "missing") == (True, None)
+
+    clock.now += 2
+    assert cache.get("track", "missing") == (False, None)
+    assert cache.get("track", "found") == (True, 1)
+
+
+def test_entries_expire_after_max_age(clock):
+    cache = MatchCache(":memory:", max_age=1000)
+    cache.set("track", "k", 1)
+
+    clock.now += 1001
+    assert cache.get("track", "k") == (False, None)
+
+
+def test_prune_evicts_expired_entries(clock, path):
+    cache = MatchCache(path, negative_ttl=10, max_age=100)
+    cache.set("track", "missing", None)
+    cache.set("track", "old", 1)
+    clock.now += 50
+    cache.set("track", "new", 2)
+
+    cache.prune()
+    assert rows(path) == 2
+
+    clock.now += 60
+    cache.prune()
+    assert rows(path) == 1
+    assert cache.get("track", "new") == (True, 2)
+
+
+def test_prune_keeps_newest_max_entries(clock, path):
+    cache = MatchCache(path, max_entries=2)
+    for i in range(4):
+        clock.now += 1
+        cache.set("track", "k%d" % i, i)
+
+    cache.prune()
+
+    assert rows(path) == 2
+    assert cache.get("track", "k0") == (False, None)
+    assert cache.get("track", "k3") == (True, 3)
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from spotify2tidal.memo import Memo
+
+
+def test_get_computes_once():
+    memo = Memo()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 42
+
+    assert memo.get("k", compute) == 42
+    assert memo.get("k", compute) == 42
+    assert calls == [1]
+    assert memo.stats == {"hits": 1, "coalesced": 0, "misses": 1}
+
+
+def test_clear_forgets_results():
+    memo = Memo()
+    memo.get("k", lambda: 1)
+    memo.clear()
+
+    assert memo.get("k", lambda: 2) == 2
+    assert memo.stats == {"hits": 0, "coalesced": 0, "misses": 2}
+
+
+def test_concurrent_lookups_are_coalesced():
+    memo = Memo()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 42
+
+    results = []
+    first = threading.Thread(
+        target=lambda: results.append(memo.get("k", compute))
+    )
+    first.start()
+    started.wait(5)
+
+    waiting = [
+        threading.Thread(
+            target=lambda: results.append(memo.get("k", compute))
+        )
+        for _ in range(3)
+    ]
+    for thread in waiting:
+        thread.start()
+    while memo.coalesced < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [first] + waiting:
+        thread.join(5)
+
+    assert results == [42] * 4
+    assert calls == [1]
+    assert memo.stats == {"hits": 0, "coalesced": 3, "misses": 1}
+
+
+def test_failure_is_passed_on_and_retried():
+    memo = Memo()
+
+    def fail():
+        raise ValueError("lookup failed")
+
+    with pytest.raises(ValueError):
+        memo.get("k", fail)
+    assert memo.get("k", lambda: 1) == 1
+
+
+def test_get_async_coalesces_coroutines():
+    memo = Memo()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def main():
+        return await asyncio.gather(
+            *[memo.get_async("k", compute) for _ in range(5)]
+        )
+
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+    assert results == [42] * 5
+    assert calls == [1]
+    assert memo.stats == {"hits": 0, "coalesced": 4, "misses": 1}
@@ -0,0 +1,107 @@
+import json
+
+from spotify2tidal.match import Match
+from spotify2tidal.metrics import Histogram, Metrics, endpoint
+
+
+def test_endpoint_replaces_ids():
+    assert endpoint("https://api.spotify.com/v1/users/me/playlists") == (
+        "/users/{id}/playlists"
+    )
+    assert endpoint("https://listen.tidal.com/v1/playlists/abc-1/items") == (
+        "/playlists/{id}/items"
+    )
+    assert endpoint("https://api.tidalhifi.com/v1/search/tracks?q=x") == (
+        "/search/tracks"
+    )
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == float("inf")
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+    assert Histogram().quantile(0.5) is None
+
+
+def measured():
+    metrics = Metrics()
+    url = "https://api.tidalhifi.com/v1/tracks/byIsrc?isrc=QZ1"
+    metrics.observe_request("tidal", "get", url, 0.02, 200)
+    metrics.observe_request("tidal", "GET", url, 0.2, 429)
+    metrics.observe_request("tidal", "GET", url, 0.01, "error")
+    metrics.observe_retry("tidal")
+    metrics.observe_matches(
+        [
+            Match("track", "Track 1", "Artist", "tr1", 1, "isrc"),
+            Match("track", "Track 2", "Artist", "tr2", 2, "search"),
+            Match("track", "Track 3", "Artist", "tr3", None),
+            Match("track", "Track 4", "Artist", "tr4", 4, "isrc"),
+        ]
+    )
+    with metrics.phase("write", "Playlist") as phase:
+        phase.items = 4
+    list(metrics.fetch(range(3), "tracks"))
+    return metrics
+
+
+def test_json_report(tmp_path):
+    path = str(tmp_path / "report.json")
+
+    measured().write_json(path)
+
+    with open(path) as f:
+        report = json.load(f)
+    assert report["requests"] == 3
+    assert report["errors"] == 2
+    assert report["retries"] == {"tidal": 1}
+    assert report["endpoints"] == [
+        {
+            "service": "tidal",
+            "method": "GET",
+            "endpoint": "/tracks/byIsrc",
+            "requests": 3,
+            "seconds": 0.23,
+            "p50": 0.025,
+            "p95": 0.25,
+            "p99": 0.25,
+            "status": {"200": 1, "429": 1, "error": 1},
+        }
+    ]
+    assert report["matches"] == {
+        "track": {"isrc": 2, "search": 1, "none": 1, "hit_rate": 0.75}
+    }
+    assert report["phases"]["write"]["items"] == 4
+    assert report["phases"]["fetch"]["items"] == 3
+    assert [p["phase"] for p in report["timeline"]] == ["write", "fetch"]
+
+
+def test_prometheus_textfile(tmp_path):
+    path = str(tmp_path / "spotify2tidal.prom")
+
+    measured().write_prometheus(path)
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+    labels = 'endpoint="/tracks/byIsrc",method="GET",service="tidal"'
+    assert (
+        'spotify2tidal_request_duration_seconds_bucket{%s,le="0.025"} 2'
+        % labels
+    ) in lines
+    assert (
+        'spotify2tidal_request_duration_seconds_bucket{%s,le="+Inf"} 3'
+        % labels
+    ) in lines
+    assert (
+        'spotify2tidal_requests_total{%s,status="429"} 1' % labels
+    ) in lines
+    assert 'spotify2tidal_retries_total{service="tidal"} 1' in lines
+    assert (
+        'spotify2tidal_matches_total{kind="track",strategy="none"} 1' in lines
+    )
+    assert 'spotify2tidal_phase_items{phase="write"} 4' in lines
+    assert not (tmp_path / "spotify2tidal.prom.tmp").exists()
@@ -0,0 +1,74 @@
+from spotify2tidal.records import Album, Artist, Track
+
+ALBUM = {
+    "id": "al1",
+    "name": "Album",
+    "artists": [{"name": "First"}, {"name": "Second"}],
+    "external_ids": {"upc": "123"},
+}
+
+
+def spotify_track(track_id, album=ALBUM):
+    return {
+        "id": track_id,
+        "name": "Track",
+        "artists": [{"name": "First"}],
+        "album": album,
+        "external_ids": {"isrc": "ISRC"},
+        "duration_ms": 200500,
+        "disc_number": 1,
+        "track_number": 3,
+    }
+
+
+def test_artist_from_spotify():
+    artist = Artist.from_spotify({"id": "ar1", "name": "Artist"})
+    assert (artist.id, artist.name) == ("ar1", "Artist")
+
+
+def test_album_from_spotify():
+    album = Album.from_spotify(ALBUM, "2020-01-01T00:00:00Z")
+
+    assert album.artists == ("First", "Second")
+    assert album.artist == "First"
+    assert album.upc == "123"
+    assert album.added_at == "2020-01-01T00:00:00Z"
+
+
+def test_track_from_spotify():
+    track = Track.from_spotify(spotify_track("tr1"), "added")
+
+    assert track.artist == "First"
+    assert track.isrc == "ISRC"
+    assert track.duration == 200.5
+    assert (track.disc_number, track.track_number) == (1, 3)
+    assert track.added_at == "added"
+    assert track.album.name == "Album"
+    assert track.album.upc == "123"
+
+
+def test_tracks_share_album_records():
+    albums = {}
+    first = Track.from_spotify(spotify_track("tr1"), albums=albums)
+    second = Track.from_spotify(spotify_track("tr2"), albums=albums)
+
+    assert first.album is second.album
+    assert list(albums) == ["al1"]
+
+
+def test_local_track_without_ids():
+    track = Track.from_spotify(
+        {"id": None, "name": "Local", "artists": [], "album": {"name": "A"}}
+    )
+
+    assert track.id is None
+    assert track.artist is None
+    assert track.isrc is None
+    assert track.duration is None
+    assert track.album.id is None
+
+
+def test_records_have_no_dict():
+    track = Track.from_spotify(spotify_track("tr1"))
+    assert not hasattr(track, "__dict__")
+    assert not hasattr(track.album, "__dict__")
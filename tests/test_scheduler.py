@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import requests
+
+from spotify2tidal.scheduler import Scheduler
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def responses(*statuses):
+    """Return a request function answering with the statuses in order."""
+    sent = []
+
+    def request():
+        status = statuses[len(sent)]
+        sent.append(status)
+        if isinstance(status, BaseException):
+            raise status
+        return FakeResponse(status, {"Retry-After": "0.05"})
+
+    request.sent = sent
+    return request
+
+
+def scheduler(**kwargs):
+    kwargs.setdefault("rate", 1000.0)
+    kwargs.setdefault("burst", 1000)
+    kwargs.setdefault("backoff", 0.01)
+    return Scheduler(**kwargs)
+
+
+def test_send_returns_response():
+    request = responses(200)
+    assert scheduler().send(request).status_code == 200
+    assert request.sent == [200]
+
+
+def test_send_waits_as_long_as_asked_after_429():
+    s = scheduler()
+    request = responses(429, 429, 200)
+
+    start = time.monotonic()
+    assert s.send(request).status_code == 200
+
+    assert time.monotonic() - start >= 0.1
+    assert request.sent == [429, 429, 200]
+    assert s.throttled == 2
+    assert s.retries == 2
+
+
+def test_send_throttling_halves_concurrency():
+    s = scheduler(max_concurrency=8)
+    s.send(responses(429, 200))
+    assert s.concurrency == 4
+
+
+def test_send_retries_server_errors_of_idempotent_requests_only():
+    request = responses(500, 503, 200)
+    assert scheduler().send(request).status_code == 200
+    assert request.sent == [500, 503, 200]
+
+    request = responses(500, 200)
+    assert scheduler().send(request, idempotent=False).status_code == 500
+    assert request.sent == [500]
+
+
+def test_send_gives_up_after_max_retries():
+    request = responses(503, 503, 503, 200)
+    assert scheduler(max_retries=2).send(request).status_code == 503
+    assert request.sent == [503, 503, 503]
+
+
+def test_send_retries_connection_errors_of_idempotent_requests_only():
+    request = responses(requests.ConnectionError(), 200)
+    assert scheduler().send(request).status_code == 200
+
+    request = responses(requests.ConnectionError(), 200)
+    with pytest.raises(requests.ConnectionError):
+        scheduler().send(request, idempotent=False)
+    assert len(request.sent) == 1
+
+
+@pytest.mark.parametrize(
+    "error", [requests.exceptions.ChunkedEncodingError(), KeyboardInterrupt()]
+)
+def test_send_releases_slot_on_any_error(error):
+    s = scheduler(max_concurrency=1)
+
+    with pytest.raises(type(error)):
+        s.send(responses(error))
+
+    assert s._active == 0
+    assert s.send(responses(200)).status_code == 200
+
+
+def test_send_limits_requests_in_flight():
+    s = scheduler(max_concurrency=2)
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def request():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return FakeResponse(200)
+
+    threads = [
+        threading.Thread(target=s.send, args=(request,)) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+
+
+def test_send_keeps_to_rate():
+    s = Scheduler(rate=50.0, burst=1)
+
+    start = time.monotonic()
+    for _ in range(6):
+        s.send(responses(200))
+
+    assert time.monotonic() - start >= 0.09
+
+
+def test_send_async_retries_like_send():
+    s = scheduler()
+    statuses = responses(429, 500, 200)
+
+    async def request():
+        return statuses()
+
+    loop = asyncio.new_event_loop()
+    try:
+        response = loop.run_until_complete(s.send_async(request))
+    finally:
+        loop.close()
+
+    assert response.status_code == 200
+    assert statuses.sent == [429, 500, 200]
+    assert s.throttled == 1
+
+
+def test_send_async_shares_limits_with_threads():
+    s = scheduler(max_concurrency=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait()
+        return FakeResponse(200)
+
+    thread = threading.Thread(target=s.send, args=(blocking,))
+    thread.start()
+    started.wait()
+
+    sent = []
+
+    async def request():
+        sent.append(time.monotonic())
+        return FakeResponse(200)
+
+    async def main():
+        task = asyncio.ensure_future(s.send_async(request))
+        await asyncio.sleep(0.05)
+        assert not sent
+        release.set()
+        await task
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+    thread.join()
+
+    assert len(sent) == 1
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+import run as bench
+from conftest import fast_scheduler
+
+# Seconds until a token expires that is refreshed in the background at once
+EXPIRING = bench.BenchSpotify.REFRESH_MARGIN + 0.05
+
+
+class FakeOAuth:
+    """Stand-in for ScheduledOAuth handing out the token of the fake server."""
+    def __init__(self):
+        self.refreshed = threading.Event()
+        self.refresh_tokens = []
+
+    def refresh_access_token(self, refresh_token):
+        self.refresh_tokens.append(refresh_token)
+        self.refreshed.set()
+        return {
+            "access_token": "bench",
+            "expires_at": time.time() + 3600,
+            "refresh_token": "refresh",
+        }
+
+    def get_cached_token(self):
+        raise AssertionError("Must not authorize again")
+
+
+@pytest.fixture
+def make_spotify(spotify_server):
+    """Return a function creating Spotify with a token expiring in time."""
+    def make(access_token, expires_in):
+        def connect(self):
+            self.api_location = spotify_server.url + "/v1/"
+            self._oauth = FakeOAuth()
+            self._token_info = {
+                "access_token": access_token,
+                "expires_at": time.time() + expires_in,
+                "refresh_token": "refresh",
+            }
+            self._schedule_refresh()
+            return self._session()
+
+        spotify_class = type(
+            "TestSpotify", (bench.BenchSpotify,), {"_connect": connect}
+        )
+        return spotify_class(
+            "user", "id", "secret", "uri", scheduler=fast_scheduler()
+        )
+
+    return make
+
+
+def test_expired_token_is_refreshed(make_spotify, catalog):
+    spotify = make_spotify("expired", 3600)
+
+    try:
+        assert len(spotify.saved_tracks) == catalog.saved
+    finally:
+        spotify.close()
+
+    assert spotify._oauth.refresh_tokens == ["refresh"]
+    assert spotify._token_info["access_token"] == "bench"
+
+
+def test_token_is_refreshed_in_background(make_spotify):
+    spotify = make_spotify("expiring", EXPIRING)
+
+    try:
+        spotify.spotify_session
+        assert spotify._oauth.refreshed.wait(5)
+    finally:
+        spotify.close()
+
+    assert spotify._token_info["access_token"] == "bench"
+
+
+def test_close_stops_refreshing(make_spotify):
+    spotify = make_spotify("expiring", EXPIRING)
+    spotify.spotify_session
+
+    spotify.close()
+
+    assert not spotify._oauth.refreshed.wait(0.2)
+    assert spotify._refresh_timer is None
+
+
+
+def test_playlist_tracks_need_only_trimmed_fields(make_spotify, catalog):
+    spotify = make_spotify("bench", 3600)
+    try:
+        playlist = spotify.own_playlists[1]
+        tracks = spotify.tracks_from_playlist(playlist)
+    finally:
+        spotify.close()
+
+    number = catalog.playlist_track(1, 0)
+    track = tracks[0]
+    assert len(tracks) == catalog.playlist_size
+    assert (track.id, track.name, track.artists) == (
+        "tr%d" % number,
+        "Track %d" % number,
+        ("Artist %d" % (number % catalog.artists),),
+    )
+    assert track.isrc == "QZ%010d" % number
+    assert track.duration == 200.0
+    assert track.track_number == number % catalog.tracks_per_album + 1
+    assert track.album.name == "Album %d" % (
+        number // catalog.tracks_per_album
+    )
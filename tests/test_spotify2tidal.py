@@ -0,0 +1,284 @@
+import sqlite3
+import time
+from collections import Counter
+
+import pytest
+
+from fake_servers import TIDAL_OFFSET
+from spotify2tidal.plan import read_plan
+
+
+def ids(numbers):
+    return [TIDAL_OFFSET + n for n in numbers]
+
+
+def playlists(server):
+    """Return the tracks of the playlists at the fake Tidal by name."""
+    return {p["title"]: p["tracks"] for p in server.playlists.values()}
+
+
+def expected_playlists(catalog):
+    return {
+        "Playlist %d" % p: ids(
+            catalog.playlist_track(p, i) for i in range(catalog.playlist_size)
+        )
+        for p in range(catalog.playlists)
+    }
+
+
+def writes(server):
+    """Return the number of requests changing anything at Tidal."""
+    return sum(
+        count
+        for key, count in server.stats.items()
+        if not key.startswith("GET") and "login" not in key
+    )
+
+
+def test_copy_playlists_skips_unchanged_snapshots(
+    make_spotify2tidal, tidal_server, tmp_path
+):
+    state_path = str(tmp_path / "state.sqlite")
+    make_spotify2tidal(state_path=state_path).copy_all_spotify_playlists()
+    tidal_server.stats.clear()
+
+    make_spotify2tidal(state_path=state_path).copy_all_spotify_playlists()
+
+    assert writes(tidal_server) == 0
+    assert tidal_server.stats["GET /v1/playlists/{id}/tracks"] == 0
+
+
+@pytest.mark.parametrize("change", ["delete", "rename"])
+def test_copy_playlists_again_if_copy_changed_at_tidal(
+    make_spotify2tidal, tidal_server, catalog, tmp_path, change
+):
+    state_path = str(tmp_path / "state.sqlite")
+    make_spotify2tidal(state_path=state_path).copy_all_spotify_playlists()
+    uuid = next(
+        uuid
+        for uuid, playlist in tidal_server.playlists.items()
+        if playlist["title"] == "Playlist 1"
+    )
+    if change == "delete":
+        del tidal_server.playlists[uuid]
+    else:
+        tidal_server.playlists[uuid]["title"] = "Renamed"
+
+    make_spotify2tidal(state_path=state_path).copy_all_spotify_playlists()
+
+    copies = playlists(tidal_server)
+    assert copies["Playlist 1"] == expected_playlists(catalog)["Playlist 1"]
+    assert len(tidal_server.playlists) == catalog.playlists + (
+        change == "rename"
+    )
+
+
+def test_copy_saved_tracks(make_spotify2tidal, tidal_server, catalog):
+    st = make_spotify2tidal(workers=4)
+
+    matches = st.copy_all_saved_spotify_tracks()
+
+    assert len(matches) == catalog.saved
+    assert Counter(m.strategy for m in matches) == {"isrc": catalog.saved}
+    assert tidal_server.favorites["tracks"] == set(ids(range(catalog.saved)))
+    assert tidal_server.stats["GET /v1/search/tracks"] == 0
+
+
+def test_copy_saved_albums_and_artists(
+    make_spotify2tidal, tidal_server, catalog
+):
+    st = make_spotify2tidal()
+
+    st.copy_all_saved_spotify_albums()
+    st.copy_all_saved_spotify_artists()
+
+    albums = -(-catalog.saved // catalog.tracks_per_album)
+    assert tidal_server.favorites["albums"] == set(ids(range(albums)))
+    assert tidal_server.favorites["artists"] == set(
+        ids(range(min(catalog.artists, catalog.saved)))
+    )
+
+
+def test_copy_saved_tracks_by_album(
+    make_spotify2tidal, tidal_server, catalog
+):
+    st = make_spotify2tidal(album_threshold=3)
+
+    matches = st.copy_all_saved_spotify_tracks()
+
+    assert Counter(m.strategy for m in matches) == {"album": catalog.saved}
+    assert tidal_server.favorites["tracks"] == set(ids(range(catalog.saved)))
+    assert tidal_server.stats["GET /v1/tracks/byIsrc"] == 0
+
+
+def test_copy_playlists(make_spotify2tidal, tidal_server, catalog):
+    st = make_spotify2tidal(workers=4, chunk_size=15)
+
+    st.copy_all_spotify_playlists()
+
+    assert playlists(tidal_server) == expected_playlists(catalog)
+    assert tidal_server.stats["POST /v1/playlists/{id}/items"] == (
+        catalog.playlists * -(-catalog.playlist_size // 15)
+    )
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_copy_playlists_again(
+    make_spotify2tidal, tidal_server, catalog, incremental
+):
+    st = make_spotify2tidal(workers=4)
+
+    st.copy_all_spotify_playlists()
+    st.copy_all_spotify_playlists(incremental=incremental)
+
+    assert playlists(tidal_server) == expected_playlists(catalog)
+    assert len(tidal_server.playlists) == catalog.playlists
+
+
+def test_resume_from_journal(make_spotify2tidal, tidal_server, tmp_path):
+    journal_path = str(tmp_path / "journal.sqlite")
+    first = make_spotify2tidal(journal_path=journal_path, job_id="job")
+    first.copy_all_saved_spotify_tracks()
+    first.journal.close()
+    tidal_server.stats.clear()
+
+    st = make_spotify2tidal(journal_path=journal_path, job_id="job")
+    matches = st.copy_all_saved_spotify_tracks()
+
+    assert {m.strategy for m in matches} == {"journal"}
+    assert tidal_server.stats["GET /v1/tracks/byIsrc"] == 0
+    assert tidal_server.stats["POST /v1/users/{id}/favorites/tracks"] == 0
+
+
+def test_resume_writes_missing_from_journal(
+    make_spotify2tidal, tidal_server, catalog, tmp_path
+):
+    journal_path = str(tmp_path / "journal.sqlite")
+    first = make_spotify2tidal(journal_path=journal_path, job_id="job")
+    first.copy_all_saved_spotify_tracks()
+    first.journal.close()
+
+    # As if the migration stopped after looking up, before writing
+    connection = sqlite3.connect(journal_path)
+    with connection:
+        connection.execute("DELETE FROM writes")
+    connection.close()
+    tidal_server.favorites["tracks"].clear()
+    tidal_server.stats.clear()
+
+    st = make_spotify2tidal(journal_path=journal_path, job_id="job")
+    st.copy_all_saved_spotify_tracks()
+
+    assert tidal_server.stats["GET /v1/tracks/byIsrc"] == 0
+    assert tidal_server.favorites["tracks"] == set(ids(range(catalog.saved)))
+
+
+def test_new_job_starts_over(
+    make_spotify2tidal, tidal_server, catalog, tmp_path
+):
+    journal_path = str(tmp_path / "journal.sqlite")
+    first = make_spotify2tidal(journal_path=journal_path, job_id="first")
+    first.copy_all_saved_spotify_tracks()
+    first.journal.close()
+    tidal_server.favorites["tracks"].clear()
+
+    st = make_spotify2tidal(journal_path=journal_path, job_id="second")
+    matches = st.copy_all_saved_spotify_tracks()
+
+    assert {m.strategy for m in matches} == {"isrc"}
+    assert tidal_server.favorites["tracks"] == set(ids(range(catalog.saved)))
+
+
+def test_journal_requires_job_id(make_spotify2tidal, tmp_path):
+    with pytest.raises(ValueError):
+        make_spotify2tidal(journal_path=str(tmp_path / "journal.sqlite"))
+
+
+def test_plan_writes_nothing(make_spotify2tidal, tidal_server, tmp_path):
+    path = str(tmp_path / "plan.jsonl")
+
+    counts = make_spotify2tidal(workers=4).plan(path)
+
+    assert writes(tidal_server) == 0
+    assert tidal_server.playlists == {}
+    assert counts["add"] > 0
+    assert {entry["type"] for entry in read_plan(path)} == {
+        "playlist",
+        "favorites",
+        "item",
+    }
+
+
+def test_plan_and_apply(make_spotify2tidal, tidal_server, catalog, tmp_path):
+    path = str(tmp_path / "plan.jsonl")
+    make_spotify2tidal(workers=4).plan(path, tasks=["playlists", "tracks"])
+    tidal_server.stats.clear()
+
+    make_spotify2tidal().apply(path)
+
+    assert playlists(tidal_server) == expected_playlists(catalog)
+    assert tidal_server.favorites["tracks"] == set(ids(range(catalog.saved)))
+    assert not any(
+        "search" in key or "byIsrc" in key for key in tidal_server.stats
+    )
+
+
+def test_apply_again_with_journal_writes_nothing(
+    make_spotify2tidal, tidal_server, tmp_path
+):
+    path = str(tmp_path / "plan.jsonl")
+    journal_path = str(tmp_path / "journal.sqlite")
+    make_spotify2tidal().plan(path)
+
+    make_spotify2tidal(journal_path=journal_path, job_id="job").apply(path)
+    tidal_server.stats.clear()
+    make_spotify2tidal(journal_path=journal_path, job_id="job").apply(path)
+
+    assert writes(tidal_server) == 0
+
+
+def test_plan_after_copy_finds_favorites(
+    make_spotify2tidal, tidal_server, tmp_path
+):
+    path = str(tmp_path / "plan.jsonl")
+    make_spotify2tidal().copy_all_saved_spotify_tracks()
+
+    counts = make_spotify2tidal().plan(path, tasks=["tracks"])
+
+    assert set(counts) == {"exists"}
+
+
+def added_at(i):
+    """Return when the fake Spotify has saved track i."""
+    return time.strftime(
+        "%Y-%m-%dT%H:%M:%SZ", time.gmtime(1500000000 - i * 3600)
+    )
+
+
+def test_delta_copies_only_newly_saved_tracks(
+    make_spotify2tidal, spotify_server, tidal_server, catalog, tmp_path
+):
+    state_path = str(tmp_path / "state.sqlite")
+    first = make_spotify2tidal(state_path=state_path)
+    assert len(first.copy_all_saved_spotify_tracks(delta=True)) == (
+        catalog.saved
+    )
+    assert first.state.mark("track") == (added_at(0), "tr0")
+    # As if tracks 0 to 9 were saved after the first run
+    first.state.record_mark("track", added_at(10), "tr10")
+    first.close()
+    spotify_server.stats.clear()
+
+    st = make_spotify2tidal(state_path=state_path)
+    matches = st.copy_all_saved_spotify_tracks(delta=True)
+
+    assert [m.spotify_id for m in matches] == ["tr%d" % i for i in range(10)]
+    assert spotify_server.stats["GET /v1/me/tracks"] == 1
+    assert st.state.mark("track") == (added_at(0), "tr0")
+
+    assert st.copy_all_saved_spotify_tracks(delta=True) == []
+
+
+def test_delta_requires_state_path(make_spotify2tidal):
+    with pytest.raises(ValueError):
+        make_spotify2tidal().copy_all_saved_spotify_tracks(delta=True)
@@ -0,0 +1,257 @@
+import random
+
+import pytest
+
+from fake_servers import TIDAL_OFFSET
+from spotify2tidal.tidal import playlist_changes
+
+
+def apply_changes(current, track_ids):
+    """Apply the changes from playlist_changes() to a copy of a list."""
+    result = list(current)
+    for start, end, insert in playlist_changes(current, track_ids):
+        result[start:end] = insert
+    return result
+
+
+def random_lists(seed, count=200):
+    """Yield pairs of random playlists sharing some of their tracks."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        pool = range(rng.randint(1, 30))
+        yield (
+            [rng.choice(pool) for _ in range(rng.randint(0, 40))],
+            [rng.choice(pool) for _ in range(rng.randint(0, 40))],
+        )
+
+
+@pytest.mark.parametrize(
+    "current, track_ids",
+    [
+        ([], [1, 2, 3]),
+        ([1, 2, 3], []),
+        ([1, 2, 3], [1, 2, 3]),
+        ([1, 2, 3], [1, 4, 3]),
+        ([1, 2, 3], [0, 1, 2, 3, 4]),
+        ([1, 2, 3, 4], [4, 1, 2, 3]),
+        ([1, 1, 2, 2], [2, 1, 2, 1]),
+    ],
+)
+def test_playlist_changes(current, track_ids):
+    assert apply_changes(current, track_ids) == track_ids
+
+
+def test_playlist_changes_random():
+    for current, track_ids in random_lists(0):
+        assert apply_changes(current, track_ids) == track_ids
+
+
+def test_playlist_changes_nothing_for_equal_lists():
+    assert list(playlist_changes([1, 2, 3], [1, 2, 3])) == []
+
+
+def test_playlist_changes_start_at_the_end():
+    changes = list(playlist_changes(list(range(10)), [0, 11, 2, 3, 4, 15]))
+    starts = [start for start, end, insert in changes]
+    assert starts == sorted(starts, reverse=True)
+
+
+def ids(*numbers):
+    return [TIDAL_OFFSET + n for n in numbers]
+
+
+@pytest.fixture
+def playlist(tidal_server):
+    """Return a function creating a playlist at the fake Tidal server."""
+    def create(track_ids, title="Playlist"):
+        uuid = "test-%d" % len(tidal_server.playlists)
+        tidal_server.playlists[uuid] = {
+            "title": title,
+            "tracks": list(track_ids),
+        }
+        return uuid
+
+    return create
+
+
+def writes(server):
+    """Return the number of requests changing playlist items by method."""
+    return {
+        key.split()[0]: count
+        for key, count in server.stats.items()
+        if "/items" in key
+    }
+
+
+@pytest.mark.parametrize(
+    "current, target",
+    [
+        (ids(), ids(1, 2, 3)),
+        (ids(1, 2, 3), ids()),
+        (ids(1, 2, 3), ids(1, 4, 3)),
+        (ids(1, 2, 3), ids(0, 1, 2, 3, 4)),
+        (ids(1, 2, 3, 4, 5), ids(5, 1, 2, 3, 4)),
+    ],
+)
+def test_sync_playlist(tidal, tidal_server, playlist, current, target):
+    uuid = playlist(current)
+    tidal.sync_playlist(uuid, target)
+    assert tidal_server.playlists[uuid]["tracks"] == target
+
+
+def test_sync_playlist_random(tidal, tidal_server, playlist):
+    for current, target in random_lists(1, count=30):
+        uuid = playlist(ids(*current))
+        tidal.sync_playlist(uuid, ids(*target), chunk_size=4)
+        assert tidal_server.playlists[uuid]["tracks"] == ids(*target)
+
+
+def test_sync_playlist_unchanged_writes_nothing(
+    tidal, tidal_server, playlist
+):
+    uuid = playlist(ids(*range(50)))
+    tidal_server.stats.clear()
+
+    tidal.sync_playlist(uuid, ids(*range(50)))
+
+    assert writes(tidal_server) == {}
+
+
+def test_sync_playlist_moves_single_track(tidal, tidal_server, playlist):
+    uuid = playlist(ids(*range(50)))
+    tidal_server.stats.clear()
+
+    tidal.sync_playlist(uuid, ids(49, *range(49)))
+
+    assert tidal_server.playlists[uuid]["tracks"] == ids(49, *range(49))
+    assert writes(tidal_server) == {"POST": 1, "DELETE": 1}
+
+
+def test_sync_playlist_in_chunks(tidal, tidal_server, playlist):
+    uuid = playlist(ids(*range(10)))
+    tidal_server.stats.clear()
+
+    tidal.sync_playlist(uuid, ids(*range(100, 107)), chunk_size=3)
+
+    assert tidal_server.playlists[uuid]["tracks"] == ids(*range(100, 107))
+    assert writes(tidal_server) == {"DELETE": 4, "POST": 3}
+
+
+def test_add_tracks_to_playlist_keeps_order(tidal, tidal_server, playlist):
+    uuid = playlist([])
+
+    tidal.add_tracks_to_playlist(uuid, ids(5, 3, 9, 1))
+
+    assert tidal_server.playlists[uuid]["tracks"] == ids(5, 3, 9, 1)
+
+
+def test_add_tracks_to_playlist_in_chunks(tidal, tidal_server, playlist):
+    uuid = playlist(ids(0, 1))
+    tidal_server.stats.clear()
+
+    tidal.add_tracks_to_playlist(uuid, ids(*range(10, 17)), 1, chunk_size=3)
+
+    assert tidal_server.playlists[uuid]["tracks"] == ids(
+        0, *(list(range(10, 17)) + [1])
+    )
+    assert writes(tidal_server) == {"POST": 3}
+
+
+def test_remove_tracks_from_playlist(tidal, tidal_server, playlist):
+    uuid = playlist(ids(*range(10)))
+
+    tidal.remove_tracks_from_playlist(uuid, [0, 9, 3, 4, 5], chunk_size=2)
+
+    assert tidal_server.playlists[uuid]["tracks"] == ids(1, 2, 6, 7, 8)
+
+
+def test_playlist_track_ids(tidal, playlist):
+    uuid = playlist(ids(3, 1, 2))
+    assert tidal.playlist_track_ids(uuid) == ids(3, 1, 2)
+
+
+def test_find_track_by_isrc(tidal, tidal_server):
+    assert tidal.find_track("Track 5", "Artist 5", "QZ%010d" % 5) == (
+        TIDAL_OFFSET + 5,
+        "isrc",
+    )
+    assert tidal_server.stats["GET /v1/search/tracks"] == 0
+
+
+def test_find_track_falls_back_to_search(tidal, tidal_server):
+    unknown = "QZ%010d" % 999999
+
+    assert tidal.find_track("Track 5", "Artist 5", unknown) == (
+        TIDAL_OFFSET + 5,
+        "search",
+    )
+    assert tidal.find_track("Track 5", "Artist 5") == (
+        TIDAL_OFFSET + 5,
+        "search",
+    )
+    assert tidal.find_track("Unknown", "Artist 5", unknown) == (None, None)
+    assert tidal_server.stats["GET /v1/tracks/byIsrc"] == 2
+
+
+def test_find_album_by_upc(tidal, tidal_server):
+    assert tidal.find_album("Album 3", "Artist 30", "%012d" % 3) == (
+        TIDAL_OFFSET + 3,
+        "upc",
+    )
+    assert tidal_server.stats["GET /v1/search/albums"] == 0
+
+
+def test_find_album_falls_back_to_search(tidal):
+    assert tidal.find_album("Album 3", "Artist 30", "%012d" % 999999) == (
+        TIDAL_OFFSET + 3,
+        "search",
+    )
+    assert tidal.find_album("Album 3", "Other", "%012d" % 999999) == (
+        None,
+        None,
+    )
+
+
+def test_save_favorites_in_chunks(tidal, tidal_server):
+    assert tidal.save_tracks(ids(1, 2, 3), chunk_size=2) == []
+    assert tidal.save_albums(ids(4)) == []
+    assert tidal.save_artists(ids(5, 6)) == []
+
+    assert tidal_server.favorites == {
+        "tracks": set(ids(1, 2, 3)),
+        "albums": set(ids(4)),
+        "artists": set(ids(5, 6)),
+    }
+    assert tidal_server.stats["POST /v1/users/{id}/favorites/tracks"] == 2
+
+
+def test_delete_existing_playlist(tidal, tidal_server, playlist):
+    first = playlist([], "Duplicate")
+    second = playlist([], "Duplicate")
+    kept = playlist([], "Other")
+
+    tidal.delete_existing_playlist("Duplicate")
+
+    assert set(tidal_server.playlists) == {kept}
+    assert tidal.find_playlist("Duplicate") is None
+    assert first not in tidal_server.playlists
+    assert second not in tidal_server.playlists
+
+
+def test_delete_playlist_deleted_elsewhere(tidal, tidal_server, playlist):
+    uuid = playlist([], "Gone")
+    assert tidal.find_playlist("Gone") == uuid
+    del tidal_server.playlists[uuid]
+
+    tidal.delete_existing_playlist("Gone")
+
+    assert tidal.find_playlist("Gone") is None
+
+
+def test_lists_are_read_page_by_page(tidal, tidal_server, playlist):
+    tidal_server.page_size = 2
+    uuids = [playlist(ids(*range(i)), "Playlist %d" % i) for i in range(5)]
+
+    assert [tidal.find_playlist("Playlist %d" % i) for i in range(5)] == uuids
+    assert tidal.playlist_track_ids(uuids[4]) == ids(0, 1, 2, 3)
+    assert tidal_server.stats["GET /v1/users/{id}/playlists"] == 3